@@ -114,6 +114,32 @@ REST_FRAMEWORK = {
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache par tuiles de get_equipments (installations/cache.py)
+VIEWPORT_CACHE_MAX_ENTRIES = int(os.getenv('VIEWPORT_CACHE_MAX_ENTRIES', '512'))
+VIEWPORT_CACHE_TILE_DEG = float(os.getenv('VIEWPORT_CACHE_TILE_DEG', '0.25'))
+
+# Durée (s) pendant laquelle un worker réutilise la clé de version du jeu de données
+# sans interroger la base (installations/dataset.py, current_dataset_key). 0 par défaut :
+# clé relue à chaque requête ; au-delà, les autres workers peuvent servir l'ancienne version
+DATASET_KEY_TTL = float(os.getenv('DATASET_KEY_TTL', '0'))
+
+# Tuiles z/x/y mémorisées par version du jeu de données (installations/tiles.py)
+TILE_CACHE_MAX_ENTRIES = int(os.getenv('TILE_CACHE_MAX_ENTRIES', '2048'))
+
+# Moteur de lecture des installations : 'db' (PostgreSQL) ou 'columnar'
+# (fichier colonnes mappé en mémoire, partagé par tous les workers - installations/columnar.py)
+INSTALLATIONS_READ_ENGINE = os.getenv('INSTALLATIONS_READ_ENGINE', 'db')
+INSTALLATIONS_COLUMNAR_PATH = os.getenv(
+    'INSTALLATIONS_COLUMNAR_PATH', os.path.join(BASE_DIR, 'data', 'installations.col')
+)
+
+# Fichiers servis tels quels par WhiteNoise à la racine du site (ex : /bundles/13.json)
+WHITENOISE_ROOT = os.path.join(BASE_DIR, 'public')
+# Paquets hors ligne par département (installations/bundles.py), exportés par bootstrap_dataset
+# au démarrage (start.sh) ou par la commande export_bundles. WhiteNoise n'indexe WHITENOISE_ROOT
+# qu'au lancement des workers : après un export manuel, redémarrer le serveur.
+INSTALLATIONS_BUNDLES_DIR = os.path.join(WHITENOISE_ROOT, 'bundles')
+
 
 BREVO_API_KEY = os.getenv('BREVO_API_KEY')
 DEFAULT_FROM_EMAIL = 'noreply@sportmap.me'
\ No newline at end of file
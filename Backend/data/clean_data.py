@@ -1,24 +1,14 @@
 import csv
+import os
+import sys
+
+# Liste de mots-clés et automate partagés avec load_csv et purge_banned_installations
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from installations.exclusion import should_exclude
 
 input_file = '/Users/kenshi/Documents/Workspace/SportMap/Backend/data/filtered-data-es.csv'
 output_file = '/Users/kenshi/Documents/Workspace/SportMap/Backend/data/cleaned-data-es.csv'
 
-mots_a_exclure = [
-    'ecole', 'collège', 'college', 'lycée', 'lycee', 'université', 'universite', # Scolaire
-    'militaire', 'armée', 'armee',                                              # Militaire
-    'pénitentiaire', 'penitentiaire', 'prison', 'centre de détention',          # Pénitentiaire
-    'creps', 'ecole nationale', 'école nationale', 'scolaire'                   # CREPS / National
-]
-
-def should_exclude(row):
-    inst_nom = row.get('inst_nom', '').lower()
-    equip_type_name = row.get('equip_type_name', '').lower()
-    
-    for word in mots_a_exclure:
-        if word in inst_nom or word in equip_type_name:
-            return True
-    return False
-
 total_rows = 0
 cleaned_rows = 0
 
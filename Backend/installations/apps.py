@@ -0,0 +1,15 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+from django.apps import AppConfig
+
+
+class InstallationsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'installations'
+
+    def ready(self):
+        # Brancher les signaux de versionnement du jeu de données
+        # et les reconstructions lancées après chaque import
+        from . import columnar, dataset, snapshot, sports  # noqa: F401
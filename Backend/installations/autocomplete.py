@@ -0,0 +1,132 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Suggestions de saisie (autocomplete) : noms d'installations, sports et codes postaux.
+
+Chaque suggestion est indexée sous son libellé normalisé et sous chaque fin de libellé
+commençant par un mot ("complexe robert morel", "robert morel", "morel"). Les clés sont
+rangées dans un tableau trié : les clés commençant par le préfixe tapé forment une plage
+contiguë trouvée par dichotomie. Les premières lettres (plages très larges) ont leur
+top-k précalculé. L'index est reconstruit une fois par version du jeu de données.
+"""
+
+import heapq
+from bisect import bisect_left
+from collections import Counter
+
+from django.db.models import Count
+
+from .dataset import PerVersion
+from .models import Installation, Sport, UserCheckIn
+from .text import normalize_text
+
+DEFAULT_K = 8
+MAX_K = 20
+# Préfixes dont le top-k est précalculé
+PRECOMPUTED_PREFIX_LEN = 2
+
+
+class Suggestion:
+    __slots__ = ('kind', 'label', 'count', 'checkins', 'id')
+
+    def __init__(self, kind, label, count, checkins=0, id=None):
+        self.kind = kind
+        self.label = label
+        self.count = count
+        self.checkins = checkins
+        self.id = id
+
+    def as_dict(self):
+        data = {'type': self.kind, 'label': self.label, 'count': self.count, 'checkins': self.checkins}
+        if self.id is not None:
+            data['id'] = self.id
+        return data
+
+
+class AutocompleteIndex:
+    def __init__(self, suggestions):
+        self.suggestions = list(suggestions)
+        keyed = []
+        for index, suggestion in enumerate(self.suggestions):
+            words = normalize_text(suggestion.label).split()
+            for start in range(len(words)):
+                keyed.append((' '.join(words[start:]), index))
+        keyed.sort()
+        self.keys = [key for key, _ in keyed]
+        self.targets = [index for _, index in keyed]
+
+        self._precomputed = {}
+        prefixes = {key[:n] for key in self.keys for n in range(1, PRECOMPUTED_PREFIX_LEN + 1)}
+        for prefix in prefixes:
+            self._precomputed[prefix] = self._top(prefix, MAX_K)
+
+    def __len__(self):
+        return len(self.suggestions)
+
+    def _range(self, prefix):
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + '\uffff', lo)
+        return lo, hi
+
+    def _top(self, prefix, k):
+        lo, hi = self._range(prefix)
+        # Popularité : fréquentation, puis nombre d'installations
+        return heapq.nsmallest(k, set(self.targets[lo:hi]), key=self._popularity)
+
+    def _popularity(self, i):
+        suggestion = self.suggestions[i]
+        return (-suggestion.checkins, -suggestion.count, suggestion.label)
+
+    def complete(self, query, k=DEFAULT_K):
+        """Les k suggestions les plus populaires dont un mot commence par `query`"""
+        prefix = normalize_text(query)
+        if not prefix:
+            return []
+        k = min(k, MAX_K)
+        top = self._precomputed.get(prefix)
+        if top is None:
+            if len(prefix) <= PRECOMPUTED_PREFIX_LEN:
+                return []
+            top = self._top(prefix, k)
+        return [self.suggestions[i].as_dict() for i in top[:k]]
+
+
+def _build_autocomplete_index(key):
+    suggestions = []
+
+    # Installations regroupées par nom (un complexe = plusieurs équipements)
+    checkins = Counter(dict(
+        UserCheckIn.objects.values('installation_id').annotate(n=Count('id')).values_list('installation_id', 'n')
+    ))
+    names = {}
+    rows = Installation.objects.exclude(inst_nom__isnull=True).exclude(inst_nom='')
+    for pk, name in rows.order_by('id').values_list('id', 'inst_nom').iterator(chunk_size=5000):
+        normalized = normalize_text(name)
+        group = names.get(normalized)
+        if group is None:
+            names[normalized] = Suggestion('installation', name, 1, checkins[pk], pk)
+        else:
+            group.count += 1
+            group.checkins += checkins[pk]
+    suggestions.extend(names.values())
+
+    # Sports (table normalisée)
+    for name, count in Sport.objects.annotate(n=Count('installations')).filter(n__gt=0).values_list('name', 'n'):
+        suggestions.append(Suggestion('sport', name, count))
+
+    # Codes postaux, sous leur forme postale (PLM)
+    rows = Installation.objects.exclude(postal_code__isnull=True).exclude(postal_code='')
+    for cp, count in rows.values('postal_code').annotate(n=Count('id')).values_list('postal_code', 'n'):
+        suggestions.append(Suggestion('cp', cp, count))
+
+    return AutocompleteIndex(suggestions)
+
+
+_autocomplete_index = PerVersion(_build_autocomplete_index)
+
+
+def get_autocomplete_index(key=None):
+    """Index de suggestions de la version courante (construit une fois par worker)"""
+    return _autocomplete_index.get(key)
@@ -0,0 +1,246 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Format binaire du jeu d'installations (`geojson/?format=binary`), version 2.
+
+Construit depuis le snapshot GeoJSON de la version courante (même contenu, même cache),
+lisible sans JSON.parse : les tableaux se lisent directement en TypedArray côté client.
+Tous les entiers et flottants sont little-endian ; chaque section commence sur 8 octets.
+
+    En-tête (32 octets)
+      0   magic          4s   b'SPMB'
+      4   version        u16  2
+      6   flags          u16  0 (réservé)
+      8   count          u32  N, nombre de features
+      12  property_count u16  P
+      14  (réservé)      u16
+      16  string_count   u32  K, taille de la table de chaînes
+      20  string_bytes   u32  taille des données UTF-8 de la table
+      24  list_items     u32  M, nombre total d'éléments des colonnes liste
+      28  (réservé)      u32
+    Descripteurs       P x (type u8, longueur u8, nom UTF-8)
+    ids                u32[N]
+    lons, lats         f64[N] chacun
+    Table de chaînes   offsets u32[K + 1], puis données UTF-8 (chaîne i = data[off[i]:off[i+1]])
+    Colonnes, dans l'ordre des descripteurs :
+      STRING (1)       u32[N] : indice dans la table, 0xFFFFFFFF = null
+      BOOL (2)         u8[N]  : 0 = false, 1 = true, 2 = null
+      STRING_LIST (3)  forme u8[N] : 0 = liste, 1 = chaîne seule (un élément), 2 = null,
+                       puis offsets u32[N + 1] (dans la zone des éléments de la colonne),
+                       puis éléments u32 (indices dans la table, 0xFFFFFFFF = null).
+                       `sports` vaut une liste, une chaîne ("Football", '') ou null dans le
+                       GeoJSON : la forme redonne exactement la même valeur.
+
+La propriété `id` n'a pas de colonne : c'est le tableau `ids`.
+"""
+
+import gzip
+import json
+import struct
+import sys
+from array import array
+
+from .cache import LRUCache
+from .models import GeoJSONSnapshot
+
+MAGIC = b'SPMB'
+VERSION = 2
+ALIGN = 8
+HEADER = struct.Struct('<4sHHIHHIIII')
+NULL_STRING = 0xFFFFFFFF
+CONTENT_TYPE = 'application/vnd.sportmap.installations; version=2'
+
+STRING, BOOL, STRING_LIST = 1, 2, 3
+# Forme d'une valeur STRING_LIST
+LIST_SHAPE, SCALAR_SHAPE, NULL_SHAPE = 0, 1, 2
+PROPERTY_TYPES = {'free_access': BOOL, 'inst_acc_handi_bool': BOOL, 'sports': STRING_LIST}
+
+# Binaires construits, par ETag du snapshot GeoJSON source
+_binaries = LRUCache(8)
+
+
+def _le(values):
+    """array en little-endian (copie si la machine est big-endian)"""
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _pad(data):
+    return data + b'\0' * (-len(data) % ALIGN)
+
+
+# ===== ENCODAGE =====
+
+def encode_features(features):
+    """Octets au format binaire v2 d'une liste de features (propriétés dans l'ordre de la première)"""
+    names = [name for name in (features[0]['properties'] if features else ()) if name != 'id']
+    strings = {}
+
+    def string_index(value):
+        if value is None:
+            return NULL_STRING
+        return strings.setdefault(value, len(strings))
+
+    ids, lons, lats = array('I'), array('d'), array('d')
+    columns = {}
+    for name in names:
+        kind = PROPERTY_TYPES.get(name, STRING)
+        columns[name] = array('B') if kind == BOOL else array('I')
+    list_offsets = {name: array('I', [0]) for name in names if PROPERTY_TYPES.get(name) == STRING_LIST}
+    list_shapes = {name: array('B') for name in list_offsets}
+
+    for feature in features:
+        properties = feature['properties']
+        lon, lat = feature['geometry']['coordinates']
+        ids.append(properties['id'])
+        lons.append(lon)
+        lats.append(lat)
+        for name in names:
+            value = properties[name]
+            kind = PROPERTY_TYPES.get(name, STRING)
+            if kind == BOOL:
+                columns[name].append(2 if value is None else int(bool(value)))
+            elif kind == STRING_LIST:
+                if value is None:
+                    list_shapes[name].append(NULL_SHAPE)
+                    items = ()
+                elif isinstance(value, str):
+                    list_shapes[name].append(SCALAR_SHAPE)
+                    items = (value,)
+                else:
+                    list_shapes[name].append(LIST_SHAPE)
+                    items = value
+                for item in items:
+                    columns[name].append(string_index(item))
+                list_offsets[name].append(len(columns[name]))
+            else:
+                columns[name].append(string_index(value))
+
+    string_offsets, string_data = array('I', [0]), bytearray()
+    for value in strings:
+        string_data += value.encode('utf-8')
+        string_offsets.append(len(string_data))
+
+    descriptors = b''.join(
+        struct.pack('<BB', PROPERTY_TYPES.get(name, STRING), len(name.encode('utf-8'))) + name.encode('utf-8')
+        for name in names
+    )
+    list_items = sum(len(columns[name]) for name in list_offsets)
+    parts = [
+        HEADER.pack(MAGIC, VERSION, 0, len(ids), len(names), 0, len(strings), len(string_data), list_items, 0),
+        _pad(descriptors), _pad(_le(ids)), _le(lons), _le(lats),
+        _pad(_le(string_offsets)), _pad(bytes(string_data)),
+    ]
+    for name in names:
+        if name in list_offsets:
+            parts.append(_pad(list_shapes[name].tobytes()))
+            parts.append(_pad(_le(list_offsets[name])))
+        parts.append(_pad(columns[name].tobytes() if columns[name].typecode == 'B' else _le(columns[name])))
+    return b''.join(parts)
+
+
+def get_binary_snapshot(snapshot):
+    """
+    Version binaire d'un snapshot GeoJSON (GeoJSONSnapshot non enregistré), construite une fois
+    par ETag source. Même Last-Modified ; ETag dérivé de celui du JSON.
+    """
+    binary = _binaries.get(snapshot.etag)
+    if binary is None:
+        features = json.loads(snapshot.payload)['features']
+        payload = encode_features(features)
+        binary = GeoJSONSnapshot(
+            dataset_key=snapshot.dataset_key, version=snapshot.version,
+            etag='"%s.b%d"' % (snapshot.etag.strip('"'), VERSION), feature_count=len(features),
+            payload=payload, payload_gzip=gzip.compress(payload, compresslevel=9, mtime=0),
+            last_modified=snapshot.last_modified,
+        )
+        _binaries.set(snapshot.etag, binary)
+    return binary
+
+
+# ===== DÉCODAGE (référence, utilisé par les tests) =====
+
+class _Reader:
+    def __init__(self, data, position):
+        self.data = data
+        self.position = position
+
+    def take(self, typecode, count):
+        values = array(typecode)
+        size = values.itemsize * count
+        values.frombytes(self.data[self.position:self.position + size])
+        if sys.byteorder == 'big' and values.itemsize > 1:
+            values.byteswap()
+        self.position += size + (-size % ALIGN)
+        return values
+
+    def skip_to_alignment(self):
+        self.position += -self.position % ALIGN
+
+
+def decode(data):
+    """FeatureCollection (dict) depuis des octets au format binaire v2"""
+    (magic, version, _, count, property_count, _, string_count, string_bytes, _, _) = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("Format binaire invalide")
+    if version != VERSION:
+        raise ValueError(f"Version du format binaire non supportée : {version}")
+
+    position = HEADER.size
+    properties = []
+    for _ in range(property_count):
+        kind, length = struct.unpack_from('<BB', data, position)
+        position += 2
+        properties.append((data[position:position + length].decode('utf-8'), kind))
+        position += length
+
+    reader = _Reader(data, position)
+    reader.skip_to_alignment()
+    ids = reader.take('I', count)
+    lons = reader.take('d', count)
+    lats = reader.take('d', count)
+    offsets = reader.take('I', string_count + 1)
+    raw = bytes(data[reader.position:reader.position + string_bytes])
+    reader.position += string_bytes + (-string_bytes % ALIGN)
+    strings = [raw[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(string_count)]
+
+    columns = []
+    for name, kind in properties:
+        if kind == BOOL:
+            flags = reader.take('B', count)
+            columns.append((name, [None if flag == 2 else bool(flag) for flag in flags]))
+        elif kind == STRING_LIST:
+            shapes = reader.take('B', count)
+            list_offsets = reader.take('I', count + 1)
+            items = reader.take('I', list_offsets[count])
+            values = []
+            for i in range(count):
+                value = [None if item == NULL_STRING else strings[item]
+                         for item in items[list_offsets[i]:list_offsets[i + 1]]]
+                if shapes[i] == NULL_SHAPE:
+                    value = None
+                elif shapes[i] == SCALAR_SHAPE:
+                    value = value[0]
+                values.append(value)
+            columns.append((name, values))
+        elif kind == STRING:
+            indices = reader.take('I', count)
+            columns.append((name, [None if index == NULL_STRING else strings[index] for index in indices]))
+        else:
+            raise ValueError(f"Type de colonne inconnu : {kind}")
+
+    features = []
+    for i in range(count):
+        feature_properties = {'id': ids[i]}
+        for name, values in columns:
+            feature_properties[name] = values[i]
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [lons[i], lats[i]]},
+            'properties': feature_properties,
+        })
+    return {'type': 'FeatureCollection', 'features': features}
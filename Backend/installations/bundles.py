@@ -0,0 +1,156 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Paquets hors ligne par département, servis comme fichiers statiques.
+
+`export_bundles` écrit dans INSTALLATIONS_BUNDLES_DIR (sous WHITENOISE_ROOT) :
+
+    bundles/13.json        FeatureCollection des installations du département (format de geojson/)
+    bundles/13.json.gz     même contenu, gzip -9
+    bundles/13.json.br     même contenu, brotli 11 (si le module brotli est installé)
+    bundles/manifest.json  version du jeu de données, tailles et empreintes SHA-256
+
+WhiteNoise choisit la variante compressée selon Accept-Encoding : aucun passage par
+Django pour un téléchargement. Le département vient du code postal : 2 caractères
+(13, 2A...), 3 pour l'outre-mer (971...). Sans code postal : paquet "autres".
+
+WhiteNoise n'indexe les fichiers qu'au démarrage des workers (hors autorefresh en DEBUG) :
+l'export est fait avant le lancement du serveur (bootstrap_dataset), jamais pendant ;
+après un export_bundles manuel, redémarrer.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.utils import timezone
+
+from .dataset import dataset_key, get_dataset_state
+from .snapshot import GEOJSON_COLUMNS, iter_geojson_chunks
+from .models import Installation
+
+try:
+    import brotli
+except ImportError:  # Optionnel : sans lui, seules les variantes gzip sont écrites
+    brotli = None
+
+MANIFEST_NAME = 'manifest.json'
+UNKNOWN_DEPARTMENT = 'autres'
+# Seuls fichiers que l'export peut supprimer (et seulement s'ils figurent dans le manifeste précédent)
+BUNDLE_FILE = re.compile(r'^(?:[0-9A-Z]{2,3}|%s)\.json(?:\.gz|\.br)?$' % UNKNOWN_DEPARTMENT)
+_POSTAL_CODE_INDEX = GEOJSON_COLUMNS.index('postal_code')
+
+
+def bundles_dir():
+    return settings.INSTALLATIONS_BUNDLES_DIR
+
+
+def department(postal_code):
+    """Département d'un code postal ('13001' -> '13', '97411' -> '974', '20000' / '2A004' -> '20' / '2A')"""
+    if not postal_code or len(postal_code) < 2:
+        return UNKNOWN_DEPARTMENT
+    code = postal_code[:3] if postal_code.startswith(('97', '98')) else postal_code[:2]
+    return code.upper() if code.isalnum() else UNKNOWN_DEPARTMENT
+
+
+def _write(path, data):
+    """Écriture atomique (fichier temporaire puis rename)"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.bundle-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _previous_files(directory):
+    """
+    Fichiers listés par le manifeste d'un export précédent. Refuse d'écrire dans un dossier
+    non vide qui n'a pas de manifeste de paquets (ex. --output public/) : rien n'y serait à nous.
+    """
+    path = os.path.join(directory, MANIFEST_NAME)
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = None
+    except ValueError:
+        manifest = {}
+    if manifest is not None and not (isinstance(manifest, dict) and isinstance(manifest.get('bundles'), dict)):
+        raise ValueError(f"{path} n'est pas un manifeste de paquets : dossier refusé")
+    if manifest is None:
+        if any(not name.startswith('.') for name in os.listdir(directory)):
+            raise ValueError(f"{directory} n'est pas vide et ne contient pas de {MANIFEST_NAME} : dossier refusé")
+        return set()
+
+    files = set()
+    for entry in manifest['bundles'].values():
+        files.add(entry.get('path'))
+        files.update(variant.get('path') for variant in entry.values() if isinstance(variant, dict))
+    return {name for name in files if name and BUNDLE_FILE.match(name)}
+
+
+def _variant(name, data):
+    return {'path': name, 'bytes': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+
+
+def export_bundles(directory=None):
+    """Écrire les paquets de la version courante et le manifeste ; renvoie le manifeste"""
+    directory = directory or bundles_dir()
+    os.makedirs(directory, exist_ok=True)
+    previous = _previous_files(directory)
+    state = get_dataset_state()
+
+    groups = {}
+    rows = Installation.objects.order_by('id').values_list(*GEOJSON_COLUMNS)
+    for row in rows.iterator(chunk_size=5000):
+        groups.setdefault(department(row[_POSTAL_CODE_INDEX]), []).append(row)
+
+    bundles, written = {}, set()
+    for code in sorted(groups):
+        stats = {}
+        payload = b''.join(iter_geojson_chunks(rows=groups[code], stats=stats))
+        name = f'{code}.json'
+        entry = _variant(name, payload)
+        entry['features'] = stats['count']
+        variants = [(name, payload), (f'{name}.gz', gzip.compress(payload, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((f'{name}.br', brotli.compress(payload, quality=11)))
+        for variant_name, data in variants:
+            _write(os.path.join(directory, variant_name), data)
+            written.add(variant_name)
+            if variant_name != name:
+                entry[variant_name.rsplit('.', 1)[1]] = _variant(variant_name, data)
+        bundles[code] = entry
+
+    manifest = {
+        'version': state[0],
+        'dataset_key': dataset_key(state),
+        'generated_at': timezone.now().isoformat(),
+        'bundles': bundles,
+    }
+    manifest_payload = json.dumps(manifest, ensure_ascii=False, indent=1).encode('utf-8')
+    _write(os.path.join(directory, f'{MANIFEST_NAME}.gz'), gzip.compress(manifest_payload, compresslevel=9, mtime=0))
+    # Manifeste en dernier : il ne référence que des fichiers déjà en place
+    _write(os.path.join(directory, MANIFEST_NAME), manifest_payload)
+    written.update((MANIFEST_NAME, f'{MANIFEST_NAME}.gz'))
+
+    # Départements disparus (ou variante brotli d'un export précédent) : uniquement nos fichiers
+    for name in previous - written:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            os.unlink(path)
+
+    print(f"📦 Paquets hors ligne v{state[0]} : {len(bundles)} départements ({directory})")
+    return manifest
+
@@ -0,0 +1,204 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Cache des réponses de get_equipments, par tuiles de la carte.
+
+Les `bounds` demandés sont découpés en tuiles de VIEWPORT_CACHE_TILE_DEG degrés, sur une
+grille entière en micro-degrés (appartenance et bornes des tuiles calculées sur les mêmes
+entiers, sans erreur d'arrondi pour des tailles comme 0.1) : chaque tuile (avec ses
+filtres `types`/`sports` normalisés) est une entrée du cache LRU.
+Deux déplacements voisins de la carte partagent donc la plupart de leurs tuiles.
+Les entrées contiennent plus que le rectangle demandé : le résultat est toujours
+recoupé sur les bornes exactes avant d'être renvoyé.
+Les clés incluent la version du jeu de données : le cache est vidé dès qu'elle change.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+_MISSING = object()
+
+# Au-delà de ce nombre de tuiles, le rectangle (arrondi aux tuiles) devient une seule entrée
+MAX_TILES_PER_REQUEST = 64
+
+# Unités de la grille des tuiles par degré
+MICRO = 1_000_000
+
+
+class LRUCache:
+    """Dictionnaire borné thread-safe avec éviction LRU et compteurs hit/miss"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            'entries': len(self._data),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+def normalize_types(types):
+    """Liste séparée par des virgules (`types`, `sports`) triée et dédoublonnée, pour une clé stable"""
+    if not types:
+        return ()
+    return tuple(sorted({t.strip() for t in types.split(',') if t.strip()}))
+
+
+class ViewportCache:
+    """
+    Cache des équipements par tuiles.
+    `filters` est un tuple hashable de filtres normalisés (types, sports...).
+    `loader(bbox, filters)` renvoie une liste de (id, lon, lat, data) pour un rectangle
+    (ou pour toute la carte si bbox vaut None).
+    """
+
+    def __init__(self, max_entries, tile_deg):
+        self.tile_deg = tile_deg
+        self.tile_size = max(int(round(tile_deg * MICRO)), 1)
+        self._entries = LRUCache(max_entries)
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _sync_version(self, version):
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+
+    def _tile(self, lon, lat):
+        return (
+            math.floor(lon * MICRO) // self.tile_size,
+            math.floor(lat * MICRO) // self.tile_size,
+        )
+
+    def _tile_bbox(self, tx0, ty0, tx1, ty1):
+        """
+        Rectangle couvrant les tuiles [tx0..tx1] x [ty0..ty1], élargi d'un micro-degré :
+        les points dont _tile() tombe dans ces tuiles y sont toujours, malgré l'arrondi flottant.
+        """
+        size = self.tile_size
+        return (
+            (tx0 * size - 1) / MICRO, (ty0 * size - 1) / MICRO,
+            ((tx1 + 1) * size + 1) / MICRO, ((ty1 + 1) * size + 1) / MICRO,
+        )
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, version, bbox, filters, loader):
+        """Renvoie (items, hit) ; hit vaut True si aucune requête SQL n'a été nécessaire"""
+        self._sync_version(version)
+
+        if bbox is None:
+            key = (version, 'all', filters)
+            items = self._entries.get(key)
+            hit = items is not None
+            if not hit:
+                items = loader(None, filters)
+                self._entries.set(key, items)
+            self._count(hit)
+            return items, hit
+
+        sw_lng, sw_lat, ne_lng, ne_lat = bbox
+        if sw_lng > ne_lng or sw_lat > ne_lat:
+            self._count(True)
+            return [], True
+
+        tx0, ty0 = self._tile(sw_lng, sw_lat)
+        tx1, ty1 = self._tile(ne_lng, ne_lat)
+        tiles = [(tx, ty) for tx in range(tx0, tx1 + 1) for ty in range(ty0, ty1 + 1)]
+
+        if len(tiles) > MAX_TILES_PER_REQUEST:
+            # Vue très large : une seule entrée pour le rectangle arrondi aux tuiles
+            key = (version, 'box', tx0, ty0, tx1, ty1, filters)
+            candidates = self._entries.get(key)
+            hit = candidates is not None
+            if not hit:
+                candidates = loader(self._tile_bbox(tx0, ty0, tx1, ty1), filters)
+                self._entries.set(key, candidates)
+        else:
+            per_tile = {tile: self._entries.get((version, 'tile', tile, filters)) for tile in tiles}
+            missing = [tile for tile, items in per_tile.items() if items is None]
+            hit = not missing
+            if missing:
+                # Une seule requête pour le rectangle englobant les tuiles manquantes
+                mx0 = min(tx for tx, _ in missing)
+                my0 = min(ty for _, ty in missing)
+                mx1 = max(tx for tx, _ in missing)
+                my1 = max(ty for _, ty in missing)
+                buckets = {tile: [] for tile in missing}
+                for item in loader(self._tile_bbox(mx0, my0, mx1, my1), filters):
+                    bucket = buckets.get(self._tile(item[1], item[2]))
+                    if bucket is not None:
+                        bucket.append(item)
+                for tile, items in buckets.items():
+                    self._entries.set((version, 'tile', tile, filters), items)
+                    per_tile[tile] = items
+            candidates = [item for items in per_tile.values() for item in items]
+
+        items = [
+            item for item in candidates
+            if sw_lng <= item[1] <= ne_lng and sw_lat <= item[2] <= ne_lat
+        ]
+        items.sort(key=lambda item: item[0])
+        self._count(hit)
+        return items, hit
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        stats = self._entries.stats()
+        stats.update({'requests_hits': self.hits, 'requests_misses': self.misses, 'version': self._version})
+        return stats
+
+
+viewport_cache = ViewportCache(
+    max_entries=getattr(settings, 'VIEWPORT_CACHE_MAX_ENTRIES', 512),
+    tile_deg=getattr(settings, 'VIEWPORT_CACHE_TILE_DEG', 0.25),
+)
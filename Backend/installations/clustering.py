@@ -0,0 +1,141 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Clusters d'installations précalculés par niveau de zoom.
+
+Au zoom z, la carte est découpée en cellules de CLUSTER_RADIUS_PX pixels (projection
+web-mercator, tuiles de 256 px). Les cellules du zoom le plus fin sont calculées
+depuis les installations ; celles du zoom z-1 s'obtiennent en fusionnant les cellules
+filles (cx >> 1, cy >> 1). L'index est reconstruit une fois par version du jeu de données.
+"""
+
+import math
+from collections import Counter
+
+from .dataset import PerVersion
+from .models import Installation
+from .spatial import TILE_SIZE, lonlat_to_world
+
+CLUSTER_RADIUS_PX = 60
+MAX_CLUSTER_ZOOM = 16
+
+
+class Cluster:
+    __slots__ = ('count', 'sum_lon', 'sum_lat', 'families', 'id')
+
+    def __init__(self):
+        self.count = 0
+        self.sum_lon = 0.0
+        self.sum_lat = 0.0
+        self.families = Counter()
+        self.id = None
+
+    def merge(self, other):
+        self.count += other.count
+        self.sum_lon += other.sum_lon
+        self.sum_lat += other.sum_lat
+        self.families.update(other.families)
+        self.id = None
+
+    def as_dict(self):
+        data = {
+            'lon': round(self.sum_lon / self.count, 6),
+            'lat': round(self.sum_lat / self.count, 6),
+            'count': self.count,
+            'family': self.dominant_family(),
+        }
+        if self.count == 1:
+            data['id'] = self.id
+        return data
+
+    def dominant_family(self):
+        if not self.families:
+            return None
+        return max(self.families.items(), key=lambda item: (item[1], item[0] or ''))[0]
+
+
+class ClusterIndex:
+    """Pyramide de clusters : levels[z] = {(cx, cy): Cluster}"""
+
+    def __init__(self, points, max_zoom=MAX_CLUSTER_ZOOM, radius_px=CLUSTER_RADIUS_PX):
+        self.max_zoom = max_zoom
+        self.cells_per_tile = TILE_SIZE / radius_px
+        self.levels = [None] * (max_zoom + 1)
+
+        finest = {}
+        scale = self._scale(max_zoom)
+        for pk, lon, lat, family in points:
+            x, y = lonlat_to_world(lon, lat)
+            key = (int(x * scale), int(y * scale))
+            cluster = finest.get(key)
+            if cluster is None:
+                cluster = finest[key] = Cluster()
+                cluster.id = pk
+            else:
+                cluster.id = None
+            cluster.count += 1
+            cluster.sum_lon += lon
+            cluster.sum_lat += lat
+            cluster.families[family] += 1
+        self.levels[max_zoom] = finest
+
+        # Niveaux plus larges : fusion des cellules filles
+        for zoom in range(max_zoom - 1, -1, -1):
+            parents = {}
+            for (cx, cy), child in self.levels[zoom + 1].items():
+                key = (cx >> 1, cy >> 1)
+                parent = parents.get(key)
+                if parent is None:
+                    parent = parents[key] = Cluster()
+                    parent.id = child.id
+                    parent.count = child.count
+                    parent.sum_lon = child.sum_lon
+                    parent.sum_lat = child.sum_lat
+                    parent.families = Counter(child.families)
+                else:
+                    parent.merge(child)
+            self.levels[zoom] = parents
+
+    def _scale(self, zoom):
+        return (2 ** zoom) * self.cells_per_tile
+
+    def query(self, zoom, bbox=None):
+        """Clusters du zoom demandé dont le centroïde est dans bbox"""
+        zoom = min(max(zoom, 0), self.max_zoom)
+        level = self.levels[zoom]
+        if bbox is None:
+            return [cluster.as_dict() for cluster in level.values()]
+
+        sw_lng, sw_lat, ne_lng, ne_lat = bbox
+        scale = self._scale(zoom)
+        x0, y1 = lonlat_to_world(sw_lng, sw_lat)
+        x1, y0 = lonlat_to_world(ne_lng, ne_lat)
+        cx0, cx1 = int(x0 * scale), int(x1 * scale)
+        cy0, cy1 = int(y0 * scale), int(y1 * scale)
+
+        result = []
+        for (cx, cy), cluster in level.items():
+            if not (cx0 <= cx <= cx1 and cy0 <= cy <= cy1):
+                continue
+            data = cluster.as_dict()
+            if sw_lng <= data['lon'] <= ne_lng and sw_lat <= data['lat'] <= ne_lat:
+                result.append(data)
+        return result
+
+
+def _build_cluster_index(key):
+    points = Installation.objects.filter(latitude__isnull=False).values_list(
+        'id', 'longitude', 'latitude', 'equip_type_famille'
+    )
+    points = [p for p in points.iterator(chunk_size=5000) if math.isfinite(p[1]) and math.isfinite(p[2])]
+    return ClusterIndex(points)
+
+
+_cluster_index = PerVersion(_build_cluster_index)
+
+
+def get_cluster_index(key=None):
+    """Index de clusters de la version courante (construit une fois par worker)"""
+    return _cluster_index.get(key)
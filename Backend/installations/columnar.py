@@ -0,0 +1,404 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Magasin colonnes des installations, partagé par tous les workers (INSTALLATIONS_READ_ENGINE='columnar').
+
+Le fichier (INSTALLATIONS_COLUMNAR_PATH) est mappé en mémoire en lecture seule : les pages
+sont dans le cache du noyau une seule fois, quel que soit le nombre de workers gunicorn.
+
+Format :
+    MAGIC (8 octets) | longueur de l'en-tête (uint32) | en-tête JSON | sections alignées sur 8 octets
+L'en-tête contient la clé de version du jeu de données, les dictionnaires et la position
+de chaque section :
+    id (int64), lon/lat (float64, NaN sans coordonnées)
+    equip_type_name, equip_type_famille, equip_gest_type : codes uint32 -> dictionnaire
+    equip_acc_libre, inst_acc_handi_bool : uint8
+    sports : offsets uint32 (n+1) + codes uint32 -> dictionnaire
+    colonnes texte : offsets uint32 (n+1) + octets UTF-8 + masque NULL uint8
+
+Le fichier est réécrit entièrement (fichier temporaire + os.replace, atomique) à la fin de
+chaque lot (import, synchronisation, purge). Les modifications unitaires ne le réécrivent
+pas : à la lecture, la clé de l'en-tête est comparée à la clé courante (current_dataset_key)
+et le fichier est reconstruit une fois s'il est périmé. Les workers voient le nouvel inode
+au prochain accès et remappent le fichier.
+"""
+
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from bisect import bisect_right
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from .dataset import (
+    current_dataset_key, dataset_key, forget_dataset_key, get_dataset_state, register_dataset_hook,
+)
+from .models import GeoJSONSnapshot, Installation
+from .serializers import INSTALLATION_FIELDS
+from .spatial import parse_coordinates
+
+MAGIC = b'SPMCOL01'
+ALIGN = 8
+
+CODED_COLUMNS = ('equip_type_name', 'equip_type_famille', 'equip_gest_type')
+FLAG_COLUMNS = ('equip_acc_libre', 'inst_acc_handi_bool')
+TEXT_COLUMNS = (
+    'inst_numero', 'inst_nom', 'equip_aps_nom', 'equip_url', 'inst_adresse',
+    'inst_cp', 'postal_code', 'equip_prop_nom', 'coordonnees',
+)
+
+SOURCE_COLUMNS = (
+    'id', 'longitude', 'latitude', 'coordonnees',
+    *CODED_COLUMNS, *FLAG_COLUMNS,
+    'inst_numero', 'inst_nom', 'equip_aps_nom', 'equip_url', 'inst_adresse', 'inst_cp', 'postal_code',
+    'equip_prop_nom', 'sports_list',
+)
+
+
+def columnar_enabled():
+    return getattr(settings, 'INSTALLATIONS_READ_ENGINE', 'db') == 'columnar'
+
+
+def store_path():
+    return settings.INSTALLATIONS_COLUMNAR_PATH
+
+
+# ===== ÉCRITURE =====
+
+def _text_section(values):
+    """(offsets, données, masque NULL) d'une colonne texte"""
+    offsets = array('I', [0])
+    nulls = array('B')
+    data = bytearray()
+    for value in values:
+        nulls.append(value is None)
+        if value is not None:
+            data += value.encode('utf-8')
+        offsets.append(len(data))
+    return offsets, bytes(data), nulls
+
+
+def write_store(path=None):
+    """Lire les installations en base et (ré)écrire le fichier colonnes de manière atomique"""
+    path = path or store_path()
+    state = get_dataset_state()
+    key = dataset_key(state)
+
+    ids, lons, lats = array('q'), array('d'), array('d')
+    codes = {column: array('I') for column in CODED_COLUMNS}
+    dictionaries = {column: {} for column in CODED_COLUMNS}
+    dictionaries['sports'] = {}
+    flags = {column: array('B') for column in FLAG_COLUMNS}
+    texts = {column: [] for column in TEXT_COLUMNS}
+    sport_offsets, sport_codes = array('I', [0]), array('I')
+
+    rows = Installation.objects.order_by('id').values(*SOURCE_COLUMNS)
+    for row in rows.iterator(chunk_size=5000):
+        ids.append(row['id'])
+        point = (row['longitude'], row['latitude'])
+        if point[1] is None:
+            point = parse_coordinates(row['coordonnees']) or (math.nan, math.nan)
+        lons.append(point[0])
+        lats.append(point[1])
+        for column in CODED_COLUMNS:
+            dictionary = dictionaries[column]
+            codes[column].append(dictionary.setdefault(row[column], len(dictionary)))
+        for column in FLAG_COLUMNS:
+            flags[column].append(bool(row[column]))
+        for sport in row['sports_list'] or ():
+            sport_codes.append(dictionaries['sports'].setdefault(sport, len(dictionaries['sports'])))
+        sport_offsets.append(len(sport_codes))
+        for column in TEXT_COLUMNS:
+            value = row[column]
+            if column == 'coordonnees' and value is not None:
+                value = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+            texts[column].append(value)
+
+    sections = [('id', ids), ('lon', lons), ('lat', lats), ('sports.offsets', sport_offsets), ('sports.codes', sport_codes)]
+    sections += [(column, codes[column]) for column in CODED_COLUMNS]
+    sections += [(column, flags[column]) for column in FLAG_COLUMNS]
+    for column in TEXT_COLUMNS:
+        offsets, data, nulls = _text_section(texts[column])
+        sections += [(f'{column}.offsets', offsets), (f'{column}.data', data), (f'{column}.null', nulls)]
+
+    layout, position = {}, 0
+    for name, values in sections:
+        typecode = values.typecode if isinstance(values, array) else 'B'
+        size = len(values) * (values.itemsize if isinstance(values, array) else 1)
+        layout[name] = [position, size, typecode]
+        position += size + (-size % ALIGN)
+
+    header = json.dumps({
+        'key': key,
+        'version': state[0],
+        'updated_at': state[1].isoformat() if state[1] else None,
+        'count': len(ids),
+        'byteorder': sys.byteorder,
+        'dictionaries': {name: list(values) for name, values in dictionaries.items()},
+        'sections': layout,
+    }, ensure_ascii=False).encode('utf-8')
+    prefix = len(MAGIC) + 4 + len(header)
+    prefix += -prefix % ALIGN
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.installations-', suffix='.col.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC + struct.pack('<I', len(header)) + header)
+            f.write(b'\0' * (prefix - len(MAGIC) - 4 - len(header)))
+            for name, values in sections:
+                f.seek(prefix + layout[name][0])
+                f.write(values.tobytes() if isinstance(values, array) else values)
+            f.truncate(prefix + position)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    print(f"✅ Magasin colonnes v{state[0]} écrit : {len(ids)} installations ({path})")
+    return key
+
+
+# ===== LECTURE =====
+
+class ColumnarStore:
+    """Vue en lecture seule sur un fichier colonnes mappé en mémoire"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"Fichier colonnes invalide : {path}")
+        (header_len,) = struct.unpack_from('<I', buffer, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(bytes(buffer[start:start + header_len]).decode('utf-8'))
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError(f"Fichier colonnes écrit sur une autre architecture : {path}")
+        prefix = start + header_len
+        prefix += -prefix % ALIGN
+
+        self.key = header['key']
+        self.version = header['version']
+        self.updated_at = datetime.fromisoformat(header['updated_at']) if header['updated_at'] else None
+        self.count = header['count']
+        self.dictionaries = header['dictionaries']
+
+        self._columns = {}
+        for name, (offset, size, typecode) in header['sections'].items():
+            self._columns[name] = buffer[prefix + offset:prefix + offset + size].cast(typecode)
+
+        self.ids = self._columns['id']
+        self.lons = self._columns['lon']
+        self.lats = self._columns['lat']
+
+    def __len__(self):
+        return self.count
+
+    # --- Accès par ligne ---
+
+    def text(self, column, i):
+        if self._columns[f'{column}.null'][i]:
+            return None
+        offsets = self._columns[f'{column}.offsets']
+        return bytes(self._columns[f'{column}.data'][offsets[i]:offsets[i + 1]]).decode('utf-8')
+
+    def coded(self, column, i):
+        return self.dictionaries[column][self._columns[column][i]]
+
+    def flag(self, column, i):
+        return bool(self._columns[column][i])
+
+    def sport_codes(self, i):
+        offsets = self._columns['sports.offsets']
+        return self._columns['sports.codes'][offsets[i]:offsets[i + 1]]
+
+    def sports(self, i):
+        """Sports de la ligne i, dans l'ordre de sports_list"""
+        names = self.dictionaries['sports']
+        return [names[code] for code in self.sport_codes(i)]
+
+    def coordonnees(self, i):
+        value = self.text('coordonnees', i)
+        return json.loads(value) if value is not None else None
+
+    def has_point(self, i):
+        return not math.isnan(self.lats[i])
+
+    # --- Sélection ---
+
+    def _codes_for(self, dictionary, values):
+        return {code for code, value in enumerate(self.dictionaries[dictionary]) if value in values}
+
+    def select(self, bbox=None, types=None, sports=None):
+        """Indices des lignes (triées par id) correspondant aux filtres"""
+        lons, lats = self.lons, self.lats
+        type_codes = self._codes_for('equip_type_name', set(types)) if types else None
+        sport_codes = self._codes_for('sports', set(sports)) if sports else None
+        type_column = self._columns['equip_type_name']
+
+        result = []
+        for i in range(self.count):
+            if bbox is not None:
+                sw_lng, sw_lat, ne_lng, ne_lat = bbox
+                if not (sw_lng <= lons[i] <= ne_lng and sw_lat <= lats[i] <= ne_lat):
+                    continue
+            if type_codes is not None and type_column[i] not in type_codes:
+                continue
+            if sport_codes is not None and not sport_codes.intersection(self.sport_codes(i)):
+                continue
+            result.append(i)
+        return result
+
+    def page_after(self, after_id=None, limit=10):
+        """Indices des `limit` lignes d'id strictement supérieur à `after_id` (ids triés)"""
+        start = 0 if after_id is None else bisect_right(self.ids, after_id)
+        return list(range(start, min(start + limit, self.count)))
+
+    # --- Représentations ---
+
+    def field(self, name, i):
+        """Valeur d'un champ de InstallationSerializer pour la ligne i"""
+        if name == 'id':
+            return self.ids[i]
+        if name == 'coordonnees':
+            return self.coordonnees(i)
+        if name == 'inst_cp':
+            return self.text('postal_code', i)
+        if name in CODED_COLUMNS:
+            return self.coded(name, i)
+        if name in FLAG_COLUMNS:
+            return self.flag(name, i)
+        return self.text(name, i)
+
+    def equipment(self, i, fields=None):
+        """Même dictionnaire que InstallationSerializer, éventuellement limité à `fields`"""
+        return {name: self.field(name, i) for name in (fields or INSTALLATION_FIELDS)}
+
+    def geojson_row(self, i):
+        """Tuple dans l'ordre de snapshot.GEOJSON_COLUMNS"""
+        return (
+            self.ids[i], self.coordonnees(i), self.text('inst_nom', i),
+            self.coded('equip_type_name', i), self.coded('equip_type_famille', i),
+            self.sports(i), self.text('equip_aps_nom', i), self.flag('equip_acc_libre', i),
+            self.text('equip_url', i), self.text('inst_adresse', i), self.text('postal_code', i),
+            self.text('equip_prop_nom', i), self.coded('equip_gest_type', i),
+            self.flag('inst_acc_handi_bool', i),
+        )
+
+    def geojson_rows(self, indices=None):
+        for i in (range(self.count) if indices is None else indices):
+            yield self.geojson_row(i)
+
+    def load_equipments(self, bbox, filters):
+        """Chargeur du cache par tuiles (même contrat que views._load_equipments)"""
+        types_list, sports_list, fields = filters
+        items = []
+        for i in self.select(bbox, types_list, sports_list):
+            if self.has_point(i):
+                point = (self.lons[i], self.lats[i])
+            elif bbox is None:
+                point = (None, None)
+            else:
+                continue
+            items.append((self.ids[i], point[0], point[1], self.equipment(i, fields)))
+        return items
+
+
+_lock = threading.Lock()
+_rebuild_lock = threading.Lock()
+# (signature du fichier, magasin) remplacés ensemble
+_current = (None, None)
+
+
+def _mapped_store(path):
+    """Magasin du fichier `path` ; remappé quand le fichier a été remplacé (nouvel inode)"""
+    global _current
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    current_signature, store = _current
+    if current_signature == signature:
+        return store
+    with _lock:
+        current_signature, store = _current
+        if current_signature != signature:
+            store = ColumnarStore(path)
+            _current = (signature, store)
+        return store
+
+
+def get_store(key=None):
+    """
+    Magasin de la version `key` (par défaut current_dataset_key()). Fichier absent ou d'une
+    autre version (modification unitaire depuis le dernier lot) : reconstruit une fois.
+    """
+    key = key or current_dataset_key()
+    path = store_path()
+    store = _mapped_store(path)
+    if store is not None and store.key == key:
+        return store
+    with _rebuild_lock:
+        # Clé relue en base : un autre thread (ou worker) a pu reconstruire le fichier
+        # pendant l'attente, ou la clé mémorisée être simplement en retard sur le fichier
+        forget_dataset_key()
+        key = current_dataset_key()
+        store = _mapped_store(path)
+        if store is None or store.key != key:
+            write_store(path)
+            store = _mapped_store(path)
+        return store
+
+
+# ===== GEOJSON =====
+
+_geojson_lock = threading.Lock()
+_geojson = (None, None)
+
+
+def get_columnar_geojson(store=None):
+    """FeatureCollection du magasin (GeoJSONSnapshot non enregistré), construite une fois par fichier"""
+    global _geojson
+    from .snapshot import build_snapshot_payload
+
+    store = store or get_store()
+    key, snapshot = _geojson
+    if key == store.key:
+        return snapshot
+    with _geojson_lock:
+        key, snapshot = _geojson
+        if key != store.key:
+            payload, payload_gzip, etag, count = build_snapshot_payload(rows=store.geojson_rows())
+            snapshot = GeoJSONSnapshot(
+                dataset_key=store.key, version=store.version, etag=etag, feature_count=count,
+                payload=payload, payload_gzip=payload_gzip,
+                last_modified=store.updated_at or timezone.now(),
+            )
+            _geojson = (store.key, snapshot)
+        return snapshot
+
+
+# ===== RECONSTRUCTION =====
+
+@register_dataset_hook
+def rebuild_columnar_store(key):
+    """Réécrire le fichier après un import / une synchronisation / une purge"""
+    if columnar_enabled():
+        write_store()
@@ -0,0 +1,89 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Format de réponse "columnar" (`format=columnar`) des endpoints carte.
+
+Au lieu d'un objet par installation : des tableaux parallèles (ids, lons, lats) et une
+colonne par champ. Les colonnes catégorielles (type, famille, gestion, propriétaire) sont
+encodées par dictionnaire : chaque valeur distincte est envoyée une seule fois dans
+`dictionaries`, la colonne ne contient que son indice. Avec `precision=n`, les coordonnées
+sont quantifiées en entiers (valeur * 10^n, `scale` = 10^n).
+
+    {"format": "columnar", "count": 2, "ids": [1, 2], "lons": [537000, 537100],
+     "lats": [4329000, 4329100], "scale": 100000,
+     "dictionaries": {"equip_type_name": ["Court de tennis"]},
+     "columns": {"equip_type_name": [0, 0], "inst_nom": ["Stade A", "Stade B"]}}
+"""
+
+import json
+
+MAX_PRECISION = 7
+
+# Colonnes encodées par dictionnaire (equipments / propriétés GeoJSON)
+CATEGORICAL_FIELDS = ('equip_type_name', 'equip_type_famille', 'equip_gest_type', 'equip_prop_nom')
+CATEGORICAL_PROPERTIES = ('type', 'family', 'gestion', 'owner')
+
+
+def response_format(request, allowed=('json', 'columnar')):
+    """Paramètre `format` ('json' par défaut, 'geojson' synonyme) ; ValueError si non proposé"""
+    value = request.GET.get('format') or 'json'
+    if value == 'geojson':
+        value = 'json'
+    if value not in allowed:
+        raise ValueError(f"Format inconnu : {value} (formats : {', '.join(allowed)})")
+    return value
+
+
+def parse_precision(value):
+    """Nombre de décimales des coordonnées (None = pas de quantification)"""
+    if value in (None, ''):
+        return None
+    precision = int(value)
+    if not 0 <= precision <= MAX_PRECISION:
+        raise ValueError(f"precision doit être comprise entre 0 et {MAX_PRECISION}")
+    return precision
+
+
+def encode_columnar(records, columns, categorical=(), precision=None):
+    """
+    Payload columnar depuis des (id, lon, lat, {champ: valeur}).
+    `columns` : champs à écrire, dans l'ordre ; `categorical` : ceux à encoder par dictionnaire.
+    """
+    scale = 10 ** precision if precision is not None else None
+    ids, lons, lats = [], [], []
+    values = {column: [] for column in columns}
+    dictionaries = {column: {} for column in columns if column in categorical}
+
+    for pk, lon, lat, data in records:
+        ids.append(pk)
+        if scale is not None and lon is not None:
+            lon, lat = round(lon * scale), round(lat * scale)
+        lons.append(lon)
+        lats.append(lat)
+        for column in columns:
+            value = data[column]
+            dictionary = dictionaries.get(column)
+            if dictionary is not None:
+                value = dictionary.setdefault(value, len(dictionary))
+            values[column].append(value)
+
+    payload = {'format': 'columnar', 'count': len(ids), 'ids': ids, 'lons': lons, 'lats': lats}
+    if scale is not None:
+        payload['scale'] = scale
+    payload['dictionaries'] = {column: list(dictionary) for column, dictionary in dictionaries.items()}
+    payload['columns'] = values
+    return payload
+
+
+def feature_records(features):
+    """(id, lon, lat, propriétés) depuis des features GeoJSON (snapshot.iter_features)"""
+    for feature in features:
+        lon, lat = feature['geometry']['coordinates']
+        yield feature['properties']['id'], lon, lat, feature['properties']
+
+
+def dumps(payload):
+    """JSON compact (sans espaces) en octets"""
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
@@ -0,0 +1,254 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Version du jeu de données des installations.
+
+Toute modification d'une installation incrémente `DatasetState.version`
+(signaux pour les modifications unitaires, `dataset_batch()` pour les commandes
+d'import). Les caches en mémoire se basent sur `dataset_key()` : la clé change
+à chaque modification, y compris après un rollback qui réutiliserait un numéro.
+
+Chaque passage de version attribue aussi le nouveau numéro aux installations modifiées
+(`row_version`) et aux suppressions (`InstallationTombstone`) pas encore versionnées :
+un client à la version N récupère ce qui a changé avec `row_version > N` (voir delta.py).
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import DatasetState, Installation, InstallationTombstone
+
+_local = threading.local()
+
+# Nombre de versions pendant lesquelles les suppressions sont conservées pour les deltas
+SYNC_HISTORY_VERSIONS = 1000
+
+# Fonctions appelées avec la clé de la nouvelle version à la fin de chaque lot
+_dataset_hooks = []
+
+# (clé, échéance) de current_dataset_key(), remplacés ensemble
+_current_key = (None, 0.0)
+
+
+def get_dataset_state():
+    """(version, updated_at) courants ; (0, None) si aucune version n'a encore été écrite"""
+    row = DatasetState.objects.filter(pk=DatasetState.SINGLETON_ID).values_list(
+        'version', 'updated_at'
+    ).first()
+    return row or (0, None)
+
+
+def get_dataset_version():
+    """Numéro de version courant du jeu de données"""
+    return get_dataset_state()[0]
+
+
+def dataset_key(state=None):
+    """Clé opaque de la version courante, utilisée pour indexer les caches"""
+    version, updated_at = state or get_dataset_state()
+    stamp = int(updated_at.timestamp() * 1_000_000) if updated_at else 0
+    return f"{version}.{stamp:x}"
+
+
+def current_dataset_key():
+    """
+    dataset_key() lue à chaque appel (une recherche par clé primaire).
+    Avec DATASET_KEY_TTL > 0 (opt-in), mémorisée ce nombre de secondes par processus :
+    les autres workers peuvent alors servir la version précédente jusqu'à l'échéance.
+    Oubliée dès que ce processus change la version.
+    """
+    global _current_key
+    key, expires = _current_key
+    now = time.monotonic()
+    if key is None or now >= expires:
+        key = dataset_key()
+        _current_key = (key, now + getattr(settings, 'DATASET_KEY_TTL', 0))
+    return key
+
+
+def forget_dataset_key():
+    global _current_key
+    _current_key = (None, 0.0)
+
+
+def _stamp_changes(version):
+    """Attribuer `version` aux lignes modifiées et aux suppressions pas encore versionnées"""
+    Installation.objects.filter(row_version__isnull=True).update(row_version=version)
+    InstallationTombstone.objects.filter(version__isnull=True).update(version=version)
+    InstallationTombstone.objects.filter(version__lte=version - SYNC_HISTORY_VERSIONS).delete()
+
+
+def bump_dataset_version():
+    """Incrémenter la version du jeu de données et renvoyer la nouvelle valeur"""
+    with transaction.atomic():
+        updated = DatasetState.objects.filter(pk=DatasetState.SINGLETON_ID).update(
+            version=F('version') + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            state, created = DatasetState.objects.select_for_update().get_or_create(
+                pk=DatasetState.SINGLETON_ID, defaults={'version': 1}
+            )
+            if not created:
+                DatasetState.objects.filter(pk=state.pk).update(
+                    version=F('version') + 1, updated_at=timezone.now()
+                )
+        version = get_dataset_version()
+        _stamp_changes(version)
+        forget_dataset_key()
+        transaction.on_commit(forget_dataset_key)
+        return version
+
+
+def get_sync_floor():
+    """Plus ancienne version à partir de laquelle un delta peut être calculé"""
+    return DatasetState.objects.filter(pk=DatasetState.SINGLETON_ID).values_list('sync_floor', flat=True).first() or 0
+
+
+def get_dataset_fingerprint():
+    """Empreinte enregistrée par le dernier bootstrap_dataset (None si aucun)"""
+    return DatasetState.objects.filter(pk=DatasetState.SINGLETON_ID).values_list('fingerprint', flat=True).first()
+
+
+def set_dataset_fingerprint(fingerprint):
+    """Enregistrer l'empreinte sans changer la version ni dataset_key() (update : pas d'auto_now)"""
+    DatasetState.objects.get_or_create(pk=DatasetState.SINGLETON_ID)
+    DatasetState.objects.filter(pk=DatasetState.SINGLETON_ID).update(fingerprint=fingerprint)
+
+
+def reset_sync_history():
+    """
+    Les ids ne désignent plus les mêmes installations (TRUNCATE ... RESTART IDENTITY) :
+    les clients devront tout retélécharger. À appeler après le lot concerné.
+    """
+    version = get_dataset_version()
+    DatasetState.objects.filter(pk=DatasetState.SINGLETON_ID).update(sync_floor=version)
+    InstallationTombstone.objects.all().delete()
+
+
+def register_dataset_hook(func):
+    """
+    Enregistrer une reconstruction à lancer après chaque lot (snapshot, index...).
+    Utilisable comme décorateur.
+    """
+    if func not in _dataset_hooks:
+        _dataset_hooks.append(func)
+    return func
+
+
+def run_dataset_hooks():
+    """Lancer les reconstructions enregistrées pour la version courante"""
+    key = dataset_key()
+    for hook in _dataset_hooks:
+        try:
+            hook(key)
+        except Exception as e:
+            print(f"❌ Erreur reconstruction {hook.__name__}: {e}")
+
+
+class PerVersion:
+    """Valeur construite une seule fois par processus et par version du jeu de données"""
+
+    def __init__(self, builder):
+        self._builder = builder
+        self._lock = threading.Lock()
+        # (clé, valeur) remplacés ensemble pour ne jamais mélanger deux versions
+        self._entry = (None, None)
+
+    def get(self, key=None):
+        key = key or dataset_key()
+        entry_key, value = self._entry
+        if entry_key == key:
+            return value
+        with self._lock:
+            entry_key, value = self._entry
+            if entry_key != key:
+                value = self._builder(key)
+                self._entry = (key, value)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entry = (None, None)
+
+
+def _save_batch_tombstones():
+    """Suppressions du lot enregistrées en une fois (sauf lignes toujours présentes : lot annulé)"""
+    tombstones, _local.tombstones = getattr(_local, 'tombstones', []), []
+    ids = [tombstone.installation_id for tombstone in tombstones]
+    existing = set()
+    for start in range(0, len(ids), 5000):
+        existing.update(Installation.objects.filter(id__in=ids[start:start + 5000]).values_list('id', flat=True))
+    saved = [tombstone for tombstone in tombstones if tombstone.installation_id not in existing]
+    InstallationTombstone.objects.bulk_create(saved, batch_size=2000)
+    _local.tombstones_saved = bool(saved)
+
+
+def in_dataset_batch():
+    return getattr(_local, 'batch_depth', 0) > 0
+
+
+class DatasetBatch:
+    """Lot en cours ; `changed = False` si le lot n'a finalement rien modifié"""
+
+    def __init__(self):
+        self.changed = True
+
+
+@contextmanager
+def dataset_batch():
+    """
+    Regrouper des modifications massives (imports, purges) en une seule nouvelle version.
+    Les signaux par ligne sont ignorés pendant le lot ; à la sortie, la version est
+    incrémentée puis les reconstructions enregistrées sont lancées (sauf si aucun des lots
+    imbriqués n'a modifié les données, ou si le lot s'est terminé par une exception).
+    """
+    _local.batch_depth = getattr(_local, 'batch_depth', 0) + 1
+    if _local.batch_depth == 1:
+        _local.tombstones = []
+        _local.batch_changed = False
+    batch = DatasetBatch()
+    raised = False
+    try:
+        yield batch
+    except BaseException:
+        raised = True
+        raise
+    finally:
+        _local.batch_depth -= 1
+        _local.batch_changed = _local.batch_changed or (batch.changed and not raised)
+        if _local.batch_depth == 0:
+            # Traces des suppressions effectivement validées (les lignes encore présentes sont
+            # ignorées) : versionnées au prochain passage de version si celui-ci est sauté
+            _save_batch_tombstones()
+            if not raised and (_local.batch_changed or _local.tombstones_saved):
+                bump_dataset_version()
+                run_dataset_hooks()
+
+
+# Connecté avant installation_changed : la trace existe quand la version est incrémentée
+@receiver(post_delete, sender=Installation)
+def installation_deleted(sender, instance, **kwargs):
+    """Garder une trace de la suppression pour les clients synchronisés (sync/?since=)"""
+    tombstone = InstallationTombstone(installation_id=instance.pk)
+    if in_dataset_batch():
+        _local.tombstones.append(tombstone)
+    else:
+        tombstone.save()
+
+
+@receiver(post_save, sender=Installation)
+@receiver(post_delete, sender=Installation)
+def installation_changed(sender, **kwargs):
+    """Modification unitaire (admin, API) : nouvelle version du jeu de données"""
+    if not in_dataset_batch():
+        bump_dataset_version()
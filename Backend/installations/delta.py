@@ -0,0 +1,53 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Synchronisation incrémentale des clients (`sync/?since=N`).
+
+Un client qui a le jeu de données en version N (en-tête X-Dataset-Version de geojson/,
+ou `version` d'une réponse précédente) reçoit seulement les features modifiées et les ids
+supprimés depuis : `row_version` et `InstallationTombstone.version` dans ]N, version].
+Si l'écart est trop grand (historique purgé, ids réinitialisés, trop de changements),
+la réponse contient le snapshot complet à la place.
+"""
+
+from .dataset import SYNC_HISTORY_VERSIONS, get_dataset_state, get_sync_floor
+from .models import Installation, InstallationTombstone
+from .snapshot import iter_features
+
+# Au-delà, le snapshot complet (compressé, en cache) coûte moins cher qu'un delta
+MAX_DELTA_CHANGES = 2000
+
+
+class Delta:
+    __slots__ = ('since', 'version', 'full', 'upserted', 'deleted')
+
+    def __init__(self, since, version, full=False, upserted=(), deleted=()):
+        self.since = since
+        self.version = version
+        self.full = full
+        self.upserted = list(upserted)
+        self.deleted = list(deleted)
+
+
+def changes_since(since, state=None):
+    """Delta entre la version `since` du client et la version courante (ou Delta.full)"""
+    version = (state or get_dataset_state())[0]
+    if since == version:
+        return Delta(since, version)
+    if since > version or since < get_sync_floor() or version - since >= SYNC_HISTORY_VERSIONS:
+        return Delta(since, version, full=True)
+
+    # Bornée à `version` : une modification validée entre-temps sera dans le prochain delta
+    changed = Installation.objects.filter(row_version__gt=since, row_version__lte=version)
+    removed = InstallationTombstone.objects.filter(version__gt=since, version__lte=version)
+    if changed.count() + removed.count() > MAX_DELTA_CHANGES:
+        return Delta(since, version, full=True)
+
+    upserted = list(iter_features(changed))
+    present = {feature['properties']['id'] for feature in upserted}
+    # Supprimées, ou modifiées sans coordonnées valides (absentes du GeoJSON) : à retirer
+    deleted = set(removed.values_list('installation_id', flat=True))
+    deleted.update(changed.exclude(id__in=present).values_list('id', flat=True))
+    return Delta(since, version, upserted=upserted, deleted=sorted(deleted - present))
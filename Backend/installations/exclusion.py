@@ -0,0 +1,93 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Exclusion des installations non ouvertes au public (écoles, prisons, armée, CREPS...).
+
+Liste unique des mots-clés, utilisée par le nettoyage du CSV (data/clean_data.py), l'import
+(load_csv rejette les lignes) et la purge (purge_banned_installations).
+
+Les mots-clés sont cherchés dans le texte replié (normalize_text : sans accents ni casse,
+"École" comme "ECOLE") par un automate d'Aho-Corasick construit une fois : un seul passage
+sur le texte, quel que soit le nombre de mots-clés.
+
+Ce module ne dépend pas de Django (importé par les scripts de data/).
+"""
+
+from collections import deque
+
+from .text import normalize_text
+
+EXCLUDED_KEYWORDS = (
+    'ecole', 'college', 'lycee', 'universite', 'scolaire',  # Scolaire
+    'militaire', 'armee',                                    # Militaire
+    'penitentiaire', 'prison', 'centre de detention',        # Pénitentiaire
+    'creps', 'ecole nationale',                              # CREPS / National
+)
+
+# Champs du CSV / du modèle examinés
+EXCLUDED_FIELDS = ('inst_nom', 'equip_type_name')
+
+
+class KeywordMatcher:
+    """Automate d'Aho-Corasick (transitions complètes) sur des mots-clés repliés"""
+
+    def __init__(self, keywords):
+        self.keywords = tuple(dict.fromkeys(keyword for keyword in map(normalize_text, keywords) if keyword))
+        trie, output = [{}], [None]
+        for keyword in self.keywords:
+            state = 0
+            for char in keyword:
+                if char not in trie[state]:
+                    trie.append({})
+                    output.append(None)
+                    trie[state][char] = len(trie) - 1
+                state = trie[state][char]
+            output[state] = output[state] or keyword
+
+        # Parcours en largeur : lien d'échec de chaque état, puis transitions complétées depuis
+        # celles de l'état d'échec (déjà complètes, moins profond). Caractère absent = racine.
+        fail = [0] * len(trie)
+        goto = [dict(edges) for edges in trie]
+        queue = deque(trie[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in trie[state].items():
+                fail[child] = goto[fail[state]].get(char, 0)
+                output[child] = output[child] or output[fail[child]]
+                queue.append(child)
+            for char, target in goto[fail[state]].items():
+                goto[state].setdefault(char, target)
+        self._goto = goto
+        self._output = output
+
+    def search(self, text):
+        """Premier mot-clé trouvé dans le texte (replié ici), ou None"""
+        goto, output = self._goto, self._output
+        state = 0
+        for char in normalize_text(text):
+            state = goto[state].get(char, 0)
+            if output[state] is not None:
+                return output[state]
+        return None
+
+    def __contains__(self, text):
+        return self.search(text) is not None
+
+
+exclusion_matcher = KeywordMatcher(EXCLUDED_KEYWORDS)
+
+
+def excluded_keyword(row, fields=EXCLUDED_FIELDS):
+    """Mot-clé d'exclusion trouvé dans les champs d'une ligne (dict), ou None"""
+    for field in fields:
+        keyword = exclusion_matcher.search(row.get(field))
+        if keyword is not None:
+            return keyword
+    return None
+
+
+def should_exclude(row):
+    """La ligne (CSV ou valeurs d'Installation) désigne-t-elle une installation à exclure ?"""
+    return excluded_keyword(row) is not None
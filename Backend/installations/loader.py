@@ -0,0 +1,348 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Chargement massif du CSV des équipements par COPY (load_csv --copy).
+
+Les lignes validées sont envoyées en flux à PostgreSQL (`COPY ... FROM STDIN`) dans une
+table temporaire de staging, sans instancier de modèles. Les colonnes dérivées
+(lat/lon/grid_cell, postal_code, sports_list) sont calculées au passage, comme dans
+Installation.save(). Le transfert vers `installations` (et la liaison des sports) se fait
+ensuite en SQL ensembliste, dans une seule transaction courte.
+
+Chaque ligne garde son `id` CSV (source_id) et une empreinte de son contenu (content_hash) :
+`upsert_from_staging` (load_csv --upsert) n'écrit que les lignes ajoutées, modifiées ou
+disparues, et les installations conservent leur id (signalements, check-ins).
+"""
+
+import ast
+import hashlib
+import json
+
+from django.db import connection, models, transaction
+
+from .models import Installation
+from .spatial import grid_cell, parse_coordinates
+from .text import normalize_sports, plm_postal_code
+
+STAGING_TABLE = 'installations_staging'
+
+# Champ du modèle -> colonne du CSV
+CSV_COLUMNS = (
+    ('inst_numero', 'inst_numero'),
+    ('inst_nom', 'inst_nom'),
+    ('equip_type_name', 'equip_type_name'),
+    ('equip_type_famille', 'equip_type_famille'),
+    ('equip_aps_nom', 'aps_name'),
+    ('equip_acc_libre', 'equip_acc_libre'),
+    ('equip_url', 'equip_url'),
+    ('inst_adresse', 'inst_adresse'),
+    ('inst_cp', 'new_code'),
+    ('equip_prop_nom', 'equip_prop_nom'),
+    ('equip_gest_type', 'equip_gest_type'),
+    ('inst_acc_handi_bool', 'inst_acc_handi_bool'),
+)
+BOOLEAN_FIELDS = ('equip_acc_libre', 'inst_acc_handi_bool')
+
+# Colonnes du CSV couvertes par content_hash ; HASH_VERSION change si le calcul des
+# colonnes dérivées change (toutes les lignes sont alors réécrites au prochain upsert)
+HASHED_COLUMNS = ('equip_coordonnees',) + tuple(column for _, column in CSV_COLUMNS)
+HASH_VERSION = 1
+
+# Colonnes écrites dans installations (même ordre que staging_values)
+CONTENT_COLUMNS = ('coordonnees',) + tuple(field for field, _ in CSV_COLUMNS) + (
+    'longitude', 'latitude', 'grid_cell', 'postal_code', 'sports_list',
+)
+STAGING_COLUMNS = CONTENT_COLUMNS + ('source_id', 'content_hash')
+
+
+def parse_coordonnees(coord_str):
+    """Coordonnées du CSV (JSON ou dict Python) ; ValueError si le format est invalide"""
+    try:
+        if coord_str.startswith('{'):
+            return json.loads(coord_str.replace("'", '"'))
+        return ast.literal_eval(coord_str)
+    except (json.JSONDecodeError, ValueError, SyntaxError) as e:
+        raise ValueError(f"Invalid coordinates format: {coord_str}") from e
+
+
+def parse_boolean(value):
+    """Parse les valeurs booléennes"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return value.lower() in ['true', '1', 'yes', 'oui']
+    return False
+
+
+def row_hash(row):
+    """Empreinte MD5 du contenu d'une ligne du CSV (sans la colonne id)"""
+    digest = hashlib.md5(f'v{HASH_VERSION}'.encode())
+    for column in HASHED_COLUMNS:
+        digest.update(b'\x1f')
+        digest.update((row.get(column) or '').encode('utf-8'))
+    return digest.hexdigest()
+
+
+def installation_fields(row, coordonnees):
+    """Champs d'Installation depuis une ligne du CSV (DictReader)"""
+    fields = {'coordonnees': coordonnees}
+    for field, column in CSV_COLUMNS:
+        if field in BOOLEAN_FIELDS:
+            fields[field] = parse_boolean(row.get(column, False))
+        else:
+            fields[field] = row.get(column, '')
+    fields['source_id'] = row.get('id') or None
+    fields['content_hash'] = row_hash(row)
+    return fields
+
+
+def staging_values(fields):
+    """Valeurs d'une ligne de staging (STAGING_COLUMNS), colonnes dérivées comprises"""
+    point = parse_coordinates(fields['coordonnees'])
+    lon, lat = point if point is not None else (None, None)
+    return (fields['coordonnees'],) + tuple(fields[field] for field, _ in CSV_COLUMNS) + (
+        lon, lat, grid_cell(lon, lat) if point is not None else None,
+        plm_postal_code(fields['inst_cp']), normalize_sports(fields['equip_aps_nom']),
+        fields['source_id'], fields['content_hash'],
+    )
+
+
+def _copy_value(value):
+    """Valeur au format CSV de COPY (NULL = champ vide non quoté)"""
+    if value is None:
+        return ''
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False)
+    return '"' + value.replace('"', '""') + '"'
+
+
+class CopyStream:
+    """Fichier en lecture pour copy_expert, alimenté à la demande par un itérable de tuples"""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._pending = ''
+
+    def read(self, size=-1):
+        chunks, length = [self._pending], len(self._pending)
+        while size < 0 or length < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            line = ','.join(_copy_value(value) for value in row) + '\n'
+            chunks.append(line)
+            length += len(line)
+        data = ''.join(chunks)
+        if size < 0:
+            self._pending = ''
+            return data
+        self._pending = data[size:]
+        return data[:size]
+
+
+def create_staging_table(cursor, table=STAGING_TABLE):
+    """Table temporaire (session) avec les colonnes de STAGING_COLUMNS et le numéro de ligne"""
+    columns = ', '.join(
+        f'{name} {Installation._meta.get_field(name).db_type(connection)}' for name in STAGING_COLUMNS
+    )
+    cursor.execute(f'DROP TABLE IF EXISTS {table}')
+    cursor.execute(f'CREATE TEMP TABLE {table} (line integer NOT NULL, {columns})')
+
+
+def copy_to_staging(cursor, rows, table=STAGING_TABLE):
+    """COPY en flux de (line, *STAGING_COLUMNS) dans la table de staging ; renvoie le nombre de lignes"""
+    cursor.copy_expert(
+        f"COPY {table} (line, {', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        CopyStream(rows),
+    )
+    cursor.execute(f'SELECT count(*) FROM {table}')
+    return cursor.fetchone()[0]
+
+
+def _create_sports(cursor, table):
+    cursor.execute(
+        f"""
+        INSERT INTO sports (name)
+        SELECT DISTINCT item.name FROM {table}
+        CROSS JOIN LATERAL jsonb_array_elements_text(sports_list) AS item(name)
+        ON CONFLICT (name) DO NOTHING
+        """
+    )
+
+
+def insert_from_staging(cursor, table=STAGING_TABLE, clear=False):
+    """
+    Transférer la staging dans installations, dans l'ordre du CSV, et lier les sports.
+    Avec clear=True, les installations existantes sont supprimées dans la même transaction.
+    Les lignes insérées ont row_version NULL : versionnées à la fin du dataset_batch().
+    """
+    columns = ', '.join(STAGING_COLUMNS)
+    with transaction.atomic():
+        if clear:
+            # Par l'ORM : cascades et traces de suppression pour les clients synchronisés
+            Installation.objects.all().delete()
+        _create_sports(cursor, table)
+        cursor.execute(
+            f"""
+            WITH inserted AS (
+                INSERT INTO installations ({columns}, row_version, updated_at)
+                SELECT {columns}, NULL, now() FROM {table} ORDER BY line
+                RETURNING id, sports_list
+            ), links AS (
+                INSERT INTO installations_sports (installation_id, sport_id)
+                SELECT DISTINCT inserted.id, sports.id FROM inserted
+                CROSS JOIN LATERAL jsonb_array_elements_text(inserted.sports_list) AS item(name)
+                JOIN sports ON sports.name = item.name
+                ON CONFLICT DO NOTHING
+            )
+            SELECT count(*) FROM inserted
+            """
+        )
+        return cursor.fetchone()[0]
+
+
+def installation_dependents():
+    """(table, colonne, on_delete) des lignes qui référencent une installation"""
+    dependents = [(Installation.sports.through._meta.db_table, 'installation_id', models.CASCADE)]
+    for relation in Installation._meta.related_objects:
+        if not relation.many_to_many:
+            dependents.append((relation.related_model._meta.db_table, relation.field.column, relation.on_delete))
+    return dependents
+
+
+def delete_installations(cursor, ids_query, params=None):
+    """
+    Supprimer en SQL les installations dont l'id est renvoyé par `ids_query` (avec `params`),
+    avec leurs dépendances (CASCADE / SET_NULL des modèles liés, liaisons sports), et enregistrer
+    les traces de suppression pour les clients synchronisés. À appeler dans une transaction.
+    Renvoie les ids supprimés.
+    """
+    cursor.execute('DROP TABLE IF EXISTS installations_removed')
+    cursor.execute(f'CREATE TEMP TABLE installations_removed ON COMMIT DROP AS {ids_query}', params)
+    cursor.execute('SELECT id FROM installations_removed ORDER BY id')
+    ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return ids
+
+    for table, column, on_delete in installation_dependents():
+        if on_delete is models.CASCADE:
+            cursor.execute(f'DELETE FROM {table} USING installations_removed r WHERE {table}.{column} = r.id')
+        elif on_delete is models.SET_NULL:
+            cursor.execute(f'UPDATE {table} SET {column} = NULL FROM installations_removed r WHERE {table}.{column} = r.id')
+        elif on_delete is not models.DO_NOTHING:
+            raise ValueError(f"Suppression SQL non gérée pour {table}.{column} ({on_delete.__name__})")
+
+    cursor.execute('DELETE FROM installations USING installations_removed r WHERE installations.id = r.id')
+    cursor.execute(
+        'INSERT INTO installations_tombstones (installation_id, version, deleted_at) '
+        'SELECT id, NULL, now() FROM installations_removed'
+    )
+    return ids
+
+
+def upsert_from_staging(cursor, table=STAGING_TABLE):
+    """
+    Mettre installations en conformité avec la staging, par source_id, en une transaction :
+    ajout des nouvelles lignes, mise à jour de celles dont content_hash a changé, suppression
+    des autres. Les lignes inchangées ne sont pas réécrites (ni row_version, ni updated_at).
+    Renvoie les compteurs {'adopted', 'inserted', 'updated', 'deleted', 'unchanged'}.
+    """
+    columns = ', '.join(CONTENT_COLUMNS)
+    assignments = ', '.join(f'{column} = s.{column}' for column in CONTENT_COLUMNS + ('content_hash',))
+    counts = {}
+    with transaction.atomic():
+        cursor.execute(f'SELECT count(*) FROM {table}')
+        if not cursor.fetchone()[0]:
+            # Un CSV vide ou illisible ne doit pas vider la table
+            raise ValueError("Aucune ligne valide à synchroniser")
+        # Doublons d'id dans le CSV : la dernière ligne l'emporte
+        cursor.execute(f'DELETE FROM {table} s USING {table} t WHERE s.source_id = t.source_id AND s.line < t.line')
+
+        # Lignes chargées avant source_id : rattachées à leur ligne CSV (même installation, type et
+        # position) pour garder leur id ; empreinte reprise seulement si le contenu est identique
+        cursor.execute(
+            f"""
+            WITH orphans AS (
+                SELECT id, inst_numero, equip_type_name, coordonnees, ({columns}) AS content,
+                       row_number() OVER (PARTITION BY inst_numero, equip_type_name, coordonnees ORDER BY id) AS rank
+                FROM installations WHERE source_id IS NULL
+            ), candidates AS (
+                SELECT source_id, content_hash, inst_numero, equip_type_name, coordonnees, ({columns}) AS content,
+                       row_number() OVER (PARTITION BY inst_numero, equip_type_name, coordonnees ORDER BY line) AS rank
+                FROM {table} s WHERE NOT EXISTS (SELECT 1 FROM installations i WHERE i.source_id = s.source_id)
+            )
+            UPDATE installations
+            SET source_id = c.source_id,
+                content_hash = CASE WHEN o.content IS NOT DISTINCT FROM c.content THEN c.content_hash END
+            FROM orphans o JOIN candidates c
+              ON o.rank = c.rank AND o.coordonnees = c.coordonnees
+             AND o.inst_numero IS NOT DISTINCT FROM c.inst_numero
+             AND o.equip_type_name IS NOT DISTINCT FROM c.equip_type_name
+            WHERE installations.id = o.id
+            """
+        )
+        counts['adopted'] = cursor.rowcount
+
+        counts['deleted'] = len(delete_installations(
+            cursor,
+            f"""
+            SELECT i.id FROM installations i
+            WHERE i.source_id IS NULL
+               OR NOT EXISTS (SELECT 1 FROM {table} s WHERE s.source_id = i.source_id)
+               OR EXISTS (SELECT 1 FROM installations d WHERE d.source_id = i.source_id AND d.id < i.id)
+            """
+        ))
+
+        _create_sports(cursor, table)
+        cursor.execute(
+            f"""
+            UPDATE installations i SET {assignments}, row_version = NULL, updated_at = now()
+            FROM {table} s
+            WHERE i.source_id = s.source_id AND i.content_hash IS DISTINCT FROM s.content_hash
+            """
+        )
+        counts['updated'] = cursor.rowcount
+        cursor.execute(
+            f"""
+            INSERT INTO installations ({columns}, source_id, content_hash, row_version, updated_at)
+            SELECT {columns}, source_id, content_hash, NULL, now() FROM {table} s
+            WHERE NOT EXISTS (SELECT 1 FROM installations i WHERE i.source_id = s.source_id)
+            ORDER BY line
+            """
+        )
+        counts['inserted'] = cursor.rowcount
+
+        # Liaisons sports des lignes écrites (row_version NULL jusqu'au passage de version)
+        cursor.execute(
+            """
+            DELETE FROM installations_sports l USING installations i, sports sp
+            WHERE l.installation_id = i.id AND l.sport_id = sp.id AND i.row_version IS NULL
+              AND NOT i.sports_list @> jsonb_build_array(sp.name)
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO installations_sports (installation_id, sport_id)
+            SELECT DISTINCT i.id, sports.id FROM installations i
+            CROSS JOIN LATERAL jsonb_array_elements_text(i.sports_list) AS item(name)
+            JOIN sports ON sports.name = item.name
+            WHERE i.row_version IS NULL
+            ON CONFLICT DO NOTHING
+            """
+        )
+
+        cursor.execute(f'SELECT count(*) FROM {table}')
+        counts['unchanged'] = cursor.fetchone()[0] - counts['updated'] - counts['inserted']
+    return counts
+
+
+def drop_staging_table(cursor, table=STAGING_TABLE):
+    cursor.execute(f'DROP TABLE IF EXISTS {table}')
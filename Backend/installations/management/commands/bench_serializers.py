@@ -0,0 +1,46 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from installations.models import Installation
+from installations.serializers import InstallationSerializer, get_installation_serializer
+
+
+class Command(BaseCommand):
+    help = 'Compare le serializer DRF et le sérialiseur compilé (temps et sortie identique)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Nombre de mesures (meilleur temps retenu)')
+
+    def _best(self, repeat, run):
+        best, result = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def handle(self, *args, **options):
+        repeat = max(1, options['repeat'])
+        queryset = Installation.objects.order_by('id')
+        serialize = get_installation_serializer()
+
+        drf_time, drf_data = self._best(repeat, lambda: InstallationSerializer(list(queryset), many=True).data)
+        compiled_time, compiled_data = self._best(
+            repeat, lambda: [serialize(row) for row in queryset.values_list(*serialize.columns)]
+        )
+
+        identical = [dict(item) for item in drf_data] == compiled_data
+        self.stdout.write(f"📦 {len(compiled_data)} installations, meilleur de {repeat} mesures")
+        self.stdout.write(f"🐢 InstallationSerializer (DRF) : {drf_time * 1000:.1f} ms")
+        self.stdout.write(f"⚡ Sérialiseur compilé          : {compiled_time * 1000:.1f} ms "
+                          f"(x{drf_time / compiled_time:.1f})")
+        if identical:
+            self.stdout.write(self.style.SUCCESS("✅ Sorties identiques"))
+        else:
+            self.stdout.write(self.style.ERROR("❌ Les sorties diffèrent"))
@@ -0,0 +1,116 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+
+from installations import loader
+from installations.bundles import MANIFEST_NAME, bundles_dir, export_bundles
+from installations.dataset import get_dataset_fingerprint, get_dataset_version, set_dataset_fingerprint
+from installations.exclusion import EXCLUDED_KEYWORDS
+from installations.management.commands.load_csv import Command as LoadCsvCommand
+from installations.models import Installation
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = ('Démarrage en un seul processus : migrations, puis synchronisation du CSV (upsert) et paquets '
+            'hors ligne, sautés si l\'empreinte CSV + schéma n\'a pas changé')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--csv', default='data/cleaned-data-es.csv', help='Fichier CSV de référence')
+        parser.add_argument('--force', action='store_true', help='Ignorer l\'empreinte et tout resynchroniser')
+
+    def handle(self, *args, **options):
+        self.timings = []
+        self.started = time.perf_counter()
+
+        # 1. Schéma : migrate seulement s'il reste des migrations à appliquer
+        executor = MigrationExecutor(connection)
+        targets = executor.loader.graph.leaf_nodes()
+        if executor.migration_plan(targets):
+            call_command('migrate', interactive=False, stdout=self.stdout)
+            executor = MigrationExecutor(connection)
+            self.phase('migrate')
+        else:
+            self.phase('migrate (à jour)')
+        schema = max(name for app, name in executor.loader.applied_migrations if app == 'installations')
+
+        # 2. Empreinte : contenu du CSV, schéma, règles d'import (empreinte des lignes, exclusions)
+        csv_path = options['csv']
+        parts = [
+            f"csv={file_sha256(csv_path)}",
+            f"schema={schema}",
+            f"rows=v{loader.HASH_VERSION}",
+            f"exclusion={hashlib.sha256('|'.join(EXCLUDED_KEYWORDS).encode('utf-8')).hexdigest()[:12]}",
+        ]
+        fingerprint = hashlib.sha256(';'.join(parts).encode('utf-8')).hexdigest()
+        stored = get_dataset_fingerprint()
+        has_data = Installation.objects.exists()
+        self.phase('empreinte')
+
+        changed = False
+        if not options['force'] and stored == fingerprint and has_data:
+            self.stdout.write(self.style.SUCCESS(f"✅ Empreinte inchangée ({fingerprint[:12]}) : aucune synchronisation"))
+        else:
+            reason = 'forcé' if options['force'] else ('base vide' if not has_data else 'empreinte modifiée')
+            self.stdout.write(f"🔁 Synchronisation du CSV ({reason}) : {', '.join(parts)}")
+            # 3. Données : upsert (ajouts, modifications, suppressions ; IDs stables), dans ce processus
+            result = LoadCsvCommand(stdout=self.stdout, stderr=self.stderr).load_with_copy(csv_path, upsert=True)
+            self.phase('load_csv --upsert')
+            if result is None:
+                self.print_timings()
+                self.stdout.write(self.style.ERROR("❌ Synchronisation échouée : empreinte non enregistrée"))
+                sys.exit(1)
+            changed = bool(result['inserted'] or result['updated'] or result['deleted'])
+
+        # 4. Paquets hors ligne : si les données ou l'empreinte (schéma, règles) ont changé,
+        # ou si le manifeste manque / est périmé
+        if changed or stored != fingerprint or self.manifest_version() != get_dataset_version():
+            try:
+                export_bundles()
+            except ValueError as e:
+                self.print_timings()
+                self.stdout.write(self.style.ERROR(f"❌ {e}"))
+                sys.exit(1)
+            self.phase('export_bundles')
+        else:
+            self.phase('export_bundles (à jour)')
+
+        if stored != fingerprint:
+            set_dataset_fingerprint(fingerprint)
+        self.print_timings()
+
+    def manifest_version(self):
+        try:
+            with open(os.path.join(bundles_dir(), MANIFEST_NAME), encoding='utf-8') as f:
+                return json.load(f).get('version')
+        except (OSError, ValueError):
+            return None
+
+    def phase(self, name):
+        now = time.perf_counter()
+        self.timings.append((name, now - self.started))
+        self.started = now
+
+    def print_timings(self):
+        self.stdout.write("⏱️  Temps par étape :")
+        for name, elapsed in self.timings:
+            self.stdout.write(f"   {name:<28} {elapsed * 1000:9.1f} ms")
+        self.stdout.write(f"   {'Total':<28} {sum(elapsed for _, elapsed in self.timings) * 1000:9.1f} ms")
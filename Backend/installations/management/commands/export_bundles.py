@@ -0,0 +1,35 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+from django.core.management.base import BaseCommand
+
+from installations.bundles import brotli, bundles_dir, export_bundles
+
+
+class Command(BaseCommand):
+    help = 'Exporte les installations par département en fichiers précompressés (gzip / brotli) + manifest.json'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', type=str, help='Dossier de sortie (défaut : INSTALLATIONS_BUNDLES_DIR)')
+
+    def handle(self, *args, **options):
+        directory = options.get('output') or bundles_dir()
+        if brotli is None:
+            self.stdout.write(self.style.WARNING("⚠️  Module brotli absent : seules les variantes .gz seront écrites"))
+
+        try:
+            manifest = export_bundles(directory)
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(f"❌ {e}"))
+            return
+        if directory == bundles_dir():
+            # WhiteNoise n'indexe WHITENOISE_ROOT qu'au démarrage des workers
+            self.stdout.write(self.style.WARNING("⚠️  Redémarrer le serveur pour servir les nouveaux paquets"))
+        bundles = manifest['bundles'].values()
+        raw = sum(entry['bytes'] for entry in bundles)
+        compressed = sum(entry['gz']['bytes'] for entry in bundles)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(manifest['bundles'])} paquets (v{manifest['version']}) dans {directory} : "
+            f"{raw / 1024:.0f} Ko JSON, {compressed / 1024:.0f} Ko gzip"
+        ))
@@ -3,54 +3,15 @@
 # Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
 
 import csv
-import json
 import sys
+import time
 from django.core.management.base import BaseCommand
+from django.db import connection
 from installations.models import Installation
-import ast
-
-def check_existing_data():
-    """
-    Fonction de protection qui vérifie s'il y a déjà des données
-    et empêche l'exécution si c'est le cas (sauf avec --force ou --clear)
-    """
-    try:
-        existing_count = Installation.objects.count()
-        
-        if existing_count > 0:
-            # Vérifier les arguments de la ligne de commande
-            args = sys.argv
-            has_force = '--force' in args
-            has_clear = '--clear' in args
-            
-            if not has_force and not has_clear:
-                print(f"⚠️  PROTECTION ACTIVÉE")
-                print(f"📊 La base de données contient déjà {existing_count} installations.")
-                print(f"")
-                print(f"Pour procéder quand même, utilisez une de ces options :")
-                print(f"  • --force    : Importer en fusionnant avec les données existantes")
-                print(f"  • --clear    : Vider la base avant d'importer")
-                print(f"")
-                print(f"Exemple : python manage.py load_csv data/file.csv --force")
-                print(f"")
-                print(f"❌ Import annulé pour éviter les doublons.")
-                sys.exit(1)  # Arrêter l'exécution
-            
-            # Si --force ou --clear, on continue mais on informe
-            if has_force:
-                print(f"💪 MODE FORCE : Import en cours avec {existing_count} installations existantes")
-            if has_clear:
-                print(f"🗑️  MODE CLEAR : La base sera vidée puis rechargée")
-                
-        else:
-            print(f"✅ Base de données vide, import autorisé")
-            
-    except Exception as e:
-        print(f"❌ Erreur lors de la vérification : {e}")
-        sys.exit(1)
-
-# Exécuter la vérification avant la définition de la classe
-check_existing_data()
+from installations.dataset import dataset_batch
+from installations.sports import link_installation_sports
+from installations import loader
+from installations.exclusion import excluded_keyword
 
 class Command(BaseCommand):
     help = 'Load CSV data into the database'
@@ -59,112 +20,248 @@ class Command(BaseCommand):
         parser.add_argument('csv_file_path', type=str, help='Path to the CSV file')
         parser.add_argument('--force', action='store_true', help='Force import despite existing data')
         parser.add_argument('--clear', action='store_true', help='Clear existing data before import')
+        parser.add_argument('--copy', action='store_true',
+                            help='Load through COPY into a staging table (fast bulk load)')
+        parser.add_argument('--upsert', action='store_true',
+                            help='Sync by CSV id and content hash: only changed rows are written, IDs are kept')
+
+    def check_existing_data(self, options):
+        """
+        Protection : s'il y a déjà des données, l'import est refusé
+        (sauf avec --force, --clear ou --upsert)
+        """
+        try:
+            existing_count = Installation.objects.count()
+            
+            if existing_count > 0:
+                has_force = options.get('force')
+                has_clear = options.get('clear')
+                has_upsert = options.get('upsert')
+                
+                if not has_force and not has_clear and not has_upsert:
+                    self.stdout.write(f"⚠️  PROTECTION ACTIVÉE")
+                    self.stdout.write(f"📊 La base de données contient déjà {existing_count} installations.")
+                    self.stdout.write(f"")
+                    self.stdout.write(f"Pour procéder quand même, utilisez une de ces options :")
+                    self.stdout.write(f"  • --force    : Importer en fusionnant avec les données existantes")
+                    self.stdout.write(f"  • --clear    : Vider la base avant d'importer")
+                    self.stdout.write(f"  • --upsert   : Synchroniser (ajouts, modifications, suppressions) en gardant les IDs")
+                    self.stdout.write(f"")
+                    self.stdout.write(f"Exemple : python manage.py load_csv data/file.csv --force")
+                    self.stdout.write(f"")
+                    self.stdout.write(f"❌ Import annulé pour éviter les doublons.")
+                    sys.exit(1)  # Arrêter l'exécution
+                
+                # Si --force, --clear ou --upsert, on continue mais on informe
+                if has_force:
+                    self.stdout.write(f"💪 MODE FORCE : Import en cours avec {existing_count} installations existantes")
+                if has_clear:
+                    self.stdout.write(f"🗑️  MODE CLEAR : La base sera vidée puis rechargée")
+                if has_upsert:
+                    self.stdout.write(f"🔁 MODE UPSERT : Seules les lignes modifiées du CSV seront écrites")
+                    
+            else:
+                self.stdout.write(f"✅ Base de données vide, import autorisé")
+                
+        except Exception as e:
+            self.stdout.write(f"❌ Erreur lors de la vérification : {e}")
+            sys.exit(1)
+
+    def parse_coordonnees(self, coord_str):
+        """Parse les coordonnées depuis le CSV"""
+        try:
+            return loader.parse_coordonnees(coord_str)
+        except ValueError as e:
+            self.stdout.write(str(e))
+            return None
 
     def handle(self, *args, **options):
         csv_file_path = options['csv_file_path']
 
-        def parse_coordonnees(coord_str):
-            """Parse les coordonnées depuis le CSV"""
-            try:
-                # Si c'est déjà un dict JSON
-                if coord_str.startswith('{'):
-                    return json.loads(coord_str.replace("'", '"'))
-                
-                # Si c'est sous forme de string Python dict
-                return ast.literal_eval(coord_str)
-            except (json.JSONDecodeError, ValueError, SyntaxError):
-                self.stdout.write(f"Invalid coordinates format: {coord_str}")
-                return None
+        # Vérifiée ici (et non à l'import du module) : sans effet sur les autres commandes
+        self.check_existing_data(options)
 
-        def parse_boolean(value):
-            """Parse les valeurs booléennes"""
-            if isinstance(value, bool):
-                return value
-            if isinstance(value, str):
-                return value.lower() in ['true', '1', 'yes', 'oui']
-            return False
+        if options.get('upsert'):
+            if options.get('clear'):
+                self.stdout.write(self.style.ERROR("❌ --upsert et --clear sont incompatibles"))
+                return
+            self.load_with_copy(csv_file_path, upsert=True)
+            return
+        if options.get('copy'):
+            self.load_with_copy(csv_file_path, clear=options.get('clear'))
+            return
+
+        parse_coordonnees = self.parse_coordonnees
 
         # Compteurs pour les stats
         total_rows = 0
         success_count = 0
         error_count = 0
+        excluded_count = 0
         
-        try:
-            if options.get('clear'):
-                Installation.objects.all().delete()
-                self.stdout.write("🗑️ Cleared existing data.")
+        # Une seule nouvelle version du jeu de données pour tout l'import
+        with dataset_batch() as batch:
+            try:
+                if options.get('clear'):
+                    Installation.objects.all().delete()
+                    self.stdout.write("🗑️ Cleared existing data.")
                 
-            with open(csv_file_path, 'r', encoding='utf-8') as file:
-                csv_reader = csv.DictReader(file)
-                installations_to_create = []
+                with open(csv_file_path, 'r', encoding='utf-8') as file:
+                    csv_reader = csv.DictReader(file)
+                    installations_to_create = []
                 
-                for row in csv_reader:
-                    total_rows += 1
+                    for row in csv_reader:
+                        total_rows += 1
+
+                        # Installations non ouvertes au public (écoles, prisons...) : rejetées à l'import
+                        if excluded_keyword(row):
+                            excluded_count += 1
+                            continue
                     
-                    # Parse coordonnées
-                    coordonnees = parse_coordonnees(row['equip_coordonnees'])
-                    if not coordonnees:
-                        self.stdout.write(f"⚠️  Skip row {total_rows} - Invalid coordinates: {row.get('inst_numero', 'Unknown')}")
-                        error_count += 1
-                        continue
+                        # Parse coordonnées
+                        coordonnees = parse_coordonnees(row['equip_coordonnees'])
+                        if not coordonnees:
+                            self.stdout.write(f"⚠️  Skip row {total_rows} - Invalid coordinates: {row.get('inst_numero', 'Unknown')}")
+                            error_count += 1
+                            continue
                     
-                    try:
-                        # Créer l'objet Installation (Django ORM)
-                        installation = Installation(
+                        try:
+                            # Créer l'objet Installation (Django ORM)
                             # Django auto-génère l'ID, pas besoin de le spécifier
-                            inst_numero=row.get('inst_numero', ''),
-                            coordonnees=coordonnees,
-                            inst_nom=row.get('inst_nom', ''),
-                            equip_type_name=row.get('equip_type_name', ''),
-                            equip_type_famille=row.get('equip_type_famille', ''),
-                            equip_aps_nom=row.get('aps_name', ''),
-                            equip_acc_libre=parse_boolean(row.get('equip_acc_libre', False)),
-                            equip_url=row.get('equip_url', ''),
-                            inst_adresse=row.get('inst_adresse', ''),
-                            inst_cp=row.get('new_code', ''),
-                            equip_prop_nom=row.get('equip_prop_nom', ''),
-                            equip_gest_type=row.get('equip_gest_type', ''),
-                            inst_acc_handi_bool=parse_boolean(row.get('inst_acc_handi_bool', False))
-                        )
+                            installation = Installation(**loader.installation_fields(row, coordonnees))
+                            # Colonnes lat/lon/grid_cell pour l'index spatial
+                            installation.sync_coordinates()
+                            # Code postal (PLM) et sports parsés une fois ici, pas à chaque requête
+                            installation.sync_normalized()
                         
-                        installations_to_create.append(installation)
-                        success_count += 1
+                            installations_to_create.append(installation)
+                            success_count += 1
                         
-                        # Batch insert tous les 1000 pour performance
-                        if len(installations_to_create) >= 1000:
-                            Installation.objects.bulk_create(installations_to_create)
-                            self.stdout.write(f"✅ Inserted batch of {len(installations_to_create)} installations")
-                            installations_to_create = []
+                            # Batch insert tous les 1000 pour performance
+                            if len(installations_to_create) >= 1000:
+                                Installation.objects.bulk_create(installations_to_create)
+                                link_installation_sports((i.pk, i.sports_list) for i in installations_to_create)
+                                self.stdout.write(f"✅ Inserted batch of {len(installations_to_create)} installations")
+                                installations_to_create = []
                             
-                    except Exception as e:
-                        error_count += 1
-                        self.stdout.write(f"❌ Error processing row {total_rows}: {e}")
-                        continue
+                        except Exception as e:
+                            error_count += 1
+                            self.stdout.write(f"❌ Error processing row {total_rows}: {e}")
+                            continue
                 
-                # Insert remaining installations
-                if installations_to_create:
-                    Installation.objects.bulk_create(installations_to_create)
-                    self.stdout.write(f"✅ Inserted final batch of {len(installations_to_create)} installations")
+                    # Insert remaining installations
+                    if installations_to_create:
+                        Installation.objects.bulk_create(installations_to_create)
+                        link_installation_sports((i.pk, i.sports_list) for i in installations_to_create)
+                        self.stdout.write(f"✅ Inserted final batch of {len(installations_to_create)} installations")
                 
-                # Stats finales
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f"\n🎉 CSV import completed!\n"
-                        f"📊 Total rows processed: {total_rows}\n"
-                        f"✅ Successfully imported: {success_count}\n"
-                        f"❌ Errors: {error_count}\n"
-                        f"📍 Total installations in DB: {Installation.objects.count()}"
+                    # Stats finales
+                    self.stdout.write(
+                        self.style.SUCCESS(
+                            f"\n🎉 CSV import completed!\n"
+                            f"📊 Total rows processed: {total_rows}\n"
+                            f"✅ Successfully imported: {success_count}\n"
+                            f"🚫 Excluded (keywords): {excluded_count}\n"
+                            f"❌ Errors: {error_count}\n"
+                            f"📍 Total installations in DB: {Installation.objects.count()}"
+                        )
                     )
-                )
                 
-        except FileNotFoundError:
-            self.stdout.write(
-                self.style.ERROR(f"❌ CSV file not found: {csv_file_path}")
-            )
-        except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f"❌ Error loading CSV: {e}")
+            except FileNotFoundError:
+                # Aucune ligne insérée (un --clear préalable est couvert par ses traces de suppression)
+                batch.changed = False
+                self.stdout.write(
+                    self.style.ERROR(f"❌ CSV file not found: {csv_file_path}")
+                )
+            except Exception as e:
+                # Des lots ont pu être insérés avant l'erreur : la version est quand même incrémentée
+                self.stdout.write(
+                    self.style.ERROR(f"❌ Error loading CSV: {e}")
+                )
+
+    def load_with_copy(self, csv_file_path, clear=False, upsert=False):
+        """
+        Mode --copy : lignes validées envoyées en flux (COPY FROM STDIN) dans une table de
+        staging, puis transférées dans installations en une seule transaction.
+        Mode --upsert : même staging, puis synchronisation par id CSV et empreinte du contenu.
+        Renvoie les compteurs (None en cas d'échec).
+        """
+        stats = {'total': 0, 'success': 0, 'error': 0, 'excluded': 0}
+
+        def staged_rows(csv_reader):
+            for row in csv_reader:
+                stats['total'] += 1
+                if excluded_keyword(row):
+                    stats['excluded'] += 1
+                    continue
+                coordonnees = self.parse_coordonnees(row['equip_coordonnees'])
+                if not coordonnees:
+                    self.stdout.write(f"⚠️  Skip row {stats['total']} - Invalid coordinates: {row.get('inst_numero', 'Unknown')}")
+                    stats['error'] += 1
+                    continue
+                if upsert and not row.get('id'):
+                    self.stdout.write(f"⚠️  Skip row {stats['total']} - Missing id: {row.get('inst_numero', 'Unknown')}")
+                    stats['error'] += 1
+                    continue
+                try:
+                    values = loader.staging_values(loader.installation_fields(row, coordonnees))
+                except Exception as e:
+                    stats['error'] += 1
+                    self.stdout.write(f"❌ Error processing row {stats['total']}: {e}")
+                    continue
+                stats['success'] += 1
+                yield (stats['total'],) + values
+
+        start = time.perf_counter()
+        with dataset_batch() as batch:
+            try:
+                with open(csv_file_path, 'r', encoding='utf-8') as file, connection.cursor() as cursor:
+                    loader.create_staging_table(cursor)
+                    try:
+                        staged = loader.copy_to_staging(cursor, staged_rows(csv.DictReader(file)))
+                        copy_time = time.perf_counter() - start
+                        self.stdout.write(f"📥 COPY : {staged} lignes en staging en {copy_time:.2f}s "
+                                          f"({staged / max(copy_time, 1e-6):.0f} lignes/s)")
+                        if upsert:
+                            counts = loader.upsert_from_staging(cursor)
+                            inserted = counts['inserted'] + counts['updated'] + counts['unchanged']
+                            self.stdout.write(
+                                f"🔁 Upsert : {counts['inserted']} ajoutées, {counts['updated']} modifiées, "
+                                f"{counts['deleted']} supprimées, {counts['unchanged']} inchangées"
+                                + (f" ({counts['adopted']} rattachées à leur ligne CSV)" if counts['adopted'] else "")
+                            )
+                            # Jeu de données identique : ni nouvelle version, ni reconstruction
+                            batch.changed = bool(counts['inserted'] or counts['updated'] or counts['deleted'])
+                        else:
+                            if clear:
+                                self.stdout.write("🗑️ Existing data will be replaced.")
+                            inserted = loader.insert_from_staging(cursor, clear=clear)
+                        # Chargement seul (COPY + transfert), sans les reconstructions du lot
+                        elapsed = time.perf_counter() - start
+                    finally:
+                        loader.drop_staging_table(cursor)
+            except FileNotFoundError:
+                # Rien n'a été écrit (staging seule, transfert atomique) : pas de nouvelle version
+                batch.changed = False
+                self.stdout.write(self.style.ERROR(f"❌ CSV file not found: {csv_file_path}"))
+                return None
+            except Exception as e:
+                batch.changed = False
+                self.stdout.write(self.style.ERROR(f"❌ Error loading CSV: {e}"))
+                return None
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\n🎉 CSV import completed ({'UPSERT' if upsert else 'COPY'})!\n"
+                f"📊 Total rows processed: {stats['total']}\n"
+                f"✅ Successfully imported: {inserted}\n"
+                f"🚫 Excluded (keywords): {stats['excluded']}\n"
+                f"❌ Errors: {stats['error']}\n"
+                f"⚡ {stats['total'] / max(elapsed, 1e-6):.0f} rows/s ({elapsed:.2f}s)\n"
+                f"📍 Total installations in DB: {Installation.objects.count()}"
             )
+        )
+        return dict(stats, **(counts if upsert else {'inserted': inserted}))
 
 ## ===== ANCIEN CODE SQLALCHEMY (COMMENTÉ) =====
 ## import csv
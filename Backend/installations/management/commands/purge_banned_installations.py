@@ -1,31 +1,42 @@
-import sys
+from collections import Counter
 from django.core.management.base import BaseCommand
-from django.db.models import Q
+from django.db import connection, transaction
 from installations.models import Installation
+from installations.dataset import dataset_batch
+from installations.exclusion import EXCLUDED_FIELDS, excluded_keyword
+from installations import loader
+
+# Suppressions par lots d'ids (transactions courtes)
+DELETE_BATCH_SIZE = 1000
 
 class Command(BaseCommand):
     help = 'Supprime de la base de données les infrastructures sportives ne correspondant pas aux critères (écoles, prisons, armée, etc.)'
 
     def handle(self, *args, **options):
-        mots_a_exclure = [
-            'ecole', 'collège', 'college', 'lycée', 'lycee', 'université', 'universite', # Scolaire
-            'militaire', 'armée', 'armee',                                              # Militaire
-            'pénitentiaire', 'penitentiaire', 'prison', 'centre de détention',          # Pénitentiaire
-            'creps', 'ecole nationale', 'école nationale', 'scolaire'                   # CREPS / National
-        ]
-
-        pattern = r'(' + '|'.join(mots_a_exclure) + r')'
+        # Mots-clés et automate partagés avec le nettoyage du CSV et load_csv (installations/exclusion.py) :
+        # un seul passage sur les champs texte, au lieu d'un iregex qui parcourt toute la table
+        banned_ids = []
+        keywords = Counter()
+        rows = Installation.objects.order_by('id').values('id', *EXCLUDED_FIELDS)
+        for row in rows.iterator(chunk_size=5000):
+            keyword = excluded_keyword(row)
+            if keyword is not None:
+                banned_ids.append(row['id'])
+                keywords[keyword] += 1
 
-        # PostgreSQL supporte iregex pour la recherche incassable d'une regexp
-        queryset = Installation.objects.filter(
-            Q(inst_nom__iregex=pattern) | Q(equip_type_name__iregex=pattern)
-        )
-        
-        count = queryset.count()
+        count = len(banned_ids)
         self.stdout.write(self.style.WARNING(f"⚠️  Trouvé {count} installations correspondant aux mots-clés interdits."))
+        for keyword, matches in keywords.most_common():
+            self.stdout.write(f"   - {keyword} : {matches}")
         
         if count > 0:
-            deleted_count, _ = queryset.delete()
+            deleted_count = 0
+            with dataset_batch(), connection.cursor() as cursor:
+                for start in range(0, count, DELETE_BATCH_SIZE):
+                    with transaction.atomic():
+                        deleted_count += len(loader.delete_installations(
+                            cursor, 'SELECT id FROM installations WHERE id = ANY(%s)', [banned_ids[start:start + DELETE_BATCH_SIZE]]
+                        ))
             self.stdout.write(self.style.SUCCESS(f"✅ Succès : {deleted_count} installations supprimées."))
         else:
             self.stdout.write(self.style.SUCCESS("✅ Aucune installation à supprimer. La base de données est déjà propre."))
@@ -33,4 +44,3 @@ class Command(BaseCommand):
         # Afficher le total restant
         remaining = Installation.objects.count()
         self.stdout.write(self.style.SUCCESS(f"📍 Total installations restantes en DB : {remaining}"))
-
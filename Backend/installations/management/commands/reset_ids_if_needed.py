@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from installations.models import Installation
+from installations.dataset import dataset_batch, reset_sync_history
 from django.db import connection
 
 class Command(BaseCommand):
@@ -13,8 +14,10 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING(f"⚠️ Désalignement détecté ! (Lignes: {count}, ID Max: {last_inst.id})."))
             self.stdout.write(self.style.WARNING("🧨 PURGE TOTALE DE LA TABLE ET REMISE À ZÉRO DES IDs..."))
             
-            with connection.cursor() as cursor:
+            with dataset_batch(), connection.cursor() as cursor:
                 cursor.execute("TRUNCATE TABLE installations RESTART IDENTITY CASCADE;")
+            # Les ids vont désigner d'autres installations : les clients repartiront d'un snapshot complet
+            reset_sync_history()
             
             self.stdout.write(self.style.SUCCESS("✅ Table vidée, Auto-incrément remis à 1 !"))
             self.stdout.write(self.style.WARNING("🔄 Le chargement de base (load_csv) va maintenant tout réimporter avec des IDs parfaits."))
@@ -1,40 +1,105 @@
 import csv
+import time
 from django.core.management.base import BaseCommand
+from django.db import connection, transaction
 from installations.models import Installation
+from installations.dataset import dataset_batch
+from installations import loader
+
+# Numéros autorisés, chargés par COPY (pas de liste de paramètres : tient 100k+ numéros)
+VALID_TABLE = 'sync_valid_numeros'
+INVALID_QUERY = f"""
+    SELECT i.id FROM installations i
+    WHERE NOT EXISTS (SELECT 1 FROM {VALID_TABLE} v WHERE v.inst_numero = i.inst_numero)
+"""
 
 class Command(BaseCommand):
     help = 'Synchronise la BDD avec cleaned-data-es.csv en supprimant les infrastructures qui n\'y sont plus'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--csv', default='data/cleaned-data-es.csv', help='Fichier CSV de référence')
+        parser.add_argument('--dry-run', action='store_true', help='Afficher ce qui serait supprimé sans rien supprimer')
+        parser.add_argument('--sample', type=int, default=20, help='Nombre d\'installations listées en dry-run')
+
     def handle(self, *args, **options):
-        csv_file = 'data/cleaned-data-es.csv'
-        
-        # Récupérer les inst_numero autorisés depuis le CSV
-        valid_numeros = set()
-        try:
-            with open(csv_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    numero = row.get('inst_numero')
-                    if numero:
-                        valid_numeros.add(numero)
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f"Erreur lecture CSV: {e}"))
-            return
-
-        self.stdout.write(f"📊 Nombre d'installations valides dans le CSV: {len(valid_numeros)}")
-        
-        # Supprimer les installations qui ne sont PAS dans les valid_numeros
-        invalid_installations = Installation.objects.exclude(inst_numero__in=valid_numeros)
-        count_to_delete = invalid_installations.count()
-        
-        if count_to_delete > 0:
-            self.stdout.write(self.style.WARNING(f"⚠️  Suppression de {count_to_delete} infrastructures non autorisées..."))
-            deleted, _ = invalid_installations.delete()
-            self.stdout.write(self.style.SUCCESS(f"✅ {deleted} éléments supprimés de la DB."))
-        else:
-            self.stdout.write(self.style.SUCCESS("✅ La BDD est déjà synchronisée (aucune suppression nécessaire)."))
+        csv_file = options['csv']
+        timings = []
+        started = time.perf_counter()
+
+        def phase(name):
+            nonlocal started
+            now = time.perf_counter()
+            timings.append((name, now - started))
+            started = now
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {VALID_TABLE}')
+            cursor.execute(f'CREATE TEMP TABLE {VALID_TABLE} (inst_numero text NOT NULL)')
+            try:
+                # Récupérer les inst_numero autorisés depuis le CSV (en flux, directement dans PostgreSQL)
+                try:
+                    with open(csv_file, 'r', encoding='utf-8') as f:
+                        numeros = ((row['inst_numero'],) for row in csv.DictReader(f) if row.get('inst_numero'))
+                        cursor.copy_expert(
+                            f'COPY {VALID_TABLE} (inst_numero) FROM STDIN WITH (FORMAT csv)', loader.CopyStream(numeros)
+                        )
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"Erreur lecture CSV: {e}"))
+                    return
+                cursor.execute(f'ANALYZE {VALID_TABLE}')
+                cursor.execute(f'SELECT count(DISTINCT inst_numero) FROM {VALID_TABLE}')
+                valid_count = cursor.fetchone()[0]
+                phase('Lecture CSV + COPY')
+
+                self.stdout.write(f"📊 Nombre d'installations valides dans le CSV: {valid_count}")
+                if not valid_count:
+                    # Un CSV vide viderait toute la table
+                    self.stdout.write(self.style.ERROR("❌ Aucun inst_numero dans le CSV, synchronisation annulée."))
+                    return
+
+                # Installations dont le numéro n'est PAS dans le CSV (anti-jointure)
+                cursor.execute(f'SELECT count(*) FROM ({INVALID_QUERY}) AS invalid')
+                count_to_delete = cursor.fetchone()[0]
+                phase('Anti-jointure')
+
+                if count_to_delete == 0:
+                    self.stdout.write(self.style.SUCCESS("✅ La BDD est déjà synchronisée (aucune suppression nécessaire)."))
+                elif options['dry_run']:
+                    self.report(cursor, count_to_delete, options['sample'])
+                    phase('Rapport dry-run')
+                else:
+                    self.stdout.write(self.style.WARNING(f"⚠️  Suppression de {count_to_delete} infrastructures non autorisées..."))
+                    with dataset_batch():
+                        with transaction.atomic():
+                            deleted = len(loader.delete_installations(cursor, INVALID_QUERY))
+                        phase('Suppression SQL')
+                    phase('Nouvelle version + reconstructions')
+                    self.stdout.write(self.style.SUCCESS(f"✅ {deleted} installations supprimées de la DB."))
+            finally:
+                cursor.execute(f'DROP TABLE IF EXISTS {VALID_TABLE}')
 
         # Vérifier s'il manque des données
         db_count = Installation.objects.count()
         self.stdout.write(f"📍 Total BDD actuel : {db_count}")
-        
+
+        self.stdout.write("⏱️  Temps par étape :")
+        for name, elapsed in timings:
+            self.stdout.write(f"   {name:<36} {elapsed * 1000:9.1f} ms")
+        self.stdout.write(f"   {'Total':<36} {sum(elapsed for _, elapsed in timings) * 1000:9.1f} ms")
+
+    def report(self, cursor, count, sample):
+        """Dry-run : installations et lignes dépendantes qui seraient supprimées"""
+        self.stdout.write(self.style.WARNING(f"🔍 DRY-RUN : {count} infrastructures seraient supprimées"))
+        cursor.execute(f'SELECT i.id, i.inst_numero, i.inst_nom FROM installations i WHERE i.id IN ({INVALID_QUERY}) '
+                       f'ORDER BY i.id LIMIT %s', [sample])
+        for pk, numero, nom in cursor.fetchall():
+            self.stdout.write(f"   - #{pk} {numero or '?'} {nom or ''}")
+        if count > sample:
+            self.stdout.write(f"   ... et {count - sample} autres")
+        for table, column, on_delete in loader.installation_dependents():
+            cursor.execute(f'SELECT count(*) FROM {table} WHERE {column} IN ({INVALID_QUERY})')
+            dependents = cursor.fetchone()[0]
+            if dependents:
+                action = 'supprimées' if on_delete.__name__ == 'CASCADE' else 'détachées'
+                self.stdout.write(f"   ↳ {table} : {dependents} lignes seraient {action}")
+        self.stdout.write("ℹ️  Aucune modification effectuée (relancer sans --dry-run pour supprimer).")
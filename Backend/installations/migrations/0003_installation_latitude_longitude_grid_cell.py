@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installations', '0002_usercheckin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='installation',
+            name='grid_cell',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='installation',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='installation',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='installation',
+            index=models.Index(fields=['grid_cell', 'longitude', 'latitude'], name='inst_grid_lon_lat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='installation',
+            index=models.Index(fields=['latitude', 'longitude'], name='inst_lat_lon_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+import math
+
+from django.db import migrations
+
+# Copie figée de installations.spatial au moment de la migration
+GRID_CELL_DEG = 0.1
+GRID_COLS = 3600
+GRID_ROWS = 1800
+
+
+def _grid_cell(lon, lat):
+    col = min(max(int(math.floor((lon + 180.0) / GRID_CELL_DEG)), 0), GRID_COLS - 1)
+    row = min(max(int(math.floor((lat + 90.0) / GRID_CELL_DEG)), 0), GRID_ROWS - 1)
+    return row * GRID_COLS + col
+
+
+def backfill_coordinates(apps, schema_editor):
+    """Remplir latitude/longitude/grid_cell depuis le JSON `coordonnees`"""
+    Installation = apps.get_model('installations', 'Installation')
+    batch = []
+
+    for installation in Installation.objects.only('id', 'coordonnees').iterator(chunk_size=2000):
+        coordonnees = installation.coordonnees
+        try:
+            lon = float(coordonnees['lon'])
+            lat = float(coordonnees['lat'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if math.isnan(lon) or math.isnan(lat):
+            continue
+
+        installation.longitude = lon
+        installation.latitude = lat
+        installation.grid_cell = _grid_cell(lon, lat)
+        batch.append(installation)
+
+        if len(batch) >= 1000:
+            Installation.objects.bulk_update(batch, ['latitude', 'longitude', 'grid_cell'])
+            batch = []
+
+    if batch:
+        Installation.objects.bulk_update(batch, ['latitude', 'longitude', 'grid_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installations', '0003_installation_latitude_longitude_grid_cell'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_coordinates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installations', '0005_datasetstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeoJSONSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dataset_key', models.CharField(max_length=64, unique=True)),
+                ('version', models.BigIntegerField()),
+                ('etag', models.CharField(max_length=80)),
+                ('feature_count', models.IntegerField(default=0)),
+                ('payload', models.BinaryField()),
+                ('payload_gzip', models.BinaryField()),
+                ('last_modified', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Snapshot GeoJSON',
+                'verbose_name_plural': 'Snapshots GeoJSON',
+                'db_table': 'installations_geojson_snapshot',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installations', '0006_geojsonsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField(unique=True)),
+            ],
+            options={
+                'verbose_name': 'Sport',
+                'verbose_name_plural': 'Sports',
+                'db_table': 'sports',
+            },
+        ),
+        migrations.AddField(
+            model_name='installation',
+            name='sports',
+            field=models.ManyToManyField(blank=True, db_table='installations_sports', related_name='installations', to='installations.sport'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+import ast
+
+from django.db import migrations
+
+
+def _parse_sports(sport_field):
+    # Copie figée de serializers.parse_sports_field au moment de la migration
+    if not sport_field:
+        return []
+    try:
+        if sport_field.startswith('[') and sport_field.endswith(']'):
+            return [sport.strip() for sport in ast.literal_eval(sport_field) if sport.strip()]
+        return [sport_field.strip()]
+    except (ValueError, SyntaxError):
+        return [sport_field.strip()] if sport_field.strip() else []
+
+
+def backfill_sports(apps, schema_editor):
+    """Créer les sports et les liaisons installation–sport depuis equip_aps_nom"""
+    Installation = apps.get_model('installations', 'Installation')
+    Sport = apps.get_model('installations', 'Sport')
+    InstallationSport = Installation.sports.through
+
+    parsed = [
+        (pk, _parse_sports(field))
+        for pk, field in Installation.objects.values_list('id', 'equip_aps_nom').iterator(chunk_size=2000)
+    ]
+    names = {name for _, sports in parsed for name in sports}
+    Sport.objects.bulk_create([Sport(name=name) for name in names], ignore_conflicts=True)
+    sport_ids = dict(Sport.objects.values_list('name', 'id'))
+
+    links = [
+        InstallationSport(installation_id=pk, sport_id=sport_ids[name])
+        for pk, sports in parsed for name in set(sports)
+    ]
+    InstallationSport.objects.bulk_create(links, batch_size=2000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installations', '0007_sport_installation_sports'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_sports, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installations', '0008_backfill_installation_sports'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SportFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inst_cp', models.TextField(blank=True, default='')),
+                ('count', models.IntegerField(default=0)),
+                ('sport', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='installations.sport')),
+            ],
+            options={
+                'verbose_name': 'Compteur par sport',
+                'verbose_name_plural': 'Compteurs par sport',
+                'db_table': 'installations_sport_facets',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='sportfacet',
+            constraint=models.UniqueConstraint(fields=('inst_cp', 'sport'), name='sport_facet_cp_sport_uniq'),
+        ),
+    ]
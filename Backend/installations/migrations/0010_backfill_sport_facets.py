@@ -0,0 +1,30 @@
+from django.db import migrations
+from django.db.models import Count, TextField, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_facets(apps, schema_editor):
+    """Compteurs (sport, code postal) calculés depuis la table de liaison"""
+    Installation = apps.get_model('installations', 'Installation')
+    SportFacet = apps.get_model('installations', 'SportFacet')
+    InstallationSport = Installation.sports.through
+
+    rows = InstallationSport.objects.annotate(
+        cp=Coalesce('installation__inst_cp', Value(''), output_field=TextField())
+    ).values('sport_id', 'cp').annotate(n=Count('installation_id'))
+    SportFacet.objects.all().delete()
+    SportFacet.objects.bulk_create(
+        [SportFacet(sport_id=row['sport_id'], inst_cp=row['cp'], count=row['n']) for row in rows],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installations', '0009_sportfacet'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_facets, migrations.RunPython.noop),
+    ]
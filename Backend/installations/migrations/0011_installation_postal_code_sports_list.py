@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installations', '0010_backfill_sport_facets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='installation',
+            name='postal_code',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='installation',
+            name='sports_list',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,56 @@
+import ast
+
+from django.db import migrations
+
+# Copie figée de installations.text au moment de la migration
+PLM_PREFIXES = {'132': '130', '693': '690', '751': '750'}
+
+
+def _postal_code(cp):
+    if cp and isinstance(cp, str) and len(cp) == 5:
+        prefix = PLM_PREFIXES.get(cp[:3])
+        if prefix is not None:
+            return prefix + cp[3:]
+    return cp
+
+
+def _sports(sport_field):
+    if not sport_field:
+        return []
+    try:
+        if sport_field.startswith('[') and sport_field.endswith(']'):
+            sports = [sport.strip() for sport in ast.literal_eval(sport_field) if sport.strip()]
+        else:
+            sports = [sport_field.strip()]
+    except (ValueError, SyntaxError):
+        sports = [sport_field.strip()] if sport_field.strip() else []
+    return list(dict.fromkeys(sports))
+
+
+def backfill_normalized(apps, schema_editor):
+    """Remplir postal_code et sports_list depuis inst_cp et equip_aps_nom"""
+    Installation = apps.get_model('installations', 'Installation')
+    batch = []
+
+    for installation in Installation.objects.only('id', 'inst_cp', 'equip_aps_nom').iterator(chunk_size=2000):
+        installation.postal_code = _postal_code(installation.inst_cp)
+        installation.sports_list = _sports(installation.equip_aps_nom)
+        batch.append(installation)
+
+        if len(batch) >= 1000:
+            Installation.objects.bulk_update(batch, ['postal_code', 'sports_list'])
+            batch = []
+
+    if batch:
+        Installation.objects.bulk_update(batch, ['postal_code', 'sports_list'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installations', '0011_installation_postal_code_sports_list'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_normalized, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installations', '0012_backfill_postal_code_sports_list'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstallationTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('installation_id', models.BigIntegerField(db_index=True)),
+                ('version', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Installation supprimée',
+                'verbose_name_plural': 'Installations supprimées',
+                'db_table': 'installations_tombstones',
+            },
+        ),
+        migrations.AddField(
+            model_name='datasetstate',
+            name='sync_floor',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='installation',
+            name='row_version',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='installation',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def backfill_row_version(apps, schema_editor):
+    """Les installations existantes appartiennent à la version courante du jeu de données"""
+    Installation = apps.get_model('installations', 'Installation')
+    DatasetState = apps.get_model('installations', 'DatasetState')
+
+    state = DatasetState.objects.filter(pk=1).values_list('version', 'updated_at').first()
+    version, updated_at = state or (0, None)
+    Installation.objects.filter(row_version__isnull=True).update(
+        row_version=version, updated_at=updated_at or timezone.now()
+    )
+    # Aucun historique de suppression avant cette version : delta possible seulement à partir d'ici
+    DatasetState.objects.filter(pk=1).update(sync_floor=version)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installations', '0013_sync_row_version_tombstones'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_row_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installations', '0014_backfill_row_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='installation',
+            name='content_hash',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='installation',
+            name='source_id',
+            field=models.TextField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installations', '0015_installation_source_id_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasetstate',
+            name='fingerprint',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
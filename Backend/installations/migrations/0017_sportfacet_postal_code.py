@@ -0,0 +1,43 @@
+from django.db import migrations, models
+from django.db.models import Count, TextField, Value
+from django.db.models.functions import Coalesce
+
+
+def rebuild_facets(apps, schema_editor):
+    """Compteurs recalculés par code postal normalisé (ils étaient indexés par code INSEE)"""
+    Installation = apps.get_model('installations', 'Installation')
+    SportFacet = apps.get_model('installations', 'SportFacet')
+    InstallationSport = Installation.sports.through
+
+    rows = InstallationSport.objects.annotate(
+        cp=Coalesce('installation__postal_code', Value(''), output_field=TextField())
+    ).values('sport_id', 'cp').annotate(n=Count('installation_id'))
+    SportFacet.objects.all().delete()
+    SportFacet.objects.bulk_create(
+        [SportFacet(sport_id=row['sport_id'], postal_code=row['cp'], count=row['n']) for row in rows],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installations', '0016_datasetstate_fingerprint'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='sportfacet',
+            name='sport_facet_cp_sport_uniq',
+        ),
+        migrations.RenameField(
+            model_name='sportfacet',
+            old_name='inst_cp',
+            new_name='postal_code',
+        ),
+        migrations.AddConstraint(
+            model_name='sportfacet',
+            constraint=models.UniqueConstraint(fields=('postal_code', 'sport'), name='sport_facet_cp_sport_uniq'),
+        ),
+        migrations.RunPython(rebuild_facets, migrations.RunPython.noop),
+    ]
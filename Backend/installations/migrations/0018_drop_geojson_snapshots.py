@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+def drop_snapshots(apps, schema_editor):
+    """`sports` reprend sa forme d'origine (chaîne seule) : snapshots reconstruits à la demande"""
+    apps.get_model('installations', 'GeoJSONSnapshot').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('installations', '0017_sportfacet_postal_code'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_snapshots, migrations.RunPython.noop),
+    ]
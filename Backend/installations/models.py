@@ -30,6 +30,9 @@
 
 from django.db import models
 
+from .spatial import grid_cell, parse_coordinates
+from .text import normalize_sports, plm_postal_code
+
 #class Installation(models.Model):
 #    # Clé primaire automatique (Django ajoute 'id' automatiquement)
 #    inst_numero = models.CharField(max_length=50, blank=True, null=True)
@@ -46,6 +49,18 @@ from django.db import models
 #    equip_gest_type = models.CharField(max_length=100, blank=True, null=True)
 #    inst_acc_handi_bool = models.BooleanField(default=False)
     # Vos 13 propriétés avec tailles augmentées
+class Sport(models.Model):
+    """Sport pratiqué (normalisé depuis les listes `equip_aps_nom`)"""
+    name = models.TextField(unique=True)
+
+    class Meta:
+        db_table = 'sports'
+        verbose_name = 'Sport'
+        verbose_name_plural = 'Sports'
+
+    def __str__(self):
+        return self.name
+
 class Installation(models.Model):
     # TOUT EN TextField = ILLIMITÉ !
     inst_numero = models.TextField(blank=True, null=True)      # ♾️ ILLIMITÉ
@@ -62,14 +77,149 @@ class Installation(models.Model):
     equip_gest_type = models.TextField(blank=True, null=True)  # ♾️ ILLIMITÉ
     inst_acc_handi_bool = models.BooleanField(default=False)
 
+    # Colonnes spatiales typées, dérivées de `coordonnees` (voir spatial.py)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    grid_cell = models.IntegerField(blank=True, null=True)
+
+    # Valeurs normalisées une fois à l'enregistrement (voir sync_normalized), lues telles quelles par l'API
+    postal_code = models.TextField(blank=True, null=True)   # inst_cp converti en code postal (PLM)
+    sports_list = models.JSONField(default=list, blank=True)  # equip_aps_nom parsé : ['Tennis', 'Padel']
+
+    # Synchronisation incrémentale (sync/?since=) : version du jeu de données de la dernière
+    # modification. NULL = modifiée, pas encore versionnée (renseignée au passage de version).
+    row_version = models.BigIntegerField(blank=True, null=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+
+    # Ligne d'origine dans le CSV (colonne `id`) et empreinte de son contenu (load_csv --upsert)
+    source_id = models.TextField(blank=True, null=True, db_index=True)
+    content_hash = models.TextField(blank=True, null=True)
+
+    # Sports normalisés (table de liaison indexée), remplis à l'import depuis equip_aps_nom
+    sports = models.ManyToManyField(Sport, related_name='installations', blank=True, db_table='installations_sports')
+
     class Meta:
         db_table = 'installations'
         verbose_name = 'Installation Sportive'
         verbose_name_plural = 'Installations Sportives'
+        indexes = [
+            models.Index(fields=['grid_cell', 'longitude', 'latitude'], name='inst_grid_lon_lat_idx'),
+            models.Index(fields=['latitude', 'longitude'], name='inst_lat_lon_idx'),
+        ]
         
     def __str__(self):
         return f"{self.inst_nom} - {self.equip_type_name}"
 
+    def sync_coordinates(self):
+        """Recopier `coordonnees` dans les colonnes latitude/longitude/grid_cell"""
+        point = parse_coordinates(self.coordonnees)
+        if point is None:
+            self.longitude = self.latitude = self.grid_cell = None
+        else:
+            self.longitude, self.latitude = point
+            self.grid_cell = grid_cell(*point)
+
+    def sync_normalized(self):
+        """Recalculer postal_code et sports_list depuis inst_cp et equip_aps_nom"""
+        self.postal_code = plm_postal_code(self.inst_cp)
+        self.sports_list = normalize_sports(self.equip_aps_nom)
+
+    def save(self, *args, **kwargs):
+        self.sync_coordinates()
+        self.sync_normalized()
+        self.row_version = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields) | {'row_version', 'updated_at'}
+            if 'coordonnees' in update_fields:
+                update_fields |= {'latitude', 'longitude', 'grid_cell'}
+            if 'inst_cp' in update_fields:
+                update_fields.add('postal_code')
+            if 'equip_aps_nom' in update_fields:
+                update_fields.add('sports_list')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
+class SportFacet(models.Model):
+    """
+    Nombre d'installations par sport et par code postal (badges du panneau de filtres).
+    Tenu à jour à chaque modification unitaire, recalculé en une requête après un import.
+    """
+    sport = models.ForeignKey(Sport, on_delete=models.CASCADE, related_name='facets')
+    # Code postal normalisé (Installation.postal_code), celui exposé par l'API sous `inst_cp`
+    postal_code = models.TextField(blank=True, default='')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'installations_sport_facets'
+        verbose_name = 'Compteur par sport'
+        verbose_name_plural = 'Compteurs par sport'
+        constraints = [
+            models.UniqueConstraint(fields=['postal_code', 'sport'], name='sport_facet_cp_sport_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.sport_id} / {self.postal_code}: {self.count}"
+
+class DatasetState(models.Model):
+    """
+    Version courante du jeu de données des installations (ligne unique).
+    Incrémentée à chaque modification : sert de clé d'invalidation aux caches.
+    """
+    SINGLETON_ID = 1
+
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Plus ancienne version à partir de laquelle un delta est possible (ids réinitialisés...)
+    sync_floor = models.BigIntegerField(default=0)
+    # Empreinte (CSV + schéma) du dernier bootstrap_dataset réussi
+    fingerprint = models.TextField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'installations_dataset_state'
+        verbose_name = 'Version du jeu de données'
+        verbose_name_plural = 'Versions du jeu de données'
+
+    def __str__(self):
+        return f"Dataset v{self.version}"
+
+class InstallationTombstone(models.Model):
+    """Installation supprimée, à retirer chez les clients lors d'une synchronisation incrémentale"""
+    installation_id = models.BigIntegerField(db_index=True)
+    # NULL = suppression pas encore versionnée (renseignée au passage de version)
+    version = models.BigIntegerField(blank=True, null=True, db_index=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'installations_tombstones'
+        verbose_name = 'Installation supprimée'
+        verbose_name_plural = 'Installations supprimées'
+
+    def __str__(self):
+        return f"{self.installation_id} (v{self.version})"
+
+class GeoJSONSnapshot(models.Model):
+    """
+    FeatureCollection complète de get_geojson, sérialisée et compressée
+    une seule fois par version du jeu de données.
+    """
+    dataset_key = models.CharField(max_length=64, unique=True)
+    version = models.BigIntegerField()
+    etag = models.CharField(max_length=80)
+    feature_count = models.IntegerField(default=0)
+    payload = models.BinaryField()
+    payload_gzip = models.BinaryField()
+    last_modified = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'installations_geojson_snapshot'
+        verbose_name = 'Snapshot GeoJSON'
+        verbose_name_plural = 'Snapshots GeoJSON'
+
+    def __str__(self):
+        return f"GeoJSON v{self.version} ({self.feature_count} features)"
+
 class UserCheckIn(models.Model):
     """
     Traque la fréquentation d'un terrain sportif pour générer des Heatmaps réelles d'utilisation
@@ -0,0 +1,196 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Recherche des installations les plus proches ("autour de moi").
+
+Les points sont projetés sur la sphère unité (x, y, z) et rangés dans un KD-tree 3D
+implicite (tableau trié, pas d'objets nœuds). La distance euclidienne entre deux
+points de la sphère (corde) est une fonction croissante de l'angle au centre :
+le plus proche en corde est donc le plus proche en distance haversine, que l'on
+recalcule exactement pour la réponse. L'arbre est construit une fois par worker
+et par version du jeu de données.
+"""
+
+import heapq
+import math
+
+from .dataset import PerVersion
+from .models import Installation
+
+EARTH_RADIUS_M = 6371008.8
+
+# En dessous de cette taille, un segment de l'arbre est parcouru linéairement
+LEAF_SIZE = 8
+
+
+def to_unit_vector(lon, lat):
+    lon_r, lat_r = math.radians(lon), math.radians(lat)
+    cos_lat = math.cos(lat_r)
+    return cos_lat * math.cos(lon_r), cos_lat * math.sin(lon_r), math.sin(lat_r)
+
+
+def haversine_m(lon1, lat1, lon2, lat2):
+    """Distance haversine en mètres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def chord2_for_radius(radius_m):
+    """Carré de la corde correspondant à un rayon en mètres"""
+    theta = min(radius_m / EARTH_RADIUS_M, math.pi)
+    return (2 * math.sin(theta / 2)) ** 2
+
+
+class KDTree:
+    """KD-tree 3D statique : order[] range les points, axes[] donne l'axe de coupe de chaque segment"""
+
+    def __init__(self, vectors):
+        self.xs = [v[0] for v in vectors]
+        self.ys = [v[1] for v in vectors]
+        self.zs = [v[2] for v in vectors]
+        self.coords = (self.xs, self.ys, self.zs)
+        self.order = list(range(len(vectors)))
+        self.axes = [0] * len(vectors)
+        self._build()
+
+    def _build(self):
+        stack = [(0, len(self.order))]
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo <= LEAF_SIZE:
+                continue
+            segment = self.order[lo:hi]
+            # Axe de plus grande étendue (estimée sur un échantillon pour les grands segments)
+            sample = segment[::max(1, len(segment) // 64)]
+            spreads = []
+            for values in self.coords:
+                sample_values = [values[i] for i in sample]
+                spreads.append(max(sample_values) - min(sample_values))
+            axis = spreads.index(max(spreads))
+            values = self.coords[axis]
+            segment.sort(key=values.__getitem__)
+            self.order[lo:hi] = segment
+            mid = (lo + hi) // 2
+            self.axes[mid] = axis
+            stack.append((lo, mid))
+            stack.append((mid + 1, hi))
+
+    def query(self, point, k, max_chord2=float('inf'), accept=None):
+        """
+        Les k points les plus proches de `point` (vecteur unité) : liste de (corde², index).
+        `accept(index)` permet de filtrer (types, sports) pendant le parcours.
+        """
+        qx, qy, qz = point
+        xs, ys, zs = self.xs, self.ys, self.zs
+        order, axes, coords = self.order, self.axes, self.coords
+        heap = []  # tas max sur la distance : (-d2, index)
+        bound = max_chord2
+
+        def consider(i):
+            nonlocal bound
+            dx, dy, dz = xs[i] - qx, ys[i] - qy, zs[i] - qz
+            d2 = dx * dx + dy * dy + dz * dz
+            if d2 > bound or (accept is not None and not accept(i)):
+                return
+            if len(heap) < k:
+                heapq.heappush(heap, (-d2, i))
+            elif d2 < -heap[0][0]:
+                heapq.heapreplace(heap, (-d2, i))
+            else:
+                return
+            if len(heap) == k:
+                bound = min(bound, -heap[0][0])
+
+        # Pile de segments (lo, hi, distance² minimale au plan de coupe)
+        stack = [(0, len(order), 0.0)]
+        while stack:
+            lo, hi, plane2 = stack.pop()
+            if plane2 > bound:
+                continue
+            if hi - lo <= LEAF_SIZE:
+                for pos in range(lo, hi):
+                    consider(order[pos])
+                continue
+            mid = (lo + hi) // 2
+            i = order[mid]
+            consider(i)
+            axis = axes[mid]
+            diff = point[axis] - coords[axis][i]
+            if diff < 0:
+                near, far = (lo, mid), (mid + 1, hi)
+            else:
+                near, far = (mid + 1, hi), (lo, mid)
+            # Le côté lointain est empilé d'abord pour être visité après le côté proche
+            stack.append((far[0], far[1], diff * diff))
+            stack.append((near[0], near[1], plane2))
+
+        return sorted((-neg_d2, i) for neg_d2, i in heap)
+
+
+class NearestIndex:
+    """KD-tree + attributs des installations nécessaires à la réponse et aux filtres"""
+
+    def __init__(self, rows):
+        self.ids, self.lons, self.lats, self.names, self.types, self.sports = [], [], [], [], [], []
+        vectors = []
+        for pk, lon, lat, name, type_name, sports in rows:
+            self.ids.append(pk)
+            self.lons.append(lon)
+            self.lats.append(lat)
+            self.names.append(name)
+            self.types.append(type_name)
+            self.sports.append(frozenset(sports or ()))
+            vectors.append(to_unit_vector(lon, lat))
+        self.tree = KDTree(vectors)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nearest(self, lon, lat, k=10, radius_m=None, types=None, sports=None):
+        """Installations les plus proches, triées par distance croissante"""
+        accept = None
+        if types or sports:
+            types = set(types or ())
+            sports = set(sports or ())
+
+            def accept(i):
+                if types and self.types[i] not in types:
+                    return False
+                if sports and not (self.sports[i] & sports):
+                    return False
+                return True
+
+        max_chord2 = chord2_for_radius(radius_m) if radius_m is not None else float('inf')
+        hits = self.tree.query(to_unit_vector(lon, lat), k, max_chord2, accept)
+
+        results = []
+        for _, i in hits:
+            results.append({
+                'id': self.ids[i],
+                'distance_m': round(haversine_m(lon, lat, self.lons[i], self.lats[i]), 1),
+                'lon': self.lons[i],
+                'lat': self.lats[i],
+                'name': self.names[i],
+                'type': self.types[i],
+            })
+        return results
+
+
+def _build_nearest_index(key):
+    rows = Installation.objects.filter(latitude__isnull=False).order_by('id').values_list(
+        'id', 'longitude', 'latitude', 'inst_nom', 'equip_type_name', 'sports_list'
+    )
+    return NearestIndex(rows.iterator(chunk_size=5000))
+
+
+_nearest_index = PerVersion(_build_nearest_index)
+
+
+def get_nearest_index(key=None):
+    """Index "autour de moi" de la version courante (construit une fois par worker)"""
+    return _nearest_index.get(key)
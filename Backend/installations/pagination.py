@@ -0,0 +1,113 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Pagination par curseur (keyset).
+
+Au lieu de `OFFSET n` (PostgreSQL lit puis jette n lignes), la page suivante reprend
+après la dernière ligne vue : `WHERE (date, id) < (:date, :id) ORDER BY date DESC, id DESC`.
+Une page profonde coûte autant que la première. Le curseur est opaque pour le client
+(JSON encodé en base64 url-safe) et lié à l'ordre de tri qui l'a produit.
+"""
+
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _json_default(value):
+    # isoformat complet : DjangoJSONEncoder tronque les dates à la milliseconde,
+    # le curseur ne correspondrait plus exactement à la ligne en base
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(ordering, values):
+    payload = json.dumps({'o': ','.join(ordering), 'k': values}, default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, ordering, model):
+    """Valeurs de clé du curseur, converties selon les champs du modèle"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        values = payload['k']
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f"Curseur invalide : {e}")
+    if payload.get('o') != ','.join(ordering) or len(values) != len(ordering):
+        raise InvalidCursor("Curseur produit pour un autre tri")
+
+    converted = []
+    for field_name, value in zip(_field_names(ordering), values):
+        try:
+            field = model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            # Annotation (ex : nb_signalements) : valeur JSON telle quelle
+            converted.append(value)
+            continue
+        try:
+            converted.append(field.to_python(value))
+        except Exception as e:
+            raise InvalidCursor(f"Curseur invalide : {e}")
+    return converted
+
+
+def _field_names(ordering):
+    return [name.lstrip('-') for name in ordering]
+
+
+def _after(ordering, values):
+    """Q des lignes strictement après `values` dans l'ordre `ordering` (comparaison lexicographique)"""
+    condition = Q()
+    names = _field_names(ordering)
+    for depth in range(len(ordering) - 1, -1, -1):
+        lookup = 'lt' if ordering[depth].startswith('-') else 'gt'
+        step = Q(**{f'{names[depth]}__{lookup}': values[depth]})
+        if depth < len(ordering) - 1:
+            step |= Q(**{names[depth]: values[depth]}) & condition
+        condition = step
+    return condition
+
+
+def keyset_page(queryset, ordering, cursor=None, limit=50, key=None):
+    """
+    (lignes, next_cursor) : au plus `limit` lignes après `cursor`, triées par `ordering`.
+    `ordering` doit se terminer par une clé unique (id) pour un ordre total.
+    `key(ligne)` renvoie les valeurs de tri d'une ligne (utile pour les tuples values_list).
+    Lève InvalidCursor si le curseur est illisible.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(_after(ordering, decode_cursor(cursor, ordering, queryset.model)))
+
+    # Une ligne de plus pour savoir s'il existe une page suivante, sans COUNT
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    if key is not None:
+        values = key(last)
+    else:
+        values = [
+            last[name] if isinstance(last, dict) else getattr(last, name)
+            for name in _field_names(ordering)
+        ]
+    return rows, encode_cursor(ordering, values)
+
+
+def wants_count(request, default=True):
+    """Paramètre `count=false` : ne pas calculer le total (COUNT(*) sur toute la table)"""
+    value = request.GET.get('count')
+    if value is None:
+        return default
+    return value.lower() not in ('false', '0', 'no', 'non')
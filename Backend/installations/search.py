@@ -0,0 +1,159 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Recherche plein texte tolérante (accents, fautes de frappe) sur le nom, l'adresse et le code postal.
+
+Index inversé de trigrammes en mémoire, construit une fois par version du jeu de données :
+trigramme -> liste triée des installations qui le contiennent (array d'entiers).
+Le score d'une installation est la part des trigrammes de la requête qu'elle contient
+(équivalent de word_similarity de pg_trgm) ; le nom départage les ex aequo.
+Les nombres (codes postaux, numéros) ne sont pas approchés : ils doivent figurer tels quels.
+
+Une installation ne peut atteindre MIN_SCORE que si elle figure dans au moins `needed`
+listes : il suffit donc de compter les (listes - needed + 1) listes les plus courtes,
+les plus longues ne servant qu'à compléter le score des candidats déjà trouvés.
+"""
+
+import math
+from array import array
+from bisect import bisect_left
+
+from .dataset import PerVersion
+from .models import Installation
+from .text import normalize_text, trigrams
+
+MIN_SCORE = 0.6
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def _contains(sorted_ids, doc):
+    i = bisect_left(sorted_ids, doc)
+    return i < len(sorted_ids) and sorted_ids[i] == doc
+
+
+class SearchIndex:
+    """Index de trigrammes sur inst_nom + inst_adresse + inst_cp"""
+
+    def __init__(self, rows):
+        self.rows = []
+        self.names = []
+        postings = {}
+        numbers = {}
+        for doc, row in enumerate(rows):
+            pk, name, address, inst_cp, cp, type_name, lon, lat = row
+            self.rows.append(row)
+            self.names.append(normalize_text(name))
+            words = normalize_text(' '.join(filter(None, (name, address, inst_cp, cp)))).split()
+            # Les nombres (codes postaux, numéros de rue) se cherchent à l'identique
+            for word in {w for w in words if w.isdigit()}:
+                numbers.setdefault(word, []).append(doc)
+            for gram in trigrams(' '.join(w for w in words if not w.isdigit())):
+                postings.setdefault(gram, []).append(doc)
+        # Les documents sont parcourus dans l'ordre : les listes sont déjà triées
+        self.postings = {gram: array('I', docs) for gram, docs in postings.items()}
+        self.numbers = {word: array('I', docs) for word, docs in numbers.items()}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _candidates(self, query_grams):
+        """{doc: nombre de trigrammes de la requête présents}, pour les docs pouvant atteindre MIN_SCORE"""
+        needed = max(1, math.ceil(MIN_SCORE * len(query_grams)))
+        lists = sorted((self.postings[g] for g in query_grams if g in self.postings), key=len)
+        if len(lists) < needed:
+            return {}
+
+        seed = len(lists) - needed + 1
+        counts = {}
+        for docs in lists[:seed]:
+            for doc in docs:
+                counts[doc] = counts.get(doc, 0) + 1
+        for docs in lists[seed:]:
+            if len(counts) * 8 < len(docs):
+                # Peu de candidats : recherche dichotomique dans la liste longue
+                for doc in counts:
+                    if _contains(docs, doc):
+                        counts[doc] += 1
+            else:
+                for doc in docs:
+                    if doc in counts:
+                        counts[doc] += 1
+        return {doc: n for doc, n in counts.items() if n >= needed}
+
+    def _numbers_filter(self, numbers):
+        """Docs contenant tous les nombres de la requête (None si la requête n'en a pas)"""
+        if not numbers:
+            return None
+        lists = sorted((self.numbers.get(n, ()) for n in numbers), key=len)
+        docs = set(lists[0])
+        for other in lists[1:]:
+            docs = {doc for doc in docs if _contains(other, doc)}
+        return docs
+
+    def search(self, query):
+        """Groupes de résultats [(score, [docs])] par score décroissant"""
+        words = normalize_text(query).split()
+        required = self._numbers_filter([w for w in words if w.isdigit()])
+        query_grams = trigrams(' '.join(w for w in words if not w.isdigit()))
+        if not query_grams:
+            return [(1.0, sorted(required))] if required else []
+
+        groups = {}
+        for doc, shared in self._candidates(query_grams).items():
+            if required is None or doc in required:
+                groups.setdefault(shared, []).append(doc)
+        total = len(query_grams)
+        return [(shared / total, groups[shared]) for shared in sorted(groups, reverse=True)]
+
+    def _order_group(self, query_grams, docs):
+        """Ordre dans un groupe de même score : similarité du nom, puis id"""
+        def name_score(doc):
+            name_grams = trigrams(self.names[doc])
+            return len(query_grams & name_grams) / len(query_grams | name_grams) if name_grams else 0.0
+        return sorted(docs, key=lambda doc: (-name_score(doc), self.rows[doc][0]))
+
+    def result(self, doc, score):
+        pk, name, address, inst_cp, cp, type_name, lon, lat = self.rows[doc]
+        return {
+            'id': pk,
+            'name': name,
+            'address': address,
+            'cp': cp,
+            'type': type_name,
+            'lon': lon,
+            'lat': lat,
+            'score': round(score, 3),
+        }
+
+    def page(self, query, page=1, page_size=DEFAULT_PAGE_SIZE):
+        """Page de résultats classés + total ; seuls les groupes de la page sont triés finement"""
+        groups = self.search(query)
+        query_grams = trigrams(' '.join(w for w in normalize_text(query).split() if not w.isdigit()))
+        start, stop = (page - 1) * page_size, page * page_size
+
+        results, offset = [], 0
+        for score, docs in groups:
+            if offset + len(docs) > start and offset < stop:
+                ordered = self._order_group(query_grams, docs)
+                for doc in ordered[max(start - offset, 0):stop - offset]:
+                    results.append(self.result(doc, score))
+            offset += len(docs)
+        return results, offset
+
+
+def _build_search_index(key):
+    rows = Installation.objects.order_by('id').values_list(
+        'id', 'inst_nom', 'inst_adresse', 'inst_cp', 'postal_code', 'equip_type_name', 'longitude', 'latitude'
+    )
+    return SearchIndex(rows.iterator(chunk_size=5000))
+
+
+_search_index = PerVersion(_build_search_index)
+
+
+def get_search_index(key=None):
+    """Index de recherche de la version courante (construit une fois par worker)"""
+    return _search_index.get(key)
@@ -4,12 +4,13 @@
 
 from rest_framework import serializers
 from .models import Installation
-import ast
+from .text import parse_sports_field
 # Serializer pour l'Installation
 # selectionnne les champs nécessaires
 # et transforme les données pour l'API
 class InstallationSerializer(serializers.ModelSerializer):
-    inst_cp = serializers.SerializerMethodField()
+    # Code postal normalisé (PLM) stocké à l'enregistrement, exposé sous le nom inst_cp
+    inst_cp = serializers.CharField(source='postal_code', read_only=True)
 
     class Meta:
         model = Installation
@@ -21,20 +22,63 @@ class InstallationSerializer(serializers.ModelSerializer):
             'inst_acc_handi_bool'
         ]
 
-    def get_inst_cp(self, obj):
-        """Conversion du Code INSEE (ex: 13201) en Code Postal (13001) pour l'affichage (PLM)"""
-        cp = obj.inst_cp
-        if cp and isinstance(cp, str) and len(cp) == 5:
-            # Marseille (132XX -> 130XX)
-            if cp.startswith('132'):
-                return cp.replace('132', '130', 1)
-            # Lyon (693XX -> 690XX)
-            elif cp.startswith('693'):
-                return cp.replace('693', '690', 1)
-            # Paris (751XX -> 750XX)
-            elif cp.startswith('751'):
-                return cp.replace('751', '750', 1)
-        return cp
+# Champs de sortie de InstallationSerializer, dans l'ordre de l'API
+INSTALLATION_FIELDS = tuple(InstallationSerializer.Meta.fields)
+
+# Colonne lue pour un champ de sortie, quand elle diffère de son nom
+INSTALLATION_COLUMNS = {'inst_cp': 'postal_code'}
+
+def parse_fields(fields_param, allowed=INSTALLATION_FIELDS):
+    """
+    Champs demandés (`fields=id,coordonnees,equip_type_name`) dans l'ordre canonique,
+    'id' toujours inclus ; None si le paramètre est absent (tous les champs).
+    Lève ValueError pour un champ inconnu.
+    """
+    if not fields_param:
+        return None
+    requested = {field.strip() for field in fields_param.split(',') if field.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise ValueError(f"Champs inconnus : {', '.join(sorted(unknown))}")
+    requested.add('id')
+    return tuple(field for field in allowed if field in requested)
+
+def compile_installation_serializer(fields=INSTALLATION_FIELDS, offset=0):
+    """
+    Sérialiseur "compilé" : fonction générée une fois pour une liste de champs, qui transforme
+    un tuple values_list(*colonnes_précédentes, *serialize.columns) en dictionnaire, sans instance
+    de serializer ni champ DRF. `offset` = nombre de colonnes précédant les champs dans le tuple.
+    Les valeurs sont déjà normalisées en base : la fonction ne fait que les recopier.
+    Sortie identique à InstallationSerializer pour ces champs.
+    """
+    items = []
+    for index, field in enumerate(fields, start=offset):
+        if field not in INSTALLATION_FIELDS:
+            raise ValueError(f"Champ inconnu : {field}")
+        items.append(f'{field!r}: row[{index}]')
+    source = f"def serialize(row):\n    return {{{', '.join(items)}}}\n"
+    namespace = {}
+    exec(compile(source, f'<installation serializer {",".join(fields)}>', 'exec'), namespace)
+    serialize = namespace['serialize']
+    serialize.fields = tuple(fields)
+    serialize.columns = tuple(INSTALLATION_COLUMNS.get(field, field) for field in fields)
+    return serialize
+
+_compiled_serializers = {}
+
+def get_installation_serializer(fields=None, offset=0):
+    """Sérialiseur compilé pour `fields` (tous les champs si None), mémorisé"""
+    fields = tuple(fields) if fields is not None else INSTALLATION_FIELDS
+    serialize = _compiled_serializers.get((fields, offset))
+    if serialize is None:
+        serialize = compile_installation_serializer(fields, offset)
+        _compiled_serializers[(fields, offset)] = serialize
+    return serialize
+
+def serialize_installations(queryset, fields=None):
+    """Liste de dictionnaires depuis un QuerySet, en ne lisant que les colonnes des champs"""
+    serialize = get_installation_serializer(fields)
+    return [serialize(row) for row in queryset.values_list(*serialize.columns)]
 
 class SportsListSerializer(serializers.Serializer):
     """Serializer pour extraire et formatter la liste des sports"""
@@ -44,9 +88,7 @@ class SportsListSerializer(serializers.Serializer):
         unique_sports = set()
         
         for installation in queryset:
-            if installation.equip_aps_nom:
-                sports = self._parse_sports_field(installation.equip_aps_nom)
-                unique_sports.update(sports)
+            unique_sports.update(installation.sports_list or ())
         
         return {
             "sports": sorted(list(unique_sports)),
@@ -55,22 +97,7 @@ class SportsListSerializer(serializers.Serializer):
     
     def _parse_sports_field(self, sport_field):
         """Parser un champ sport (string ou liste)"""
-        if not sport_field:
-            return []
-        
-        try:
-            # Cas 1: Liste Python stockée comme string "['Tennis', 'Volley']"
-            if sport_field.startswith('[') and sport_field.endswith(']'):
-                sports_list = ast.literal_eval(sport_field)
-                return [sport.strip() for sport in sports_list if sport.strip()]
-            
-            # Cas 2: String simple "Tennis de table"
-            else:
-                return [sport_field.strip()]
-                
-        except (ValueError, SyntaxError):
-            # En cas d'erreur, traiter comme string simple
-            return [sport_field.strip()] if sport_field.strip() else []
+        return parse_sports_field(sport_field)
         
         
 class InstallationListSerializer(serializers.ModelSerializer):
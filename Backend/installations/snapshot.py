@@ -0,0 +1,251 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Snapshot GeoJSON versionné.
+
+La FeatureCollection complète est construite une fois par version du jeu de données,
+stockée (JSON + gzip) dans la table `installations_geojson_snapshot` pour être
+partagée entre les workers, puis gardée en mémoire dans chaque processus.
+"""
+
+import gzip
+import hashlib
+import json
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .cache import LRUCache
+from .compact import CATEGORICAL_PROPERTIES, dumps, encode_columnar, feature_records
+from .dataset import PerVersion, get_dataset_state, dataset_key, register_dataset_hook
+from .models import GeoJSONSnapshot, Installation
+
+# Colonnes lues pour construire une feature (pas d'instance de modèle complète) ;
+# sports et code postal sont lus déjà normalisés (sports_list, postal_code),
+# equip_aps_nom seulement pour garder la forme d'origine de `sports` (voir feature_sports)
+GEOJSON_COLUMNS = (
+    'id', 'coordonnees', 'inst_nom', 'equip_type_name', 'equip_type_famille',
+    'sports_list', 'equip_aps_nom', 'equip_acc_libre', 'equip_url', 'inst_adresse', 'postal_code',
+    'equip_prop_nom', 'equip_gest_type', 'inst_acc_handi_bool',
+)
+
+# Propriétés d'une feature, dans l'ordre de sortie (paramètre fields= de get_geojson)
+GEOJSON_PROPERTIES = (
+    'id', 'name', 'type', 'family', 'sports', 'free_access', 'url', 'address',
+    'city', 'owner', 'gestion', 'inst_acc_handi_bool',
+)
+
+# Nombre de snapshots conservés en base (la version courante + la précédente)
+SNAPSHOTS_KEPT = 2
+
+# Variantes allégées (fields=) gardées en mémoire, toutes versions confondues
+_variants = LRUCache(16)
+
+
+def feature_sports(sports_list, raw):
+    """
+    Propriété `sports`, de la même forme qu'avant la normalisation (le front teste le type) :
+    liste si equip_aps_nom est une liste Python, sinon la valeur brute ("Football", '' ou None).
+    Une liste mal formée est normalisée en [valeur brute] : elle reste une chaîne, comme avant.
+    """
+    if isinstance(raw, str) and raw.startswith('[') and raw.endswith(']') and sports_list != [raw.strip()]:
+        return sports_list
+    return raw
+
+
+def build_feature(row):
+    """Construire une feature GeoJSON depuis un tuple GEOJSON_COLUMNS, ou None si coordonnées invalides"""
+    (pk, coordonnees, inst_nom, equip_type_name, equip_type_famille, sports_list, equip_aps_nom,
+     equip_acc_libre, equip_url, inst_adresse, cp, equip_prop_nom, equip_gest_type,
+     inst_acc_handi_bool) = row
+
+    if not coordonnees or "lon" not in coordonnees or "lat" not in coordonnees:
+        return None
+
+    sports = feature_sports(sports_list, equip_aps_nom)
+
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [
+                float(coordonnees["lon"]),
+                float(coordonnees["lat"])
+            ]
+        },
+        "properties": {
+            "id": pk,
+            "name": inst_nom,
+            "type": equip_type_name,
+            "family": equip_type_famille,
+            "sports": sports,
+            "free_access": equip_acc_libre,
+            "url": equip_url,
+            "address": inst_adresse,
+            "city": cp,
+            "owner": equip_prop_nom,
+            "gestion": equip_gest_type,
+            "inst_acc_handi_bool": inst_acc_handi_bool
+        }
+    }
+
+
+def iter_features(queryset=None, chunk_size=2000, rows=None, properties=None):
+    """
+    Parcourir les features valides, ligne par ligne.
+    `iterator(chunk_size)` utilise un curseur côté serveur PostgreSQL :
+    seules `chunk_size` lignes sont en mémoire à la fois.
+    `rows` (tuples GEOJSON_COLUMNS déjà lus, ex. magasin colonnes) remplace la requête.
+    `properties` limite les propriétés écrites (None = toutes).
+    """
+    if rows is None:
+        queryset = Installation.objects.all() if queryset is None else queryset
+        rows = queryset.order_by('id').values_list(*GEOJSON_COLUMNS).iterator(chunk_size=chunk_size)
+    for row in rows:
+        try:
+            feature = build_feature(row)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Error processing installation {row[0]}: {e}")
+            continue
+        if feature is not None:
+            if properties is not None:
+                feature['properties'] = {name: feature['properties'][name] for name in properties}
+            yield feature
+
+
+def iter_geojson_chunks(queryset=None, chunk_size=2000, features_per_chunk=500, stats=None, rows=None,
+                        properties=None):
+    """
+    Générer la FeatureCollection par morceaux d'octets, sans jamais la matérialiser.
+    La mémoire utilisée ne dépend que de `chunk_size`, pas de la taille de la table.
+    `stats` (dict optionnel) reçoit le nombre de features écrites.
+    """
+    count = 0
+    buffer = []
+    yield b'{"type":"FeatureCollection","features":['
+    for feature in iter_features(queryset, chunk_size=chunk_size, rows=rows, properties=properties):
+        encoded = json.dumps(feature, ensure_ascii=False, separators=(',', ':'))
+        buffer.append(encoded if count == 0 else ',' + encoded)
+        count += 1
+        if len(buffer) >= features_per_chunk:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+    yield b']}'
+    if stats is not None:
+        stats['count'] = count
+
+
+def _pack(payload, count):
+    etag = '"%s"' % hashlib.sha256(payload).hexdigest()[:32]
+    return payload, gzip.compress(payload, compresslevel=9, mtime=0), etag, count
+
+
+def build_snapshot_payload(rows=None, properties=None):
+    """(payload, payload_gzip, etag, feature_count) de la FeatureCollection complète"""
+    stats = {}
+    payload = b''.join(iter_geojson_chunks(stats=stats, rows=rows, properties=properties))
+    return _pack(payload, stats['count'])
+
+
+def build_columnar_payload(queryset=None, rows=None, properties=None, precision=None):
+    """Mêmes features au format columnar (voir compact.py) : (payload, payload_gzip, etag, count)"""
+    properties = properties or GEOJSON_PROPERTIES
+    payload = encode_columnar(
+        feature_records(iter_features(queryset, rows=rows, properties=properties)),
+        [name for name in properties if name != 'id'], CATEGORICAL_PROPERTIES, precision,
+    )
+    return _pack(dumps(payload), payload['count'])
+
+
+def _store_snapshot():
+    """
+    Construire le snapshot de la version courante et l'enregistrer en base.
+    Clé, version et date viennent d'une seule lecture de l'état ; si la version a changé
+    pendant la construction, les lignes lues peuvent mélanger deux versions : le snapshot
+    est servi tel quel mais pas enregistré.
+    """
+    state = get_dataset_state()
+    key, (version, updated_at) = dataset_key(state), state
+    payload, payload_gzip, etag, count = build_snapshot_payload()
+    snapshot = GeoJSONSnapshot(
+        dataset_key=key,
+        version=version,
+        etag=etag,
+        feature_count=count,
+        payload=payload,
+        payload_gzip=payload_gzip,
+        last_modified=updated_at or timezone.now(),
+    )
+    if dataset_key() != key:
+        return snapshot
+    try:
+        with transaction.atomic():
+            snapshot.save()
+    except IntegrityError:
+        # Un autre worker l'a construit en même temps
+        return GeoJSONSnapshot.objects.get(dataset_key=key)
+
+    stale = GeoJSONSnapshot.objects.order_by('-created_at').values_list('id', flat=True)[SNAPSHOTS_KEPT:]
+    GeoJSONSnapshot.objects.filter(id__in=list(stale)).delete()
+
+    print(f"✅ GeoJSON snapshot v{version} generated with {snapshot.feature_count} features")
+    return snapshot
+
+
+def _load_snapshot(key):
+    snapshot = GeoJSONSnapshot.objects.filter(dataset_key=key).first()
+    if snapshot is None:
+        # Version courante, éventuellement plus récente que `key`
+        snapshot = _store_snapshot()
+    # BinaryField peut renvoyer des memoryview : on garde des bytes en mémoire
+    snapshot.payload = bytes(snapshot.payload)
+    snapshot.payload_gzip = bytes(snapshot.payload_gzip)
+    return snapshot
+
+
+_current_snapshot = PerVersion(_load_snapshot)
+
+
+def get_geojson_snapshot(key=None):
+    """Snapshot de la version courante (mémoire du processus, puis base, puis construction)"""
+    return _current_snapshot.get(key or dataset_key())
+
+
+@register_dataset_hook
+def rebuild_geojson_snapshot(key):
+    """Reconstruire le snapshot après un import / une synchronisation / une purge"""
+    return get_geojson_snapshot(key)
+
+
+def get_geojson_variant(properties, store=None, columnar=False, precision=None):
+    """
+    FeatureCollection limitée à `properties` (GeoJSONSnapshot non enregistré),
+    construite une fois par version et par jeu de propriétés / format.
+    `store` : magasin colonnes à lire à la place de la base.
+    `columnar` / `precision` : format columnar, coordonnées éventuellement quantifiées.
+    """
+    if store is not None:
+        key, version, rows, last_modified = store.key, store.version, store.geojson_rows(), store.updated_at
+    else:
+        state = get_dataset_state()
+        key, version, rows, last_modified = dataset_key(state), state[0], None, state[1]
+
+    variant = (key, properties, columnar, precision)
+    snapshot = _variants.get(variant)
+    if snapshot is None:
+        if columnar:
+            payload, payload_gzip, etag, count = build_columnar_payload(
+                rows=rows, properties=properties, precision=precision
+            )
+        else:
+            payload, payload_gzip, etag, count = build_snapshot_payload(rows=rows, properties=properties)
+        snapshot = GeoJSONSnapshot(
+            dataset_key=key, version=version, etag=etag, feature_count=count,
+            payload=payload, payload_gzip=payload_gzip, last_modified=last_modified or timezone.now(),
+        )
+        _variants.set(variant, snapshot)
+    return snapshot
@@ -0,0 +1,139 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Outils spatiaux pour les installations : colonnes lat/lon typées + grille régulière.
+
+Chaque installation reçoit un numéro de cellule (grid_cell) calculé sur une grille
+de GRID_CELL_DEG degrés, numérotée ligne par ligne (latitude puis longitude).
+Un rectangle de la carte devient alors quelques plages contiguës de cellules,
+ce qui permet à PostgreSQL d'utiliser l'index composite (grid_cell, longitude, latitude)
+au lieu de re-parser le JSON `coordonnees` de chaque ligne.
+"""
+
+import math
+
+from django.db.models import FloatField, Q
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
+
+# Taille d'une cellule de la grille (en degrés) : ~11 km en latitude
+GRID_CELL_DEG = 0.1
+GRID_COLS = int(round(360 / GRID_CELL_DEG))
+GRID_ROWS = int(round(180 / GRID_CELL_DEG))
+
+# Au-delà de ce nombre de lignes de grille, on interroge directement l'index (latitude, longitude)
+MAX_GRID_ROWS = 64
+
+
+def parse_coordinates(coordonnees):
+    """Extraire (lon, lat) en float depuis le JSONField `coordonnees`, ou None si invalide"""
+    if not coordonnees or not isinstance(coordonnees, dict):
+        return None
+    try:
+        lon = float(coordonnees['lon'])
+        lat = float(coordonnees['lat'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if math.isnan(lon) or math.isnan(lat):
+        return None
+    return lon, lat
+
+
+def _grid_col(lon):
+    col = int(math.floor((lon + 180.0) / GRID_CELL_DEG))
+    return min(max(col, 0), GRID_COLS - 1)
+
+
+def _grid_row(lat):
+    row = int(math.floor((lat + 90.0) / GRID_CELL_DEG))
+    return min(max(row, 0), GRID_ROWS - 1)
+
+
+def grid_cell(lon, lat):
+    """Numéro de cellule de la grille contenant le point (lon, lat)"""
+    return _grid_row(lat) * GRID_COLS + _grid_col(lon)
+
+
+def parse_bounds(bounds):
+    """Parser le paramètre `bounds` (sw_lng,sw_lat,ne_lng,ne_lat) en tuple de floats"""
+    sw_lng, sw_lat, ne_lng, ne_lat = map(float, bounds.split(','))
+    return sw_lng, sw_lat, ne_lng, ne_lat
+
+
+def bounds_q(sw_lng, sw_lat, ne_lng, ne_lat):
+    """
+    Filtre Q sur les colonnes typées pour un rectangle.
+    Les plages de cellules guident l'index, les bornes exactes affinent le résultat.
+    """
+    exact = Q(
+        longitude__gte=sw_lng, longitude__lte=ne_lng,
+        latitude__gte=sw_lat, latitude__lte=ne_lat,
+    )
+    if sw_lng > ne_lng or sw_lat > ne_lat:
+        return exact
+
+    row_start, row_end = _grid_row(sw_lat), _grid_row(ne_lat)
+    if row_end - row_start + 1 > MAX_GRID_ROWS:
+        # Très grand rectangle : l'index (latitude, longitude) est plus efficace
+        return exact
+
+    col_start, col_end = _grid_col(sw_lng), _grid_col(ne_lng)
+    cells = Q()
+    for row in range(row_start, row_end + 1):
+        base = row * GRID_COLS
+        cells |= Q(grid_cell__range=(base + col_start, base + col_end))
+    return cells & exact
+
+
+def filter_bounds(query, bounds):
+    """
+    Appliquer le filtre `bounds` à un QuerySet d'installations.
+    Les lignes sans colonnes typées (latitude NULL) passent par l'ancien chemin JSON.
+    """
+    return filter_bbox(query, *parse_bounds(bounds))
+
+
+def filter_bbox(query, sw_lng, sw_lat, ne_lng, ne_lat):
+    """Même filtre que filter_bounds, à partir de bornes déjà parsées"""
+    # Ancien chemin : CAST(coordonnees->>'lon' AS FLOAT), gardé en secours
+    query = query.alias(
+        json_lon=Cast(KeyTextTransform('lon', 'coordonnees'), FloatField()),
+        json_lat=Cast(KeyTextTransform('lat', 'coordonnees'), FloatField()),
+    )
+    json_fallback = Q(latitude__isnull=True) & Q(
+        json_lon__gte=sw_lng, json_lon__lte=ne_lng,
+        json_lat__gte=sw_lat, json_lat__lte=ne_lat,
+    )
+    return query.filter(bounds_q(sw_lng, sw_lat, ne_lng, ne_lat) | json_fallback)
+
+
+# ===== PROJECTION WEB MERCATOR (tuiles z/x/y de la carte) =====
+
+TILE_SIZE = 256
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def lonlat_to_world(lon, lat):
+    """Coordonnées mercator normalisées (x, y) dans [0, 1], y vers le sud"""
+    lat = min(max(lat, -MAX_MERCATOR_LAT), MAX_MERCATOR_LAT)
+    x = (lon + 180.0) / 360.0
+    sin_lat = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return min(max(x, 0.0), 1.0), min(max(y, 0.0), 1.0)
+
+
+def world_to_lonlat(x, y):
+    """Inverse de lonlat_to_world"""
+    lon = x * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return lon, lat
+
+
+def tile_bounds(z, x, y):
+    """Bornes (sw_lng, sw_lat, ne_lng, ne_lat) de la tuile web-mercator z/x/y"""
+    n = 2 ** z
+    sw_lng, sw_lat = world_to_lonlat(x / n, (y + 1) / n)
+    ne_lng, ne_lat = world_to_lonlat((x + 1) / n, y / n)
+    return sw_lng, sw_lat, ne_lng, ne_lat
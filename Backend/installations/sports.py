@@ -0,0 +1,154 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Sports normalisés : table `sports` + liaison `installations_sports`.
+
+Les listes `equip_aps_nom` ("['Tennis', 'Padel']") sont parsées une seule fois,
+à l'import (load_csv) ou à l'enregistrement d'une installation (colonne sports_list),
+au lieu d'un ast.literal_eval par ligne et par requête.
+
+Les compteurs par sport et code postal (SportFacet) suivent les mêmes signaux :
++1/-1 pour une modification unitaire, recalcul complet à la fin d'un import.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, Sum, TextField, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .dataset import in_dataset_batch, register_dataset_hook
+from .models import Installation, Sport, SportFacet
+from .spatial import filter_bbox
+from .text import plm_postal_code
+
+InstallationSport = Installation.sports.through
+
+
+def link_installation_sports(rows, replace=False):
+    """
+    Créer les sports et les liaisons pour des (installation_id, sports_list).
+    Avec replace=True, les liaisons existantes de ces installations sont d'abord supprimées.
+    """
+    parsed = [(pk, set(sports or ())) for pk, sports in rows]
+    if replace:
+        InstallationSport.objects.filter(installation_id__in=[pk for pk, _ in parsed]).delete()
+
+    names = {name for _, sports in parsed for name in sports}
+    if not names:
+        return 0
+    Sport.objects.bulk_create([Sport(name=name) for name in names], ignore_conflicts=True)
+    sport_ids = dict(Sport.objects.filter(name__in=names).values_list('name', 'id'))
+
+    links = [
+        InstallationSport(installation_id=pk, sport_id=sport_ids[name])
+        for pk, sports in parsed for name in sports
+    ]
+    InstallationSport.objects.bulk_create(links, batch_size=2000, ignore_conflicts=True)
+    return len(links)
+
+
+def list_sports():
+    """Noms des sports proposés par au moins une installation (DISTINCT sur la liaison indexée)"""
+    used = InstallationSport.objects.values('sport_id')
+    return sorted(Sport.objects.filter(id__in=used).values_list('name', flat=True))
+
+
+def filter_sports(query, sports_list):
+    """Restreindre un QuerySet d'installations à celles qui proposent un des sports"""
+    if not sports_list:
+        return query
+    matching = InstallationSport.objects.filter(sport__name__in=sports_list).values('installation_id')
+    return query.filter(id__in=matching)
+
+
+def _linked_sport_ids(installation_id):
+    return set(InstallationSport.objects.filter(installation_id=installation_id).values_list('sport_id', flat=True))
+
+
+def _adjust_facets(cp, sport_ids, delta):
+    """Ajouter `delta` aux compteurs (sport, cp) ; les compteurs tombés à zéro sont supprimés"""
+    cp = cp or ''
+    for sport_id in sport_ids:
+        updated = SportFacet.objects.filter(sport_id=sport_id, postal_code=cp).update(count=F('count') + delta)
+        if not updated and delta > 0:
+            facet, created = SportFacet.objects.get_or_create(
+                sport_id=sport_id, postal_code=cp, defaults={'count': delta}
+            )
+            if not created:
+                SportFacet.objects.filter(pk=facet.pk).update(count=F('count') + delta)
+    if delta < 0:
+        SportFacet.objects.filter(postal_code=cp, sport_id__in=sport_ids, count__lte=0).delete()
+
+
+@register_dataset_hook
+def rebuild_sport_facets(key):
+    """Recalculer tous les compteurs en une seule agrégation sur la table de liaison"""
+    rows = InstallationSport.objects.annotate(
+        cp=Coalesce('installation__postal_code', Value(''), output_field=TextField())
+    ).values('sport_id', 'cp').annotate(n=Count('installation_id'))
+    facets = [SportFacet(sport_id=row['sport_id'], postal_code=row['cp'], count=row['n']) for row in rows]
+    with transaction.atomic():
+        SportFacet.objects.all().delete()
+        SportFacet.objects.bulk_create(facets, batch_size=2000)
+    print(f"🏷️ Compteurs sports recalculés : {len(facets)} lignes ({key})")
+
+
+def sport_counts(cp=None, bbox=None):
+    """
+    {sport: nombre d'installations}, éventuellement limité à un code postal et/ou une emprise.
+    `cp` est le code postal exposé par l'API (inst_cp = postal_code) ; un code INSEE
+    d'arrondissement PLM (13201) est accepté et converti (13001).
+    Sans emprise : lecture des compteurs précalculés. Avec emprise : agrégation sur la
+    table de liaison restreinte par l'index spatial.
+    """
+    cp = plm_postal_code(cp)
+    if bbox is None:
+        query = SportFacet.objects.filter(count__gt=0)
+        if cp:
+            query = query.filter(postal_code=cp)
+        rows = query.values('sport__name').annotate(n=Sum('count'))
+    else:
+        installations = filter_bbox(Installation.objects.all(), *bbox)
+        if cp:
+            installations = installations.filter(postal_code=cp)
+        rows = InstallationSport.objects.filter(
+            installation_id__in=installations.values('id')
+        ).values('sport__name').annotate(n=Count('installation_id'))
+    return {row['sport__name']: row['n'] for row in rows}
+
+
+@receiver(pre_save, sender=Installation)
+def installation_saving(sender, instance, **kwargs):
+    """Mémoriser le code postal et les sports d'avant la modification"""
+    if in_dataset_batch() or instance.pk is None:
+        return
+    old_cp = Installation.objects.filter(pk=instance.pk).values_list('postal_code', flat=True).first()
+    instance._facets_before = (old_cp, _linked_sport_ids(instance.pk))
+
+
+@receiver(post_save, sender=Installation)
+def installation_saved(sender, instance, **kwargs):
+    """Modification unitaire : recalculer les sports de l'installation et ajuster les compteurs"""
+    if in_dataset_batch():
+        return
+    old_cp, old_ids = getattr(instance, '_facets_before', None) or (None, set())
+    instance._facets_before = None
+    link_installation_sports([(instance.pk, instance.sports_list)], replace=True)
+    new_cp, new_ids = instance.postal_code, _linked_sport_ids(instance.pk)
+
+    if (old_cp or '') == (new_cp or ''):
+        _adjust_facets(new_cp, old_ids - new_ids, -1)
+        _adjust_facets(new_cp, new_ids - old_ids, 1)
+    else:
+        _adjust_facets(old_cp, old_ids, -1)
+        _adjust_facets(new_cp, new_ids, 1)
+
+
+@receiver(pre_delete, sender=Installation)
+def installation_deleting(sender, instance, **kwargs):
+    """Suppression unitaire : les liaisons partent en cascade, on décrémente avant"""
+    if not in_dataset_batch():
+        _adjust_facets(instance.postal_code, _linked_sport_ids(instance.pk), -1)
@@ -2,8 +2,31 @@
 # Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
 # Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
 
-from django.test import TestCase, Client
-from .models import Installation
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from .models import DatasetState, GeoJSONSnapshot, Installation, InstallationTombstone, SportFacet
+from . import binary, loader, snapshot as snapshot_module
+from .spatial import grid_cell
+from .bundles import department, export_bundles
+from .cache import LRUCache, ViewportCache, normalize_types, viewport_cache
+from .dataset import dataset_batch, dataset_key, get_dataset_fingerprint, get_dataset_version, reset_sync_history
+from .exclusion import KeywordMatcher, excluded_keyword
+from .serializers import InstallationSerializer, get_installation_serializer, serialize_installations
+from .sports import link_installation_sports
+from .text import normalize_sports
 
 class InstallationModelTest(TestCase):
     """Tests basiques du modèle"""
@@ -64,4 +87,1138 @@ class InstallationAPITest(TestCase):
         response = self.client.get('/api/v1/sports/')
         self.assertEqual(response.status_code, 200)
         data = response.json()
-        self.assertIn('sports', data)
\ No newline at end of file
+        self.assertIn('sports', data)
+
+
+class SpatialBoundsTest(TestCase):
+    """Tests du filtre bounds sur les colonnes typées"""
+
+    def setUp(self):
+        viewport_cache.clear()
+        self.marseille = Installation.objects.create(
+            inst_numero='GEO001', coordonnees={'lon': 5.37, 'lat': 43.29}, inst_nom='Marseille'
+        )
+        self.aix = Installation.objects.create(
+            inst_numero='GEO002', coordonnees={'lon': 5.45, 'lat': 43.53}, inst_nom='Aix'
+        )
+        self.paris = Installation.objects.create(
+            inst_numero='GEO003', coordonnees={'lon': 2.35, 'lat': 48.85}, inst_nom='Paris'
+        )
+
+    def test_typed_columns_populated(self):
+        """Les colonnes lat/lon/grid_cell sont remplies à la création"""
+        self.marseille.refresh_from_db()
+        self.assertEqual(self.marseille.longitude, 5.37)
+        self.assertEqual(self.marseille.latitude, 43.29)
+        self.assertEqual(self.marseille.grid_cell, grid_cell(5.37, 43.29))
+
+    def test_bounds_filter(self):
+        """Seules les installations dans le rectangle sont renvoyées"""
+        response = self.client.get(reverse('installations:get_equipments'), {'bounds': '5.3,43.2,5.5,43.6'})
+        self.assertEqual(response.status_code, 200)
+        names = sorted(item['inst_nom'] for item in response.json())
+        self.assertEqual(names, ['Aix', 'Marseille'])
+
+    def test_bounds_json_fallback(self):
+        """Une ligne sans colonnes typées reste trouvée via le JSON"""
+        Installation.objects.filter(pk=self.aix.pk).update(latitude=None, longitude=None, grid_cell=None)
+        response = self.client.get(reverse('installations:get_equipments'), {'bounds': '5.4,43.5,5.5,43.6'})
+        self.assertEqual([item['inst_nom'] for item in response.json()], ['Aix'])
+
+
+class ViewportCacheTest(TestCase):
+    """Tests du cache par tuiles de get_equipments"""
+
+    def setUp(self):
+        viewport_cache.clear()
+        self.url = reverse('installations:get_equipments')
+        Installation.objects.create(
+            inst_numero='VC001', coordonnees={'lon': 5.37, 'lat': 43.29},
+            inst_nom='Stade', equip_type_name='Terrain de football'
+        )
+        Installation.objects.create(
+            inst_numero='VC002', coordonnees={'lon': 5.38, 'lat': 43.30},
+            inst_nom='Tennis', equip_type_name='Court de tennis'
+        )
+
+    def test_filtered_request_does_not_poison_cache(self):
+        """Une première requête filtrée ne doit pas être resservie sans filtre"""
+        filtered = self.client.get(self.url, {'types': 'Court de tennis'})
+        self.assertEqual(len(filtered.json()), 1)
+        unfiltered = self.client.get(self.url)
+        self.assertEqual(len(unfiltered.json()), 2)
+
+    def test_neighbouring_pan_hits_cache(self):
+        """Un petit déplacement dans les mêmes tuiles est servi depuis le cache"""
+        first = self.client.get(self.url, {'bounds': '5.30,43.20,5.40,43.35'})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        second = self.client.get(self.url, {'bounds': '5.375,43.21,5.45,43.36'})
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual([item['inst_nom'] for item in second.json()], ['Tennis'])
+
+    def test_types_normalized(self):
+        """L'ordre et les doublons de `types` ne changent pas la clé"""
+        self.assertEqual(
+            normalize_types('Court de tennis,Terrain de football,Court de tennis'),
+            normalize_types(' Terrain de football,Court de tennis'),
+        )
+        self.client.get(self.url, {'types': 'Court de tennis,Terrain de football'})
+        response = self.client.get(self.url, {'types': 'Terrain de football,Court de tennis'})
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_invalidated_when_installation_changes(self):
+        """Une modification d'installation invalide le cache"""
+        self.client.get(self.url)
+        Installation.objects.create(
+            inst_numero='VC003', coordonnees={'lon': 5.39, 'lat': 43.31}, inst_nom='Piscine'
+        )
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()), 3)
+
+    def test_float_tile_size(self):
+        """Taille 0.1 : un point sur une limite de tuile est dans la tuile chargée avec lui"""
+        cache = ViewportCache(max_entries=16, tile_deg=0.1)
+        point = (1, 0.3, 0.7, {})
+        self.assertEqual(cache._tile(0.3, 0.7), (3, 7))
+        sw_lng, sw_lat, ne_lng, ne_lat = cache._tile_bbox(3, 7, 3, 7)
+        self.assertTrue(sw_lng <= 0.3 < ne_lng and sw_lat <= 0.7 < ne_lat)
+
+        def loader(bbox, filters):
+            return [point] if bbox[0] <= point[1] <= bbox[2] and bbox[1] <= point[2] <= bbox[3] else []
+
+        self.assertEqual(cache.get('v1', (0.25, 0.65, 0.35, 0.75), (), loader), ([point], False))
+        self.assertEqual(cache.get('v1', (0.3, 0.7, 0.31, 0.71), (), loader), ([point], True))
+
+    def test_lru_eviction(self):
+        """Le nombre d'entrées est borné, les plus anciennes sont évincées"""
+        lru = LRUCache(max_entries=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(lru.stats()['evictions'], 1)
+
+
+class GeoJSONSnapshotTest(TestCase):
+    """Tests du snapshot GeoJSON versionné"""
+
+    def setUp(self):
+        self.url = reverse('installations:get_geojson')
+        Installation.objects.create(
+            inst_numero='SNAP001', coordonnees={'lon': 5.4, 'lat': 43.3}, inst_nom='Stade',
+            equip_aps_nom="['Football', 'Rugby']", inst_cp='13201'
+        )
+
+    def test_snapshot_content(self):
+        """Les sports sont parsés et le code INSEE converti en code postal"""
+        data = self.client.get(self.url).json()
+        properties = data['features'][0]['properties']
+        self.assertEqual(properties['sports'], ['Football', 'Rugby'])
+        self.assertEqual(properties['city'], '13001')
+
+    def test_etag_not_modified(self):
+        """Un client qui a déjà la version reçoit un 304"""
+        first = self.client.get(self.url)
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+        second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+    def test_new_version_after_change(self):
+        """Une modification produit un nouveau snapshot et un nouvel ETag"""
+        first = self.client.get(self.url)
+        Installation.objects.create(
+            inst_numero='SNAP002', coordonnees={'lon': 5.5, 'lat': 43.4}, inst_nom='Piscine'
+        )
+        second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(len(second.json()['features']), 2)
+
+    def test_snapshot_key_matches_content(self):
+        """Le snapshot est enregistré sous la clé de l'état lu, jamais sous une clé périmée"""
+        stale = dataset_key()
+        Installation.objects.create(inst_numero='SNAP002', coordonnees={'lon': 5.5, 'lat': 43.4})
+        snapshot = snapshot_module.get_geojson_snapshot(stale)
+        self.assertEqual((snapshot.dataset_key, snapshot.feature_count), (dataset_key(), 2))
+        self.assertFalse(GeoJSONSnapshot.objects.filter(dataset_key=stale).exists())
+
+        # Version changée pendant la construction : servi, mais pas enregistré
+        build = snapshot_module.build_snapshot_payload
+
+        def build_during_change(*args, **kwargs):
+            Installation.objects.create(inst_numero='SNAP003', coordonnees={'lon': 5.6, 'lat': 43.5})
+            return build(*args, **kwargs)
+
+        key = dataset_key()
+        GeoJSONSnapshot.objects.all().delete()
+        with mock.patch.object(snapshot_module, 'build_snapshot_payload', build_during_change):
+            snapshot = snapshot_module._store_snapshot()
+        self.assertEqual(snapshot.dataset_key, key)
+        self.assertFalse(GeoJSONSnapshot.objects.exists())
+
+    def test_gzip_payload(self):
+        """Le snapshot compressé est servi si le client accepte gzip"""
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(data['type'], 'FeatureCollection')
+
+    def test_gzip_validator(self):
+        """Corps gzip : ETag distinct ; les deux ETags donnent un 304 ; gzip;q=0 refuse gzip"""
+        plain = self.client.get(self.url)
+        gzipped = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(gzipped['ETag'], plain['ETag'][:-1] + '-gz"')
+        for etag in (plain['ETag'], gzipped['ETag']):
+            response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+        refused = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertNotIn('Content-Encoding', refused)
+        self.assertEqual(refused['ETag'], plain['ETag'])
+        self.assertEqual(self.client.get(self.url, HTTP_ACCEPT_ENCODING='br, *;q=0.5')['Content-Encoding'], 'gzip')
+
+    def test_stream_matches_snapshot(self):
+        """La version en flux produit exactement le même document que le snapshot"""
+        response = self.client.get(reverse('installations:get_geojson_stream'), {'chunk_size': 100})
+        self.assertTrue(response.streaming)
+        streamed = b''.join(response.streaming_content)
+        self.assertEqual(streamed, self.client.get(self.url).content)
+
+
+class ClusterTest(TestCase):
+    """Tests des clusters par niveau de zoom"""
+
+    def setUp(self):
+        self.url = reverse('installations:get_clusters')
+        Installation.objects.create(
+            inst_numero='CL001', coordonnees={'lon': 5.370, 'lat': 43.290}, equip_type_famille='Court de tennis'
+        )
+        Installation.objects.create(
+            inst_numero='CL002', coordonnees={'lon': 5.371, 'lat': 43.291}, equip_type_famille='Court de tennis'
+        )
+        self.paris = Installation.objects.create(
+            inst_numero='CL003', coordonnees={'lon': 2.35, 'lat': 48.85}, equip_type_famille='Bassin de natation'
+        )
+
+    def test_low_zoom_merges_everything(self):
+        """Au zoom 0, toutes les installations forment un seul cluster"""
+        clusters = self.client.get(self.url, {'zoom': 0}).json()['clusters']
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual(clusters[0]['count'], 3)
+        self.assertEqual(clusters[0]['family'], 'Court de tennis')
+
+    def test_high_zoom_with_bounds(self):
+        """Au zoom fin, les points isolés sont séparés et filtrés par bounds"""
+        clusters = self.client.get(self.url, {'zoom': 16, 'bounds': '2.0,48.0,3.0,49.0'}).json()['clusters']
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual(clusters[0]['count'], 1)
+        self.assertEqual(clusters[0]['id'], self.paris.id)
+
+    def test_counts_preserved_at_every_zoom(self):
+        """La somme des clusters vaut le nombre d'installations à chaque niveau"""
+        for zoom in (0, 5, 10, 16):
+            clusters = self.client.get(self.url, {'zoom': zoom}).json()['clusters']
+            self.assertEqual(sum(c['count'] for c in clusters), 3)
+
+
+class TileTest(TestCase):
+    """Tests des tuiles z/x/y"""
+
+    def setUp(self):
+        Installation.objects.create(
+            inst_numero='TI001', coordonnees={'lon': 5.37, 'lat': 43.29},
+            equip_type_name='Court de tennis', equip_type_famille='Court de tennis'
+        )
+        Installation.objects.create(
+            inst_numero='TI002', coordonnees={'lon': 2.35, 'lat': 48.85},
+            equip_type_name='Piscine', equip_type_famille='Bassin de natation'
+        )
+
+    def test_tile_contains_only_its_installations(self):
+        """La tuile de Marseille au zoom 8 ne contient que l'installation marseillaise"""
+        response = self.client.get(reverse('installations:get_tile', args=[8, 131, 93]))
+        self.assertEqual(response.status_code, 200)
+        tile = response.json()
+        self.assertEqual(len(tile['features']), 1)
+        self.assertEqual(tile['types'], ['Court de tennis'])
+
+    def test_world_tile_contains_everything(self):
+        tile = self.client.get(reverse('installations:get_tile', args=[0, 0, 0])).json()
+        self.assertEqual(len(tile['features']), 2)
+
+    def test_versioned_tile_is_immutable(self):
+        """Avec la version courante la tuile est cachable indéfiniment, sinon redirection"""
+        url = reverse('installations:get_tile', args=[0, 0, 0])
+        version = self.client.get(url)['X-Dataset-Version']
+        response = self.client.get(url, {'v': version})
+        self.assertIn('immutable', response['Cache-Control'])
+        stale = self.client.get(url, {'v': int(version) - 1})
+        self.assertEqual(stale.status_code, 302)
+
+    def test_etag_not_modified(self):
+        """Sans ?v=, un client qui a déjà la tuile de cette version reçoit un 304"""
+        url = reverse('installations:get_tile', args=[0, 0, 0])
+        first = self.client.get(url)
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+        Installation.objects.create(inst_numero='TI003', coordonnees={'lon': 5.4, 'lat': 43.3})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_invalid_tile(self):
+        response = self.client.get(reverse('installations:get_tile', args=[2, 4, 0]))
+        self.assertEqual(response.status_code, 404)
+
+
+class NearbyTest(TestCase):
+    """Tests de la recherche autour de moi"""
+
+    def setUp(self):
+        self.url = reverse('installations:get_nearby')
+        self.vieux_port = Installation.objects.create(
+            inst_numero='NB001', coordonnees={'lon': 5.3698, 'lat': 43.2951}, inst_nom='Vieux-Port',
+            equip_type_name='Court de tennis', equip_aps_nom="['Tennis']"
+        )
+        self.velodrome = Installation.objects.create(
+            inst_numero='NB002', coordonnees={'lon': 5.3958, 'lat': 43.2699}, inst_nom='Vélodrome',
+            equip_type_name='Terrain de football', equip_aps_nom="['Football']"
+        )
+        self.paris = Installation.objects.create(
+            inst_numero='NB003', coordonnees={'lon': 2.35, 'lat': 48.85}, inst_nom='Paris',
+            equip_type_name='Court de tennis', equip_aps_nom="['Tennis']"
+        )
+
+    def test_sorted_by_distance(self):
+        """Résultats triés par distance croissante, avec distance en mètres"""
+        results = self.client.get(self.url, {'lat': 43.296, 'lon': 5.370, 'k': 3}).json()['results']
+        self.assertEqual([r['id'] for r in results], [self.vieux_port.id, self.velodrome.id, self.paris.id])
+        self.assertLess(results[0]['distance_m'], 200)
+        self.assertAlmostEqual(results[2]['distance_m'] / 1000, 661, delta=5)
+
+    def test_radius_and_sports_filter(self):
+        """Le rayon et le filtre sports restreignent les résultats"""
+        results = self.client.get(self.url, {'lat': 43.296, 'lon': 5.370, 'radius': 10000}).json()['results']
+        self.assertEqual(len(results), 2)
+        results = self.client.get(self.url, {'lat': 43.296, 'lon': 5.370, 'sports': 'Football'}).json()['results']
+        self.assertEqual([r['id'] for r in results], [self.velodrome.id])
+
+    def test_missing_coordinates(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+
+
+class SportTableTest(TestCase):
+    """Tests de la table normalisée des sports"""
+
+    def setUp(self):
+        self.tennis = Installation.objects.create(
+            inst_numero='SP001', coordonnees={'lon': 5.37, 'lat': 43.29},
+            equip_type_name='Court de tennis', equip_aps_nom="['Tennis', 'Padel']"
+        )
+        self.foot = Installation.objects.create(
+            inst_numero='SP002', coordonnees={'lon': 5.39, 'lat': 43.27},
+            equip_type_name='Terrain de football', equip_aps_nom='Football'
+        )
+
+    def test_links_created_on_save(self):
+        """Les sports sont parsés une fois à l'enregistrement, et recalculés à la modification"""
+        self.assertEqual(sorted(self.tennis.sports.values_list('name', flat=True)), ['Padel', 'Tennis'])
+        self.foot.equip_aps_nom = "['Football', 'Rugby']"
+        self.foot.save()
+        self.assertEqual(sorted(self.foot.sports.values_list('name', flat=True)), ['Football', 'Rugby'])
+
+    def test_get_sports(self):
+        data = self.client.get(reverse('installations:get_sports')).json()
+        self.assertEqual(data, {'sports': ['Football', 'Padel', 'Tennis'], 'total_count': 3})
+
+    def test_sports_filter(self):
+        """Filtre sports= sur equipments et geojson"""
+        data = self.client.get(reverse('installations:get_equipments'), {'sports': 'Padel'}).json()
+        self.assertEqual([d['id'] for d in data], [self.tennis.id])
+
+        response = self.client.get(reverse('installations:get_geojson'), {'sports': 'Football,Rugby'})
+        features = json.loads(b''.join(response.streaming_content))['features']
+        self.assertEqual([f['properties']['id'] for f in features], [self.foot.id])
+
+
+class SportFacetTest(TestCase):
+    """Tests des compteurs par sport (get_sports?detailed=true)"""
+
+    def setUp(self):
+        self.url = reverse('installations:get_sports')
+        self.marseille = Installation.objects.create(
+            inst_numero='SF001', coordonnees={'lon': 5.37, 'lat': 43.29}, inst_cp='13201',
+            equip_aps_nom="['Tennis', 'Padel']"
+        )
+        Installation.objects.create(
+            inst_numero='SF002', coordonnees={'lon': 2.35, 'lat': 48.85}, inst_cp='75101',
+            equip_aps_nom="['Tennis']"
+        )
+
+    def counts(self, **params):
+        return self.client.get(self.url, {'detailed': 'true', **params}).json()['counts']
+
+    def test_incremental_counts(self):
+        """Ajout, modification et suppression ajustent les compteurs sans recalcul complet"""
+        self.assertEqual(self.counts(), {'Padel': 1, 'Tennis': 2})
+        self.marseille.equip_aps_nom = "['Tennis', 'Football']"
+        self.marseille.inst_cp = '13202'
+        self.marseille.save()
+        self.assertEqual(self.counts(), {'Football': 1, 'Tennis': 2})
+        self.assertEqual(self.counts(cp='13002'), {'Football': 1, 'Tennis': 1})
+        self.assertEqual(self.counts(cp='13001'), {})
+        self.marseille.delete()
+        self.assertEqual(self.counts(), {'Tennis': 1})
+
+    def test_scoped_counts(self):
+        # Code postal exposé par les endpoints (inst_cp) ; le code INSEE reste accepté
+        self.assertEqual(self.counts(cp='75001'), {'Tennis': 1})
+        self.assertEqual(self.counts(cp='75101'), {'Tennis': 1})
+        self.assertEqual(self.counts(bounds='5.0,43.0,6.0,44.0'), {'Padel': 1, 'Tennis': 1})
+        self.assertEqual(self.counts(bounds='5.0,43.0,6.0,44.0', cp='13001'), {'Padel': 1, 'Tennis': 1})
+
+    def test_str(self):
+        facet = SportFacet.objects.get(postal_code='13001', sport__name='Padel')
+        self.assertEqual(str(facet), f"{facet.sport_id} / 13001: 1")
+
+    def test_batch_rebuild(self):
+        """Après un lot, les compteurs sont recalculés en une fois"""
+        from .dataset import dataset_batch
+        with dataset_batch():
+            Installation.objects.filter(inst_numero='SF002').delete()
+        self.assertEqual(self.counts(), {'Padel': 1, 'Tennis': 1})
+
+
+class ColumnarStoreTest(TestCase):
+    """Tests du moteur de lecture colonnes (fichier mappé en mémoire)"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, 'installations.col')
+        self.tennis = Installation.objects.create(
+            inst_numero='CS001', coordonnees={'lon': 5.37, 'lat': 43.29}, inst_nom='Tennis club',
+            equip_type_name='Court de tennis', equip_aps_nom="['Tennis', 'Padel']", inst_cp='13201',
+            equip_acc_libre=True
+        )
+        Installation.objects.create(
+            inst_numero='CS002', coordonnees={'lon': 2.35, 'lat': 48.85}, inst_nom='Stade',
+            equip_type_name='Terrain de football', equip_aps_nom='Football'
+        )
+
+    def get(self, name, engine, **params):
+        with override_settings(INSTALLATIONS_READ_ENGINE=engine, INSTALLATIONS_COLUMNAR_PATH=self.path):
+            return self.client.get(reverse(f'installations:{name}'), params)
+
+    def test_same_responses_as_database(self):
+        for name, params in (
+            ('get_equipments', {}),
+            ('get_equipments', {'bounds': '5.0,43.0,6.0,44.0', 'sports': 'Padel'}),
+            ('installations_list', {'limit': 5}),
+            ('get_geojson', {}),
+        ):
+            self.assertEqual(
+                self.get(name, 'columnar', **params).json(), self.get(name, 'db', **params).json(), name
+            )
+
+    def test_reads_without_database(self):
+        """Seule la clé de version est lue en base (aucune requête avec DATASET_KEY_TTL)"""
+        self.get('get_equipments', 'columnar')
+        with self.assertNumQueries(1):
+            data = self.get('get_equipments', 'columnar', bounds='5.0,43.0,6.0,44.0').json()
+        self.assertEqual([d['id'] for d in data], [self.tennis.id])
+        self.assertEqual(data[0]['inst_cp'], '13001')
+        with override_settings(DATASET_KEY_TTL=60):
+            self.get('get_equipments', 'columnar')
+            with self.assertNumQueries(0):
+                self.get('get_equipments', 'columnar', bounds='5.0,43.0,6.0,44.0')
+
+    def test_other_worker_change_seen_immediately(self):
+        """Version changée par un autre processus (clé non oubliée ici) : vue dès la requête suivante"""
+        self.get('get_equipments', 'columnar')
+        Installation.objects.filter(pk=self.tennis.pk).update(inst_nom='Tennis club du Prado')
+        DatasetState.objects.update(version=F('version') + 1, updated_at=timezone.now())
+        data = self.get('get_equipments', 'columnar', bounds='5.0,43.0,6.0,44.0').json()
+        self.assertEqual(data[0]['inst_nom'], 'Tennis club du Prado')
+
+    def test_reload_after_change(self):
+        """Une modification ne réécrit pas le fichier ; il est reconstruit à la lecture suivante"""
+        self.get('get_equipments', 'columnar')
+        written = os.stat(self.path).st_ino
+        with override_settings(INSTALLATIONS_READ_ENGINE='columnar', INSTALLATIONS_COLUMNAR_PATH=self.path):
+            with self.captureOnCommitCallbacks(execute=True):
+                for name in ('Tennis club du Prado', 'Tennis club du Prado (Marseille)'):
+                    self.tennis.inst_nom = name
+                    self.tennis.save()
+        self.assertEqual(os.stat(self.path).st_ino, written)
+        data = self.get('get_equipments', 'columnar', bounds='5.0,43.0,6.0,44.0').json()
+        self.assertEqual(data[0]['inst_nom'], 'Tennis club du Prado (Marseille)')
+        self.assertNotEqual(os.stat(self.path).st_ino, written)
+
+    def test_stale_key_does_not_rebuild(self):
+        """Clé mémorisée en retard sur un fichier déjà reconstruit : pas de nouvelle réécriture"""
+        from . import columnar
+        with override_settings(INSTALLATIONS_READ_ENGINE='columnar', INSTALLATIONS_COLUMNAR_PATH=self.path):
+            old_key = columnar.get_store().key
+            self.tennis.save()
+            store = columnar.get_store()
+            written = os.stat(self.path).st_ino
+            self.assertEqual(columnar.get_store(old_key).key, store.key)
+        self.assertEqual(os.stat(self.path).st_ino, written)
+
+
+class SearchTest(TestCase):
+    """Tests de la recherche plein texte (trigrammes)"""
+
+    def setUp(self):
+        self.url = reverse('installations:search_installations')
+        self.robert = Installation.objects.create(
+            inst_numero='SE001', coordonnees={'lon': 5.39, 'lat': 43.31}, inst_nom='Complexe sportif Robert Morel',
+            inst_adresse='Boulevard de la Révolution', inst_cp='13204'
+        )
+        self.leo = Installation.objects.create(
+            inst_numero='SE002', coordonnees={'lon': 5.37, 'lat': 43.29}, inst_nom='Gymnase Léo Lagrange',
+            inst_adresse='Rue Robert Schuman', inst_cp='13201'
+        )
+        for i in range(3):
+            Installation.objects.create(
+                inst_numero=f'SE1{i}', coordonnees={'lon': 2.35, 'lat': 48.85}, inst_nom=f'Piscine {i}',
+                inst_adresse='Rue de Paris', inst_cp='75101'
+            )
+
+    def search(self, **params):
+        return self.client.get(self.url, params).json()
+
+    def test_typos_and_accents(self):
+        """Fautes de frappe et accents tolérés, le nom passe devant l'adresse"""
+        data = self.search(q='complex robrt')
+        self.assertEqual(data['results'][0]['id'], self.robert.id)
+        self.assertEqual(self.search(q='LEO LAGRANGE')['results'][0]['id'], self.leo.id)
+        self.assertEqual(self.search(q='revolution')['results'][0]['id'], self.robert.id)
+        ids = [r['id'] for r in self.search(q='robert')['results']]
+        self.assertEqual(ids, [self.robert.id, self.leo.id])
+
+    def test_postal_code(self):
+        """Code postal exact, INSEE ou converti (PLM)"""
+        self.assertEqual([r['id'] for r in self.search(q='13001')['results']], [self.leo.id])
+        self.assertEqual(self.search(q='13099')['count'], 0)
+
+    def test_pagination(self):
+        first = self.search(q='piscine', page_size=2)
+        second = self.search(q='piscine', page_size=2, page=2)
+        self.assertEqual((first['count'], first['num_pages']), (3, 2))
+        self.assertEqual(len({r['id'] for r in first['results'] + second['results']}), 3)
+
+    def test_missing_query(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+
+
+class AutocompleteTest(TestCase):
+    """Tests des suggestions de saisie"""
+
+    def setUp(self):
+        self.url = reverse('installations:autocomplete')
+        for i in range(3):
+            Installation.objects.create(
+                inst_numero=f'AC0{i}', coordonnees={'lon': 5.37, 'lat': 43.29}, inst_nom='Tennis Club Marseille',
+                equip_aps_nom="['Tennis']", inst_cp='13208'
+            )
+        self.tenon = Installation.objects.create(
+            inst_numero='AC10', coordonnees={'lon': 5.4, 'lat': 43.3}, inst_nom='Salle Ténon',
+            equip_aps_nom="['Tennis de table']", inst_cp='13001'
+        )
+
+    def labels(self, q, **params):
+        return [(s['type'], s['label']) for s in self.client.get(self.url, {'q': q, **params}).json()['suggestions']]
+
+    def test_prefix_ranked_by_popularity(self):
+        """Noms regroupés, sports et codes postaux, les plus fréquents d'abord"""
+        self.assertEqual(self.labels('ten'), [
+            ('sport', 'Tennis'), ('installation', 'Tennis Club Marseille'),
+            ('installation', 'Salle Ténon'), ('sport', 'Tennis de table'),
+        ])
+        self.assertEqual(self.labels('te', k=2), [('sport', 'Tennis'), ('installation', 'Tennis Club Marseille')])
+
+    def test_word_prefix_and_postal_code(self):
+        self.assertEqual(self.labels('MARS'), [('installation', 'Tennis Club Marseille')])
+        self.assertEqual(self.labels('1300'), [('cp', '13008'), ('cp', '13001')])
+        self.assertEqual(self.labels('zz'), [])
+
+
+class CursorPaginationTest(TestCase):
+    """Tests de la pagination par curseur de installations_list"""
+
+    def setUp(self):
+        self.url = reverse('installations:installations_list')
+        self.ids = [
+            Installation.objects.create(inst_numero=f'CP{i}', coordonnees={'lon': 5.0 + i, 'lat': 43.0}).id
+            for i in range(5)
+        ]
+
+    def walk(self, **params):
+        seen, cursor, pages = [], None, 0
+        while True:
+            query = {'limit': 2, **params}
+            if cursor:
+                query['cursor'] = cursor
+            data = self.client.get(self.url, query).json()
+            seen += [item['id'] for item in data['installations']]
+            pages += 1
+            cursor = data['next_cursor']
+            self.assertEqual(data['has_next'], cursor is not None)
+            if cursor is None:
+                return seen, pages
+
+    def test_walk_all_pages(self):
+        self.assertEqual(self.walk(), (self.ids, 3))
+
+    def test_walk_columnar(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'installations.col')
+            with override_settings(INSTALLATIONS_READ_ENGINE='columnar', INSTALLATIONS_COLUMNAR_PATH=path):
+                self.assertEqual(self.walk(), (self.ids, 3))
+
+    def test_optional_count_and_invalid_cursor(self):
+        self.assertNotIn('total', self.client.get(self.url).json())
+        self.assertEqual(self.client.get(self.url, {'count': 'true'}).json()['total'], 5)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'abc'}).status_code, 400)
+
+
+class SparseFieldsTest(TestCase):
+    """Tests du paramètre fields= (sortie allégée sans DRF)"""
+
+    def setUp(self):
+        self.installation = Installation.objects.create(
+            inst_numero='SF001', coordonnees={'lon': 5.37, 'lat': 43.29}, inst_nom='Stade',
+            equip_type_name='Terrain de football', equip_aps_nom="['Football']", inst_cp='13201'
+        )
+
+    def get(self, name, **params):
+        return self.client.get(reverse(f'installations:{name}'), params)
+
+    def test_equipments_and_list(self):
+        """Seuls les champs demandés (+ id), valeurs identiques au serializer complet"""
+        full = self.get('get_equipments').json()[0]
+        for name, extract in (
+            ('get_equipments', lambda r: r.json()[0]),
+            ('installations_list', lambda r: r.json()['installations'][0]),
+        ):
+            data = extract(self.get(name, fields='coordonnees,inst_cp,equip_type_name'))
+            self.assertEqual(list(data), ['id', 'coordonnees', 'equip_type_name', 'inst_cp'])
+            self.assertEqual(data, {key: full[key] for key in data})
+            self.assertEqual(data['inst_cp'], '13001')
+
+    def test_columnar_engine(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'installations.col')
+            with override_settings(INSTALLATIONS_READ_ENGINE='columnar', INSTALLATIONS_COLUMNAR_PATH=path):
+                columnar = self.get('get_equipments', fields='equip_type_name,inst_cp').json()
+        self.assertEqual(columnar, self.get('get_equipments', fields='equip_type_name,inst_cp').json())
+
+    def test_geojson_properties(self):
+        response = self.get('get_geojson', fields='type')
+        feature = json.loads(response.content)['features'][0]
+        self.assertEqual(feature['properties'], {'id': self.installation.id, 'type': 'Terrain de football'})
+        self.assertEqual(feature['geometry']['coordinates'], [5.37, 43.29])
+        self.assertEqual(
+            self.client.get(reverse('installations:get_geojson'), {'fields': 'type'},
+                            HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304
+        )
+
+    def test_unknown_field(self):
+        self.assertEqual(self.get('get_equipments', fields='password').status_code, 400)
+        self.assertEqual(self.get('installations_list', fields='password').status_code, 400)
+        self.assertEqual(self.get('get_geojson', fields='inst_nom').status_code, 400)
+
+
+class CompiledSerializerTest(TestCase):
+    """Le sérialiseur compilé produit la même sortie que InstallationSerializer"""
+
+    def setUp(self):
+        for numero, cp in (('CS001', '13201'), ('CS002', '69381'), ('CS003', '75101'), ('CS004', '31000'), ('CS005', None)):
+            Installation.objects.create(
+                inst_numero=numero, coordonnees={'lon': 2.35, 'lat': 48.85}, inst_nom=f'Salle {numero}',
+                equip_type_name='Salle multisports', equip_aps_nom="['Basket']", inst_cp=cp
+            )
+
+    def test_same_output_as_drf(self):
+        queryset = Installation.objects.order_by('id')
+        expected = [dict(item) for item in InstallationSerializer(queryset, many=True).data]
+        self.assertEqual(serialize_installations(queryset), expected)
+        self.assertEqual([item['inst_cp'] for item in expected], ['13001', '69081', '75001', '31000', None])
+
+    def test_subset_and_offset(self):
+        serialize = get_installation_serializer(('id', 'inst_cp'), offset=1)
+        self.assertEqual(serialize.columns, ('id', 'postal_code'))
+        self.assertEqual(serialize(('ignoré', 7, '75012')), {'id': 7, 'inst_cp': '75012'})
+        self.assertIs(get_installation_serializer(('id', 'inst_cp'), offset=1), serialize)
+        with self.assertRaises(ValueError):
+            get_installation_serializer(('id', 'password'))
+
+
+class NormalizedColumnsTest(TestCase):
+    """Code postal et sports normalisés une fois à l'enregistrement"""
+
+    def setUp(self):
+        self.installation = Installation.objects.create(
+            inst_numero='NC001', coordonnees={'lon': 4.83, 'lat': 45.76}, inst_nom='Gymnase',
+            equip_type_name='Salle multisports', equip_aps_nom="['Basket', ' Handball', 'Basket']", inst_cp='69381'
+        )
+
+    def test_saved_values(self):
+        self.installation.refresh_from_db()
+        self.assertEqual(self.installation.postal_code, '69081')
+        self.assertEqual(self.installation.sports_list, ['Basket', 'Handball'])
+
+    def test_update_fields(self):
+        self.installation.inst_cp = '75112'
+        self.installation.equip_aps_nom = 'Escrime'
+        self.installation.save(update_fields=['inst_cp', 'equip_aps_nom'])
+        self.installation.refresh_from_db()
+        self.assertEqual((self.installation.postal_code, self.installation.sports_list), ('75012', ['Escrime']))
+
+    def test_endpoints_agree(self):
+        equipment = self.client.get(reverse('installations:get_equipments')).json()[0]
+        feature = json.loads(self.client.get(reverse('installations:get_geojson')).content)['features'][0]
+        self.assertEqual(equipment['inst_cp'], feature['properties']['city'])
+        self.assertEqual(feature['properties']['sports'], ['Basket', 'Handball'])
+
+    def test_sports_shape(self):
+        """`sports` garde la forme d'avant : liste pour une liste Python, sinon valeur brute"""
+        for raw, expected in (
+            ("['Basket', ' Handball', 'Basket']", ['Basket', 'Handball']), ('[]', []),
+            ('Football', 'Football'), ('', ''), (None, None), ("['Foot'", "['Foot'"),
+        ):
+            Installation.objects.filter(pk=self.installation.pk).update(
+                equip_aps_nom=raw, sports_list=normalize_sports(raw)
+            )
+            feature = next(snapshot_module.iter_features())
+            self.assertEqual(feature['properties']['sports'], expected, raw)
+
+
+class ColumnarFormatTest(TestCase):
+    """format=columnar : tableaux parallèles et colonnes catégorielles encodées par dictionnaire"""
+
+    def setUp(self):
+        for numero, lon, name, type_name in (
+            ('CF001', 5.371234, 'Stade A', 'Terrain de football'),
+            ('CF002', 5.381234, 'Court B', 'Court de tennis'),
+            ('CF003', 5.391234, 'Stade C', 'Terrain de football'),
+        ):
+            Installation.objects.create(
+                inst_numero=numero, coordonnees={'lon': lon, 'lat': 43.291234}, inst_nom=name,
+                equip_type_name=type_name, equip_aps_nom="['Tennis']", inst_cp='13201'
+            )
+
+    def get(self, name, **params):
+        return self.client.get(reverse(f'installations:{name}'), params)
+
+    def decode(self, payload, column):
+        values = payload['columns'][column]
+        dictionary = payload['dictionaries'].get(column)
+        return [dictionary[v] for v in values] if dictionary is not None else values
+
+    def test_equipments(self):
+        rows = self.get('get_equipments').json()
+        payload = json.loads(self.get('get_equipments', format='columnar').content)
+        self.assertEqual(payload['ids'], [row['id'] for row in rows])
+        self.assertEqual(payload['dictionaries']['equip_type_name'], ['Terrain de football', 'Court de tennis'])
+        self.assertEqual(payload['columns']['equip_type_name'], [0, 1, 0])
+        for column in ('inst_nom', 'equip_type_name', 'equip_prop_nom', 'inst_cp'):
+            self.assertEqual(self.decode(payload, column), [row[column] for row in rows])
+        self.assertNotIn('coordonnees', payload['columns'])
+
+    def test_geojson_and_precision(self):
+        features = json.loads(self.get('get_geojson').content)['features']
+        payload = json.loads(self.get('get_geojson', format='columnar', precision='3').content)
+        self.assertEqual(payload['scale'], 1000)
+        self.assertEqual(payload['lons'], [5371, 5381, 5391])
+        self.assertEqual(self.decode(payload, 'type'), [f['properties']['type'] for f in features])
+        self.assertEqual(payload['columns']['sports'], [f['properties']['sports'] for f in features])
+
+        filtered = json.loads(self.get('get_geojson', format='columnar', sports='Tennis', fields='type').content)
+        self.assertEqual(list(filtered['columns']), ['type'])
+        self.assertEqual(filtered['count'], 3)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.get('get_equipments', format='xml').status_code, 400)
+        self.assertEqual(self.get('get_geojson', format='columnar', precision='12').status_code, 400)
+
+
+class BinaryFormatTest(TestCase):
+    """format=binary : le décodeur de référence redonne exactement la sortie de get_geojson"""
+
+    def setUp(self):
+        for numero, cp, sports, url in (
+            ('BF001', '13201', "['Tennis', 'Padel']", 'https://exemple.fr'),
+            ('BF002', '75101', '', None),
+            ('BF003', None, "['Natation']", ''),
+            # Chaîne seule et null : même forme après décodage
+            ('BF004', '13201', 'Football', None),
+            ('BF005', '13201', None, None),
+        ):
+            Installation.objects.create(
+                inst_numero=numero, coordonnees={'lon': 5.3712345678, 'lat': 43.2912345678},
+                inst_nom=f'Équipement {numero}', equip_type_name='Piscine', equip_aps_nom=sports,
+                inst_cp=cp, equip_url=url, inst_acc_handi_bool=numero == 'BF001'
+            )
+
+    def get(self, **params):
+        return self.client.get(reverse('installations:get_geojson'), params)
+
+    def test_round_trip(self):
+        expected = json.loads(self.get().content)
+        response = self.get(format='binary')
+        self.assertEqual(response['Content-Type'], binary.CONTENT_TYPE)
+        self.assertEqual(binary.decode(response.content), expected)
+        self.assertEqual(
+            self.client.get(reverse('installations:get_geojson'), {'format': 'binary'},
+                            HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304
+        )
+        self.assertNotEqual(response['ETag'], self.get()['ETag'])
+
+    def test_round_trip_fields_and_sports(self):
+        for params in ({'fields': 'name,sports'}, {'sports': 'Tennis'}, {'sports': 'Natation', 'fields': 'city'}):
+            response = self.get(**params)
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+            decoded = binary.decode(self.get(format='binary', **params).content)
+            self.assertEqual(decoded, json.loads(body))
+
+    def test_layout(self):
+        data = self.get(format='binary').content
+        self.assertEqual(data[:4], b'SPMB')
+        self.assertEqual(len(binary.HEADER.pack(b'SPMB', 1, 0, 0, 0, 0, 0, 0, 0, 0)), 32)
+        with self.assertRaises(ValueError):
+            binary.decode(b'XXXX' + data[4:])
+
+
+class DeltaSyncTest(TestCase):
+    """sync/?since= : seules les lignes modifiées / supprimées depuis la version du client"""
+
+    def create(self, numero, **extra):
+        return Installation.objects.create(
+            inst_numero=numero, coordonnees={'lon': 5.37, 'lat': 43.29}, inst_nom=f'Stade {numero}',
+            equip_type_name='Terrain de football', **extra
+        )
+
+    def sync(self, since):
+        response = self.client.get(reverse('installations:sync_changes'), {'since': since})
+        return json.loads(response.content)
+
+    def test_delta(self):
+        kept, edited, removed = self.create('DS001'), self.create('DS002'), self.create('DS003')
+        version = int(self.client.get(reverse('installations:get_geojson'))['X-Dataset-Version'])
+
+        edited.inst_nom = 'Stade rénové'
+        edited.save()
+        removed_id = removed.id
+        removed.delete()
+        added = self.create('DS004')
+
+        data = self.sync(version)
+        self.assertFalse(data['full'])
+        self.assertEqual(sorted(f['properties']['id'] for f in data['upserted']), [edited.id, added.id])
+        self.assertEqual(data['deleted'], [removed_id])
+        self.assertNotIn(kept.id, [f['properties']['id'] for f in data['upserted']])
+
+        current = self.sync(data['version'])
+        self.assertEqual((current['upserted'], current['deleted'], current['full']), ([], [], False))
+
+    def test_batch_is_versioned(self):
+        first = self.create('DS010')
+        first_id = first.id
+        version = self.sync(0)['version']
+        with dataset_batch():
+            Installation.objects.filter(id=first_id).delete()
+            Installation.objects.bulk_create([Installation(inst_numero='DS011', coordonnees={'lon': 1, 'lat': 2})])
+        data = self.sync(version)
+        self.assertEqual(data['version'], version + 1)
+        self.assertEqual(data['deleted'], [first_id])
+        self.assertEqual([f['properties']['name'] for f in data['upserted']], [None])
+
+    def test_full_fallback(self):
+        self.create('DS020')
+        version = self.sync(0)['version']
+        with dataset_batch():
+            pass
+        reset_sync_history()
+        self.create('DS021')
+        self.assertTrue(self.sync(version)['full'])
+        data = self.sync(version + 100)
+        self.assertTrue(data['full'])
+        self.assertEqual(len(data['snapshot']['features']), 2)
+        self.assertEqual(self.client.get(reverse('installations:sync_changes'), {'since': 'x'}).status_code, 400)
+
+
+class BundlesTest(TestCase):
+    """Paquets hors ligne par département : fichiers précompressés + manifeste"""
+
+    def setUp(self):
+        for numero, cp in (('BU001', '13201'), ('BU002', '13008'), ('BU003', '2A004'), ('BU004', '97411'), ('BU005', None)):
+            Installation.objects.create(
+                inst_numero=numero, coordonnees={'lon': 5.37, 'lat': 43.29}, inst_nom=f'Stade {numero}',
+                equip_type_name='Terrain de football', inst_cp=cp
+            )
+
+    def test_department(self):
+        self.assertEqual([department(cp) for cp in ('13001', '2A004', '97411', '', None)],
+                         ['13', '2A', '974', 'autres', 'autres'])
+
+    def test_export(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = export_bundles(directory)
+            self.assertEqual(sorted(manifest['bundles']), ['13', '2A', '974', 'autres'])
+
+            entry = manifest['bundles']['13']
+            with open(os.path.join(directory, entry['path']), 'rb') as f:
+                payload = f.read()
+            with open(os.path.join(directory, entry['gz']['path']), 'rb') as f:
+                self.assertEqual(gzip.decompress(f.read()), payload)
+            self.assertEqual(entry['sha256'], hashlib.sha256(payload).hexdigest())
+            self.assertEqual(entry['features'], 2)
+            self.assertEqual({f['properties']['city'] for f in json.loads(payload)['features']}, {'13001', '13008'})
+            with open(os.path.join(directory, 'manifest.json')) as f:
+                self.assertEqual(json.load(f)['version'], manifest['version'])
+
+    def test_cleanup_only_own_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Dossier non vide sans manifeste (ex. WHITENOISE_ROOT) : refusé, rien n'est touché
+            open(os.path.join(directory, 'index.html'), 'w').close()
+            with self.assertRaises(ValueError):
+                export_bundles(directory)
+            self.assertEqual(os.listdir(directory), ['index.html'])
+
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = export_bundles(directory)
+            # Département d'un export précédent + fichiers étrangers au dossier
+            manifest['bundles']['99'] = {'path': '99.json', 'gz': {'path': '99.json.gz'}}
+            with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f)
+            for name in ('99.json', '99.json.gz', '98.json', 'notes.txt'):
+                open(os.path.join(directory, name), 'w').close()
+            export_bundles(directory)
+            remaining = set(os.listdir(directory))
+            self.assertFalse({'99.json', '99.json.gz'} & remaining)
+            self.assertTrue({'98.json', 'notes.txt', '13.json', 'manifest.json'} <= remaining)
+
+
+def load_staging(rows, clear=False, upsert=False):
+    """Passer des lignes CSV par la staging (COPY) puis insert_from_staging / upsert_from_staging"""
+    staged = [
+        (line,) + loader.staging_values(loader.installation_fields(row, loader.parse_coordonnees(row['equip_coordonnees'])))
+        for line, row in enumerate(rows, 1)
+    ]
+    with connection.cursor() as cursor:
+        loader.create_staging_table(cursor)
+        try:
+            loader.copy_to_staging(cursor, staged)
+            if upsert:
+                return loader.upsert_from_staging(cursor)
+            return loader.insert_from_staging(cursor, clear=clear)
+        finally:
+            loader.drop_staging_table(cursor)
+
+
+class CopyLoaderTest(TestCase):
+    """load_csv --copy : staging par COPY puis transfert ensembliste"""
+
+    ROWS = [
+        {'equip_coordonnees': "{'lon': 5.37, 'lat': 43.29}", 'inst_numero': 'CP001', 'inst_nom': 'Stade "A"',
+         'equip_type_name': 'Terrain de football', 'aps_name': "['Football', 'Rugby', 'Football']",
+         'equip_acc_libre': 'true', 'new_code': '13201', 'equip_url': ''},
+        {'equip_coordonnees': "{'lon': 5.40, 'lat': 43.30}", 'inst_numero': 'CP002', 'inst_nom': 'Piscine, B',
+         'equip_type_name': 'Bassin', 'aps_name': '', 'inst_acc_handi_bool': 'oui', 'new_code': '13008'},
+    ]
+
+    def test_copy_matches_orm(self):
+        with dataset_batch():
+            self.assertEqual(load_staging(self.ROWS), 2)
+        first, second = Installation.objects.order_by('id')
+        self.assertEqual((first.inst_numero, first.inst_nom, first.equip_url), ('CP001', 'Stade "A"', ''))
+        self.assertEqual(first.sports_list, ['Football', 'Rugby'])
+        self.assertEqual(first.postal_code, '13001')
+        self.assertEqual((first.longitude, first.latitude, first.grid_cell), (5.37, 43.29, grid_cell(5.37, 43.29)))
+        self.assertTrue(first.equip_acc_libre)
+        self.assertEqual(sorted(first.sports.values_list('name', flat=True)), ['Football', 'Rugby'])
+        self.assertIsNotNone(first.row_version)
+        self.assertEqual((second.inst_nom, second.equip_aps_nom, second.sports_list), ('Piscine, B', '', []))
+        self.assertTrue(second.inst_acc_handi_bool)
+        self.assertFalse(second.equip_acc_libre)
+
+    def test_clear_replaces(self):
+        Installation.objects.create(inst_numero='OLD', coordonnees={'lon': 5.0, 'lat': 43.0}, inst_nom='Ancien')
+        with dataset_batch():
+            load_staging(self.ROWS, clear=True)
+        self.assertEqual(sorted(Installation.objects.values_list('inst_numero', flat=True)), ['CP001', 'CP002'])
+
+    def test_invalid_coordinates(self):
+        with self.assertRaises(ValueError):
+            loader.parse_coordonnees("{'lon': 5.37,")
+
+    def test_failure_keeps_version(self):
+        version = get_dataset_version()
+        with self.assertRaises(RuntimeError):
+            with dataset_batch():
+                raise RuntimeError('échec du lot')
+        call_command('load_csv', '/nonexistent.csv', '--copy', stdout=StringIO())
+        self.assertEqual(get_dataset_version(), version)
+
+
+class UpsertLoaderTest(TestCase):
+    """load_csv --upsert : seules les lignes ajoutées / modifiées / disparues sont écrites"""
+
+    ROWS = [dict(row, id=str(i)) for i, row in enumerate(CopyLoaderTest.ROWS, 1)]
+
+    def upsert(self, rows=None):
+        with dataset_batch():
+            return load_staging(rows or self.ROWS, upsert=True)
+
+    def test_unchanged(self):
+        self.upsert()
+        ids = dict(Installation.objects.values_list('source_id', 'id'))
+        version = Installation.objects.get(source_id='1').row_version
+        counts = self.upsert()
+        self.assertEqual((counts['inserted'], counts['updated'], counts['deleted'], counts['unchanged']), (0, 0, 0, 2))
+        self.assertEqual(dict(Installation.objects.values_list('source_id', 'id')), ids)
+        self.assertEqual(Installation.objects.get(source_id='1').row_version, version)
+
+    def test_changes(self):
+        self.upsert()
+        kept = Installation.objects.get(source_id='1')
+        removed_id = Installation.objects.get(source_id='2').id
+        rows = [dict(self.ROWS[0], inst_nom='Stade C', aps_name="['Rugby']"),
+                dict(self.ROWS[1], id='3', inst_numero='CP003')]
+        counts = self.upsert(rows)
+        self.assertEqual((counts['inserted'], counts['updated'], counts['deleted'], counts['unchanged']), (1, 1, 1, 0))
+
+        updated = Installation.objects.get(source_id='1')
+        self.assertEqual((updated.id, updated.inst_nom), (kept.id, 'Stade C'))
+        self.assertGreater(updated.row_version, kept.row_version)
+        self.assertEqual(list(updated.sports.values_list('name', flat=True)), ['Rugby'])
+        self.assertFalse(Installation.objects.filter(id=removed_id).exists())
+        self.assertTrue(InstallationTombstone.objects.filter(installation_id=removed_id, version__isnull=False).exists())
+
+    def test_adopts_existing_rows(self):
+        existing = Installation.objects.create(
+            inst_numero='CP001', coordonnees={'lon': 5.37, 'lat': 43.29}, inst_nom='Ancien nom',
+            equip_type_name='Terrain de football'
+        )
+        counts = self.upsert()
+        self.assertEqual((counts['adopted'], counts['inserted'], counts['updated']), (1, 1, 1))
+        existing.refresh_from_db()
+        self.assertEqual((existing.source_id, existing.inst_nom), ('1', 'Stade "A"'))
+
+    def test_empty_staging(self):
+        self.upsert()
+        with connection.cursor() as cursor:
+            loader.create_staging_table(cursor)
+            try:
+                with self.assertRaises(ValueError):
+                    loader.upsert_from_staging(cursor)
+            finally:
+                loader.drop_staging_table(cursor)
+        self.assertEqual(Installation.objects.count(), 2)
+
+
+class SyncInstallationsTest(TestCase):
+    """sync_installations : anti-jointure sur une table temporaire remplie par COPY"""
+
+    def setUp(self):
+        for numero in ('SY001', 'SY002', 'SY003'):
+            installation = Installation.objects.create(
+                inst_numero=numero, coordonnees={'lon': 5.37, 'lat': 43.29}, inst_nom=f'Stade {numero}',
+                equip_aps_nom="['Football']"
+            )
+            link_installation_sports([(installation.pk, installation.sports_list)])
+        self.removed_id = Installation.objects.get(inst_numero='SY002').id
+        handle, self.csv_path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w', encoding='utf-8') as f:
+            f.write('id,inst_numero\n1,SY001\n2,SY003\n3,SY003\n')
+        self.addCleanup(os.unlink, self.csv_path)
+
+    def sync(self, *args):
+        out = StringIO()
+        call_command('sync_installations', '--csv', self.csv_path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run(self):
+        output = self.sync('--dry-run')
+        self.assertIn('1 infrastructures seraient supprimées', output)
+        self.assertIn('SY002', output)
+        self.assertEqual(Installation.objects.count(), 3)
+
+    def test_delete(self):
+        output = self.sync()
+        self.assertIn('Suppression SQL', output)
+        self.assertEqual(sorted(Installation.objects.values_list('inst_numero', flat=True)), ['SY001', 'SY003'])
+        self.assertFalse(Installation.sports.through.objects.filter(installation_id=self.removed_id).exists())
+        self.assertTrue(InstallationTombstone.objects.filter(installation_id=self.removed_id, version__isnull=False).exists())
+        self.assertIn('déjà synchronisée', self.sync())
+
+
+class ExclusionTest(TestCase):
+    """Mots-clés d'exclusion : automate unique sur le texte replié"""
+
+    def test_matcher(self):
+        matcher = KeywordMatcher(['he', 'she', 'hers', 'Centre de détention'])
+        self.assertEqual(matcher.search('USHERS'), 'she')
+        self.assertEqual(matcher.search('ahis'), None)
+        self.assertIn('CENTRE DE DÉTENTION DE TARASCON', matcher)
+        self.assertNotIn('centre de la detention', matcher)
+        self.assertIsNone(matcher.search(None))
+
+    def test_excluded_keyword(self):
+        self.assertEqual(excluded_keyword({'inst_nom': 'École Mixte Frais Vallon', 'equip_type_name': 'City-stade'}), 'ecole')
+        self.assertEqual(excluded_keyword({'inst_nom': 'Gymnase', 'equip_type_name': 'Salle du Lycée'}), 'lycee')
+        self.assertIsNone(excluded_keyword({'inst_nom': 'Stade Vélodrome', 'equip_type_name': None}))
+
+    def test_purge(self):
+        for nom in ('École La Parade', 'CENTRE DE DETENTION DE TARASCON', 'Stade Vélodrome'):
+            Installation.objects.create(inst_numero=nom[:5], coordonnees={'lon': 5.37, 'lat': 43.29}, inst_nom=nom)
+        call_command('purge_banned_installations', stdout=StringIO())
+        self.assertEqual(list(Installation.objects.values_list('inst_nom', flat=True)), ['Stade Vélodrome'])
+        self.assertEqual(InstallationTombstone.objects.count(), 2)
+
+
+class BootstrapDatasetTest(TestCase):
+    """bootstrap_dataset : rien n'est refait tant que l'empreinte CSV + schéma est identique"""
+
+    HEADER = 'id,equip_coordonnees,inst_numero,inst_nom,equip_type_name,aps_name,new_code\n'
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.csv_path = os.path.join(self.directory.name, 'data.csv')
+        self.write_csv('1,"{\'lon\': 5.37, \'lat\': 43.29}",BS001,Stade A,Terrain de football,"[\'Football\']",13201\n')
+
+    def write_csv(self, rows):
+        with open(self.csv_path, 'w', encoding='utf-8') as f:
+            f.write(self.HEADER + rows)
+
+    def bootstrap(self):
+        out = StringIO()
+        with override_settings(INSTALLATIONS_BUNDLES_DIR=os.path.join(self.directory.name, 'bundles')):
+            call_command('bootstrap_dataset', '--csv', self.csv_path, stdout=out)
+        return out.getvalue()
+
+    def test_fingerprint(self):
+        output = self.bootstrap()
+        self.assertIn('load_csv --upsert', output)
+        self.assertIn('export_bundles', output)
+        fingerprint = get_dataset_fingerprint()
+        self.assertTrue(fingerprint)
+        pk = Installation.objects.get(source_id='1').pk
+
+        output = self.bootstrap()
+        self.assertIn('Empreinte inchangée', output)
+        self.assertNotIn('load_csv --upsert', output)
+        self.assertIn('export_bundles (à jour)', output)
+
+        self.write_csv('1,"{\'lon\': 5.37, \'lat\': 43.29}",BS001,Stade B,Terrain de football,"[\'Football\']",13201\n')
+        self.assertIn('empreinte modifiée', self.bootstrap())
+        self.assertNotEqual(get_dataset_fingerprint(), fingerprint)
+        installation = Installation.objects.get(source_id='1')
+        self.assertEqual((installation.pk, installation.inst_nom), (pk, 'Stade B'))
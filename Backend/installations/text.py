@@ -0,0 +1,79 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Normalisation du texte pour la recherche : minuscules, sans accents, sans ponctuation.
+"Complexe Sportif Léo-Lagrange" -> "complexe sportif leo lagrange"
+
+Et normalisations appliquées une fois à l'enregistrement (colonnes postal_code et sports_list) :
+code INSEE -> code postal PLM, liste de sports "['Tennis', 'Padel']" -> ['Tennis', 'Padel'].
+"""
+
+import ast
+import re
+import unicodedata
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_text(value):
+    """Texte replié (accents, casse, ponctuation) en mots séparés par un espace"""
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', value.lower())
+    folded = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    folded = folded.replace('œ', 'oe').replace('æ', 'ae').replace('ß', 'ss')
+    return _NON_ALNUM.sub(' ', folded).strip()
+
+
+def trigrams(value):
+    """Trigrammes à la manière de pg_trgm : chaque mot est entouré de "  " et " " """
+    grams = set()
+    for word in normalize_text(value).split():
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+# Arrondissements PLM : préfixe INSEE -> préfixe postal
+PLM_PREFIXES = {
+    '132': '130',  # Marseille (132XX -> 130XX)
+    '693': '690',  # Lyon (693XX -> 690XX)
+    '751': '750',  # Paris (751XX -> 750XX)
+}
+
+
+def plm_postal_code(cp):
+    """Code INSEE -> Code Postal pour Paris, Lyon, Marseille (arrondissements)"""
+    if cp and isinstance(cp, str) and len(cp) == 5:
+        prefix = PLM_PREFIXES.get(cp[:3])
+        if prefix is not None:
+            return prefix + cp[3:]
+    return cp
+
+
+def parse_sports_field(sport_field):
+    """Parser un champ sport (string ou liste)"""
+    if not sport_field:
+        return []
+
+    try:
+        # Cas 1: Liste Python stockée comme string "['Tennis', 'Volley']"
+        if sport_field.startswith('[') and sport_field.endswith(']'):
+            sports_list = ast.literal_eval(sport_field)
+            return [sport.strip() for sport in sports_list if sport.strip()]
+
+        # Cas 2: String simple "Tennis de table"
+        else:
+            return [sport_field.strip()]
+
+    except (ValueError, SyntaxError):
+        # En cas d'erreur, traiter comme string simple
+        return [sport_field.strip()] if sport_field.strip() else []
+
+
+def normalize_sports(sport_field):
+    """Sports distincts d'un champ equip_aps_nom, dans l'ordre d'apparition (colonne sports_list)"""
+    return list(dict.fromkeys(parse_sports_field(sport_field)))
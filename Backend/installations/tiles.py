@@ -0,0 +1,86 @@
+# Copyright (c) 2025
+# Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
+# Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
+
+"""
+Tuiles z/x/y d'installations, générées à la demande puis mémorisées par version.
+
+Encodage compact (JSON) d'une tuile :
+    {
+        "v": <version>, "z": z, "x": x, "y": y, "extent": 4096,
+        "types": [...],      # table des equip_type_name de la tuile
+        "families": [...],   # table des equip_type_famille de la tuile
+        "features": [[id, px, py, type_idx, family_idx], ...]
+    }
+px/py sont les coordonnées entières du point dans la tuile (0..extent, origine en haut
+à gauche, comme les tuiles vectorielles). Une tuile est immuable pour une version donnée.
+"""
+
+import json
+
+from django.conf import settings
+
+from .cache import LRUCache
+from .models import Installation
+from .spatial import filter_bbox, lonlat_to_world, tile_bounds
+
+TILE_EXTENT = 4096
+MAX_TILE_ZOOM = 20
+EDGE_EPSILON = 1e-9
+
+_tile_cache = LRUCache(getattr(settings, 'TILE_CACHE_MAX_ENTRIES', 2048))
+
+
+def build_tile(version, z, x, y):
+    """Construire le contenu encodé (bytes) de la tuile z/x/y"""
+    sw_lng, sw_lat, ne_lng, ne_lat = tile_bounds(z, x, y)
+    # Légère marge contre les arrondis : le découpage exact est refait en coordonnées mercator
+    query = filter_bbox(
+        Installation.objects.all(),
+        sw_lng - EDGE_EPSILON, sw_lat - EDGE_EPSILON, ne_lng + EDGE_EPSILON, ne_lat + EDGE_EPSILON,
+    )
+    rows = query.order_by('id').values_list(
+        'id', 'longitude', 'latitude', 'coordonnees', 'equip_type_name', 'equip_type_famille'
+    )
+
+    n = 2 ** z
+    types, families = {}, {}
+    features = []
+    for pk, lon, lat, coordonnees, type_name, famille in rows:
+        if lat is None:
+            try:
+                lon, lat = float(coordonnees['lon']), float(coordonnees['lat'])
+            except (KeyError, TypeError, ValueError):
+                continue
+        wx, wy = lonlat_to_world(lon, lat)
+        # Tuile semi-ouverte [x, x+1[ : un point sur une bordure n'apparaît qu'une fois
+        if not (x <= wx * n < x + 1 and y <= wy * n < y + 1):
+            continue
+        px = min(max(int(round((wx * n - x) * TILE_EXTENT)), 0), TILE_EXTENT)
+        py = min(max(int(round((wy * n - y) * TILE_EXTENT)), 0), TILE_EXTENT)
+        features.append([
+            pk, px, py,
+            types.setdefault(type_name, len(types)),
+            families.setdefault(famille, len(families)),
+        ])
+
+    return json.dumps({
+        'v': version, 'z': z, 'x': x, 'y': y, 'extent': TILE_EXTENT,
+        'types': list(types),
+        'families': list(families),
+        'features': features,
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def get_tile(key, version, z, x, y):
+    """Tuile mémorisée pour la version `key` (générée au premier accès)"""
+    cache_key = (key, z, x, y)
+    payload = _tile_cache.get(cache_key)
+    if payload is None:
+        payload = build_tile(version, z, x, y)
+        _tile_cache.set(cache_key, payload)
+    return payload
+
+
+def is_valid_tile(z, x, y):
+    return 0 <= z <= MAX_TILE_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
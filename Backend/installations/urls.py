@@ -10,6 +10,13 @@ app_name = 'installations'
 urlpatterns = [
     path('equipments/', views.get_equipments, name='get_equipments'),
     path('geojson/', views.get_geojson, name='get_geojson'),
+    path('geojson/stream/', views.get_geojson_stream, name='get_geojson_stream'),
+    path('sync/', views.sync_changes, name='sync_changes'),
+    path('clusters/', views.get_clusters, name='get_clusters'),
+    path('tiles/<int:z>/<int:x>/<int:y>/', views.get_tile, name='get_tile'),
+    path('nearby/', views.get_nearby, name='get_nearby'),
+    path('search/', views.search_installations, name='search_installations'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
     path('sports/', views.get_sports, name='get_sports'),
     path('installations/', views.installations_list, name='installations_list'),
 ]
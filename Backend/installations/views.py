@@ -5,14 +5,38 @@
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 from django.views.decorators.csrf import csrf_exempt
 from django.db.models import Q
 from .models import Installation
-from .serializers import InstallationSerializer, SportsListSerializer
-from django.core.cache import cache
+from .serializers import INSTALLATION_FIELDS, get_installation_serializer, parse_fields
+from .spatial import filter_bbox, parse_bounds, parse_coordinates
+from .cache import normalize_types, viewport_cache
+from .dataset import current_dataset_key, dataset_key, get_dataset_state
+from .snapshot import (
+    GEOJSON_PROPERTIES, build_columnar_payload, get_geojson_snapshot, get_geojson_variant, iter_features,
+    iter_geojson_chunks,
+)
+from .compact import CATEGORICAL_FIELDS, dumps, encode_columnar, parse_precision, response_format
+from . import binary
+from .clustering import get_cluster_index
+from . import tiles
+from .nearest import get_nearest_index
+from .search import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, get_search_index
+from .autocomplete import DEFAULT_K, MAX_K, get_autocomplete_index
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_page, wants_count
+from .sports import filter_sports, list_sports, sport_counts
+from .columnar import columnar_enabled, get_columnar_geojson, get_store
+from .delta import changes_since
+import calendar
 import json
-import ast
+import math
+
+# Pagination de installations_list (synchronisation complète par l'app mobile)
+LIST_ORDERING = ('id',)
+MAX_LIST_LIMIT = 1000
 
 # ===== ANCIEN CODE SQLALCHEMY (COMMENTÉ) =====
 # from sqlalchemy.orm import sessionmaker
@@ -24,61 +48,94 @@ import ast
 # engine = create_engine(settings.DATABASE_URL)
 # SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _accepts_gzip(request):
+    """gzip accepté par Accept-Encoding (gzip, x-gzip ou *) avec q > 0 ; "gzip;q=0" le refuse"""
+    qualities = {}
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, *params = part.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            qualities[coding.strip().lower()] = quality
+    quality = qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0)))
+    return quality > 0
+
+def _load_equipments(bbox, filters):
+    """Charger depuis la base les équipements d'un rectangle : liste de (id, lon, lat, data)"""
+    types_list, sports_list, fields = filters
+    query = Installation.objects.all()
+
+    # Filtrage par bounds géographiques (colonnes typées + grille indexée)
+    if bbox is not None:
+        query = filter_bbox(query, *bbox)
+
+    # Filtrage par types d'équipements
+    if types_list:
+        query = query.filter(equip_type_name__in=types_list)
+
+    # Filtrage par sports (table de liaison indexée)
+    query = filter_sports(query, sports_list)
+
+    # Tuples (lon, lat, coordonnees, *champs) sérialisés sans DRF ; fields= limite les colonnes lues
+    serialize = get_installation_serializer(fields, offset=3)
+    rows = query.order_by('id').values_list('longitude', 'latitude', 'coordonnees', *serialize.columns)
+
+    items = []
+    for row in rows:
+        lon, lat, coordonnees = row[0], row[1], row[2]
+        point = (lon, lat) if lat is not None else parse_coordinates(coordonnees)
+        if point is None:
+            # Sans coordonnées : visible uniquement sans filtre géographique
+            if bbox is not None:
+                continue
+            point = (None, None)
+        data = serialize(row)
+        items.append((data['id'], point[0], point[1], data))
+    return items
+
+
 @csrf_exempt
 def get_equipments(request):
-    """API avec cache - GAIN ÉNORME"""
-    
-    # Cache pendant 5 minutes
-    cache_key = "equipments_all"
-    cached_data = cache.get(cache_key)
-    
-    if cached_data:
-        # 🚀 INSTANTANÉ - 50ms au lieu de 3 secondes
-        return JsonResponse(cached_data, safe=False)
-    
-    # Seulement si pas en cache
+    """API avec cache par tuiles - clé = version du jeu de données + bounds + types + sports + fields"""
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+        columnar = response_format(request) == 'columnar'
+        precision = parse_precision(request.GET.get('precision'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
     try:
         bounds = request.GET.get('bounds')
-        types = request.GET.get('types')
-        
-        # Commencer avec tous les équipements
-        query = Installation.objects.all()
-
-        # Filtrage par bounds géographiques
-        if bounds:
-            sw_lng, sw_lat, ne_lng, ne_lat = map(float, bounds.split(','))
-            # Django JSONField query pour PostgreSQL
-            query = query.extra(
-                where=[
-                    "CAST(coordonnees->>'lon' AS FLOAT) >= %s",
-                    "CAST(coordonnees->>'lon' AS FLOAT) <= %s", 
-                    "CAST(coordonnees->>'lat' AS FLOAT) >= %s",
-                    "CAST(coordonnees->>'lat' AS FLOAT) <= %s"
-                ],
-                params=[sw_lng, ne_lng, sw_lat, ne_lat]
-            )
+        bbox = parse_bounds(bounds) if bounds else None
+        filters = (
+            normalize_types(request.GET.get('types')),
+            normalize_types(request.GET.get('sports')),
+            fields,
+        )
 
-        # Filtrage par types d'équipements
-        if types:
-            types_list = types.split(',')
-            query = query.filter(equip_type_name__in=types_list)
-
-        # Convertir en dictionnaire
-        #Post serialization des équipements avec des serializers
-        #equipments = query.values(
-        #    'id', 'inst_numero', 'coordonnees', 'inst_nom', 
-        #    'equip_type_name', 'equip_type_famille', 'equip_aps_nom',
-        #    'equip_acc_libre', 'equip_url', 'inst_adresse', 
-        #    'inst_cp', 'equip_prop_nom', 'equip_gest_type', 
-        #    'inst_acc_handi_bool'
-        #)
-        serializer = InstallationSerializer(query, many=True)
-        data = serializer.data
-        
-        # Stocker en cache
-        cache.set(cache_key, data, 300)  # 5 minutes
-        
-        return JsonResponse(data, safe=False)
+        if columnar_enabled():
+            # Lecture depuis le magasin colonnes partagé : aucune requête SQL
+            store = get_store()
+            items, hit = viewport_cache.get(store.key, bbox, filters, store.load_equipments)
+        else:
+            # Clé relue en base (mémorisée seulement si DATASET_KEY_TTL > 0)
+            items, hit = viewport_cache.get(current_dataset_key(), bbox, filters, _load_equipments)
+
+        if columnar:
+            # format=columnar : tableaux parallèles, coordonnees portées par lons/lats
+            columns = [name for name in (fields or INSTALLATION_FIELDS) if name not in ('id', 'coordonnees')]
+            payload = encode_columnar(items, columns, CATEGORICAL_FIELDS, precision)
+            response = HttpResponse(dumps(payload), content_type='application/json')
+        else:
+            response = JsonResponse([item[3] for item in items], safe=False)
+        response['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response
 
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -127,75 +184,76 @@ def get_equipments(request):
 
 @csrf_exempt
 def get_geojson(request):
-    """Version Django ORM basée sur votre logique SQLAlchemy"""
+    """FeatureCollection complète servie depuis le snapshot de la version courante (ETag / 304)"""
     try:
-        # Récupérer toutes les installations avec Django ORM
-        installations = Installation.objects.all()
-        features = []
-        
-        for installation in installations:
-            try:
-                coordonnees = installation.coordonnees
-                
-                # Vérification exacte comme votre code
-                if not coordonnees or "lon" not in coordonnees or "lat" not in coordonnees:
-                    continue
-
-                # Parser les sports de manière sécurisée
-                sports = installation.equip_aps_nom
-                if sports and isinstance(sports, str):
-                    try:
-                        if sports.startswith('[') and sports.endswith(']'):
-                            sports = ast.literal_eval(sports)
-                    except (ValueError, SyntaxError):
-                        pass
-
-                # Formatage du Code INSEE en Code Postal (PLM)
-                cp = installation.inst_cp
-                if cp and isinstance(cp, str) and len(cp) == 5:
-                    if cp.startswith('132'):
-                        cp = cp.replace('132', '130', 1)
-                    elif cp.startswith('693'):
-                        cp = cp.replace('693', '690', 1)
-                    elif cp.startswith('751'):
-                        cp = cp.replace('751', '750', 1)
-
-                feature = {
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "Point",
-                        "coordinates": [
-                            float(coordonnees["lon"]),
-                            float(coordonnees["lat"])
-                        ]
-                    },
-                    "properties": {
-                        "id": installation.id,
-                        "name": installation.inst_nom,
-                        "type": installation.equip_type_name,
-                        "family": installation.equip_type_famille,
-                        "sports": sports,
-                        "free_access": installation.equip_acc_libre,
-                        "url": installation.equip_url,
-                        "address": installation.inst_adresse,
-                        "city": cp,
-                        "owner": installation.equip_prop_nom,
-                        "gestion": installation.equip_gest_type,
-                        "inst_acc_handi_bool": installation.inst_acc_handi_bool
-                    }
-                }
-                features.append(feature)
-                
-            except (KeyError, TypeError, ValueError) as e:
-                print(f"Error processing installation {installation.inst_numero}: {e}")
-                continue
+        properties = parse_fields(request.GET.get('fields'), allowed=GEOJSON_PROPERTIES)
+        output = response_format(request, allowed=('json', 'columnar', 'binary'))
+        columnar = output == 'columnar'
+        precision = parse_precision(request.GET.get('precision'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
-        print(f"✅ GeoJSON generated with {len(features)} features")
-        
-        return JsonResponse({
-            "type": "FeatureCollection",
-            "features": features
-        })
+    try:
+        # Filtre par sports : sous-ensemble construit à la demande, hors snapshot
+        sports_list = normalize_types(request.GET.get('sports'))
+        if sports_list:
+            if columnar_enabled():
+                store = get_store()
+                queryset, rows = None, store.geojson_rows(store.select(sports=sports_list))
+            else:
+                queryset, rows = filter_sports(Installation.objects.all(), sports_list), None
+            if columnar:
+                payload = build_columnar_payload(queryset, rows, properties, precision)[0]
+                response = HttpResponse(payload, content_type='application/json')
+            elif output == 'binary':
+                features = list(iter_features(queryset, rows=rows, properties=properties))
+                response = HttpResponse(binary.encode_features(features), content_type=binary.CONTENT_TYPE)
+            else:
+                # GeoJSON généré en flux
+                chunks = iter_geojson_chunks(queryset, rows=rows, properties=properties)
+                response = StreamingHttpResponse(chunks, content_type='application/json')
+            response['Cache-Control'] = 'no-cache'
+            return response
+
+        if properties is not None or columnar:
+            # fields= / format=columnar : variante mémorisée par version comme le snapshot complet
+            store = get_store() if columnar_enabled() else None
+            snapshot = get_geojson_variant(properties, store, columnar, precision if columnar else None)
+        else:
+            snapshot = get_columnar_geojson() if columnar_enabled() else get_geojson_snapshot()
+        content_type = 'application/json'
+        if output == 'binary':
+            # Même snapshot, réencodé une fois par version au format binaire
+            snapshot = binary.get_binary_snapshot(snapshot)
+            content_type = binary.CONTENT_TYPE
+        last_modified = calendar.timegm(snapshot.last_modified.utctimetuple())
+
+        # ETag fort distinct pour le corps gzip (octets différents du corps non compressé)
+        gzip_etag = '"%s-gz"' % snapshot.etag.strip('"')
+        gzipped = _accepts_gzip(request)
+        etag = gzip_etag if gzipped else snapshot.etag
+
+        # Le client a déjà cette version, sous l'une ou l'autre forme : 304 sans corps
+        for validator in (etag, snapshot.etag if gzipped else gzip_etag):
+            not_modified = get_conditional_response(request, etag=validator, last_modified=last_modified)
+            if not_modified is not None:
+                not_modified['ETag'] = validator
+                patch_vary_headers(not_modified, ('Accept-Encoding',))
+                return not_modified
+
+        if gzipped:
+            response = HttpResponse(snapshot.payload_gzip, content_type=content_type)
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(snapshot.payload, content_type=content_type)
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'public, no-cache'
+        # Version à passer ensuite à sync/?since= pour ne recevoir que les changements
+        response['X-Dataset-Version'] = snapshot.version
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
         
     except Exception as e:
         print(f"❌ Critical error in get_geojson: {e}")
@@ -297,6 +355,183 @@ def get_geojson(request):
     # finally:
     #     db.close()
 
+@csrf_exempt
+def sync_changes(request):
+    """
+    Features modifiées et ids supprimés depuis la version `since` du client.
+    Écart trop grand : {"full": true, "snapshot": FeatureCollection complète}.
+    """
+    try:
+        since = int(request.GET.get('since', ''))
+        if since < 0:
+            raise ValueError(since)
+    except ValueError:
+        return JsonResponse({'error': "Paramètre since invalide (numéro de version attendu)"}, status=400)
+
+    try:
+        state = get_dataset_state()
+        delta = changes_since(since, state)
+        if delta.full:
+            # Snapshot en cache, inséré tel quel dans la réponse (pas de re-sérialisation)
+            key = dataset_key(state)
+            snapshot = get_columnar_geojson(get_store(key)) if columnar_enabled() else get_geojson_snapshot(key)
+            head = json.dumps({'version': snapshot.version, 'since': since, 'full': True}, separators=(',', ':'))
+            response = HttpResponse(
+                head[:-1].encode('utf-8') + b',"snapshot":' + snapshot.payload + b'}',
+                content_type='application/json',
+            )
+            response['X-Dataset-Version'] = snapshot.version
+        else:
+            response = JsonResponse({
+                'version': delta.version,
+                'since': since,
+                'full': False,
+                'upserted': delta.upserted,
+                'deleted': delta.deleted,
+            })
+            response['X-Dataset-Version'] = delta.version
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+def get_geojson_stream(request):
+    """FeatureCollection générée en flux (curseur serveur) : mémoire constante quelle que soit la table"""
+    try:
+        chunk_size = min(max(int(request.GET.get('chunk_size', 2000)), 100), 10000)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    response = StreamingHttpResponse(
+        iter_geojson_chunks(chunk_size=chunk_size), content_type='application/json'
+    )
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+@csrf_exempt
+def get_clusters(request):
+    """Clusters précalculés (centroïde, nombre, famille dominante) pour un zoom et des bounds"""
+    try:
+        zoom = int(request.GET.get('zoom', 0))
+        bounds = request.GET.get('bounds')
+        bbox = parse_bounds(bounds) if bounds else None
+
+        index = get_cluster_index()
+        clusters = index.query(zoom, bbox)
+
+        return JsonResponse({
+            'zoom': min(max(zoom, 0), index.max_zoom),
+            'clusters': clusters,
+            'count': len(clusters),
+        })
+
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+def get_tile(request, z, x, y):
+    """
+    Installations d'une tuile web-mercator z/x/y (encodage compact, voir tiles.py).
+    Avec ?v=<version courante>, la tuile est immuable et cachable indéfiniment.
+    """
+    if not tiles.is_valid_tile(z, x, y):
+        return JsonResponse({'error': 'Tuile invalide'}, status=404)
+
+    try:
+        state = get_dataset_state()
+        version = state[0]
+        requested = request.GET.get('v')
+
+        if requested is not None and requested != str(version):
+            # Version périmée : rediriger vers la tuile de la version courante
+            return HttpResponseRedirect(f"{request.path}?v={version}")
+
+        key = dataset_key(state)
+        etag = f'"{key}-{z}-{x}-{y}"' if requested is None else None
+        # Le client a déjà cette tuile pour cette version : 304 sans corps ni construction
+        response = get_conditional_response(request, etag=etag) if etag else None
+        if response is None:
+            response = HttpResponse(tiles.get_tile(key, version, z, x, y), content_type='application/json')
+        response['X-Dataset-Version'] = str(version)
+        if requested is not None:
+            response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            response['Cache-Control'] = 'public, max-age=60'
+            response['ETag'] = etag
+        return response
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+def get_nearby(request):
+    """Installations les plus proches d'un point (KD-tree en mémoire, distances haversine)"""
+    try:
+        lat = float(request.GET['lat'])
+        lon = float(request.GET['lon'])
+        k = min(max(int(request.GET.get('k', 10)), 1), 100)
+        radius = request.GET.get('radius')
+        radius_m = float(radius) if radius else None
+        types_list = normalize_types(request.GET.get('types'))
+        sports_list = normalize_types(request.GET.get('sports'))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Paramètres lat et lon requis (k, radius optionnels)'}, status=400)
+
+    try:
+        results = get_nearest_index().nearest(
+            lon, lat, k=k, radius_m=radius_m, types=types_list, sports=sports_list
+        )
+        return JsonResponse({'results': results, 'count': len(results)})
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+def search_installations(request):
+    """Recherche nom / adresse / code postal tolérante aux accents et fautes (index de trigrammes)"""
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+        page_size = min(max(int(request.GET.get('page_size', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'page et page_size doivent être des entiers'}, status=400)
+    if not query:
+        return JsonResponse({'error': 'Paramètre q requis'}, status=400)
+
+    try:
+        results, count = get_search_index().page(query, page=page, page_size=page_size)
+        return JsonResponse({
+            'query': query,
+            'results': results,
+            'count': count,
+            'page': page,
+            'page_size': page_size,
+            'num_pages': math.ceil(count / page_size),
+        })
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+def autocomplete(request):
+    """Suggestions de saisie (noms, sports, codes postaux) classées par popularité"""
+    query = request.GET.get('q', '')
+    try:
+        k = min(max(int(request.GET.get('k', DEFAULT_K)), 1), MAX_K)
+    except ValueError:
+        return JsonResponse({'error': 'k doit être un entier'}, status=400)
+
+    try:
+        suggestions = get_autocomplete_index().complete(query, k=k)
+        return JsonResponse({'query': query, 'suggestions': suggestions})
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
 @csrf_exempt
 def get_sports(request):
     """API pour récupérer la liste unique des sports - VERSION DJANGO ORM"""
@@ -304,15 +539,26 @@ def get_sports(request):
         # Paramètre optionnel pour des stats détaillées
         detailed = request.GET.get('detailed', 'false').lower() == 'true'
         
-        # Récupérer toutes les installations
-        installations = Installation.objects.all()
-        
-        # Choisir le serializer selon le paramètre
+        if detailed:
+            # Compteurs précalculés, limités à un code postal (cp=) et/ou à la vue (bounds=)
+            bounds = request.GET.get('bounds')
+            counts = sport_counts(
+                cp=request.GET.get('cp') or None,
+                bbox=parse_bounds(bounds) if bounds else None,
+            )
+            sports = sorted(counts)
+            return JsonResponse({
+                "sports": sports,
+                "total_count": len(sports),
+                "counts": {sport: counts[sport] for sport in sports}
+            })
 
-        serializer = SportsListSerializer()
-        # ✨ MAGIE DU SERIALIZER ✨
-        data = serializer.to_representation(installations)
-        return JsonResponse(data)
+        # Sports distincts lus dans la table normalisée (plus de parsing par ligne)
+        sports = list_sports()
+        return JsonResponse({
+            "sports": sports,
+            "total_count": len(sports)
+        })
         
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -361,21 +607,44 @@ def get_sports(request):
 # Vue simple pour test
 @csrf_exempt
 def installations_list(request):
-    """API simple pour lister les installations"""
+    """API simple pour lister les installations (pagination par curseur sur l'id)"""
     try:
         # Paramètre de limite optionnel
-        limit = int(request.GET.get('limit', 10))  # Défaut: 10
-        
-        installations = Installation.objects.all()[:limit]
+        limit = min(max(int(request.GET.get('limit', 10)), 1), MAX_LIST_LIMIT)  # Défaut: 10
+        cursor = request.GET.get('cursor')
+        fields = parse_fields(request.GET.get('fields'))
         
-        # ✨ UTILISER LE SERIALIZER ✨
-        serializer = InstallationSerializer(installations, many=True)
+        if columnar_enabled():
+            store = get_store()
+            after = decode_cursor(cursor, LIST_ORDERING, Installation)[0] if cursor else None
+            indices = store.page_after(after, limit + 1)
+            next_cursor = encode_cursor(LIST_ORDERING, [store.ids[indices[limit - 1]]]) if len(indices) > limit else None
+            data = [store.equipment(i, fields) for i in indices[:limit]]
+            total = len(store)
+        else:
+            # Sérialiseur compilé : tuples values_list des seules colonnes demandées
+            serialize = get_installation_serializer(fields)
+            id_index = serialize.fields.index('id')
+            rows, next_cursor = keyset_page(
+                Installation.objects.values_list(*serialize.columns), LIST_ORDERING, cursor, limit,
+                key=lambda row: [row[id_index]],
+            )
+            data = [serialize(row) for row in rows]
+            total = None
         
-        return JsonResponse({
-            'installations': serializer.data,
-            'count': len(serializer.data),
-            'limit': limit
-        })
+        response = {
+            'installations': data,
+            'count': len(data),
+            'limit': limit,
+            'next_cursor': next_cursor,
+            'has_next': next_cursor is not None,
+        }
+        # Total optionnel (count=true) : inutile pour parcourir toute la table
+        if wants_count(request, default=False):
+            response['total'] = total if total is not None else Installation.objects.count()
+        return JsonResponse(response)
         
+    except (InvalidCursor, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': str(e)}, status=500)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('signalements', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='signalement',
+            index=models.Index(fields=['-date', '-id'], name='signalement_date_id_idx'),
+        ),
+    ]
@@ -48,6 +48,10 @@ class Signalement(models.Model):
         verbose_name = 'Signalement'
         verbose_name_plural = 'Signalements'
         ordering = ['-date']  # Plus récents en premier
+        indexes = [
+            # Pagination par curseur (date, id) de l'administration
+            models.Index(fields=['-date', '-id'], name='signalement_date_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.type} - {self.etat} ({self.date.date()}) - {self.installation.inst_nom}"
@@ -2,6 +2,69 @@
 # Yassine Fellous, Abdelkader Sofiane Ziri, Mathieu Duverne, Mohamed Marwane Bellagha
 # Tous droits réservés. Utilisation interdite sans autorisation écrite des auteurs.
 
-from django.test import TestCase
+import json
+from datetime import timedelta
 
-# Create your tests here.
+import jwt
+from django.conf import settings
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from authentication.models import UserAuth
+from installations.models import Installation
+from installations.pagination import keyset_page
+from .models import Signalement
+from .views import MAX_ADMIN_LIMIT, SIGNALEMENTS_ORDERING, admin_list_signalements, admin_list_utilisateurs
+
+
+class AdminPaginationTest(TestCase):
+    """Tests de la pagination par curseur des listes d'administration"""
+
+    def setUp(self):
+        self.admin = UserAuth.objects.create(email='admin@test.fr', password='x', is_admin=True)
+        self.users = [UserAuth.objects.create(email=f'user{i}@test.fr', password='x') for i in range(4)]
+        installation = Installation.objects.create(inst_numero='SG001', coordonnees={'lon': 5.0, 'lat': 43.0})
+        now = timezone.now()
+        # Deux signalements à la même date : l'id départage
+        dates = [now, now, now - timedelta(days=1), now - timedelta(days=2)]
+        self.signalements = [
+            Signalement.objects.create(message='m', date=date, utilisateur=self.users[0], installation=installation)
+            for date in dates
+        ]
+        token = jwt.encode({'email': self.admin.email}, settings.SECRET_KEY, algorithm='HS256')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def test_signalements_keyset(self):
+        """Parcours complet par (date, id) décroissants, sans doublon ni oubli"""
+        seen, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(Signalement.objects.all(), SIGNALEMENTS_ORDERING, cursor, limit=1)
+            seen += [row.id for row in rows]
+            if cursor is None:
+                break
+        expected = sorted(self.signalements, key=lambda s: (s.date, s.id), reverse=True)
+        self.assertEqual(seen, [s.id for s in expected])
+
+    def test_utilisateurs_cursor_without_count(self):
+        request = RequestFactory().get('/', {'limit': 3, 'count': 'false'}, **self.auth)
+        first = admin_list_utilisateurs(request)
+        page = json.loads(first.content)
+        self.assertIsNone(page['pagination']['total'])
+        self.assertEqual(page['utilisateurs'][0]['id'], self.users[0].id)
+
+        request = RequestFactory().get('/', {'limit': 3, 'cursor': page['pagination']['next_cursor']}, **self.auth)
+        second = json.loads(admin_list_utilisateurs(request).content)
+        ids = [u['id'] for u in page['utilisateurs'] + second['utilisateurs']]
+        self.assertEqual(sorted(ids), sorted([self.admin.id] + [u.id for u in self.users]))
+        self.assertFalse(second['pagination']['has_next'])
+        self.assertEqual(second['pagination']['total'], 5)
+
+    def test_limit_bounds(self):
+        """limit ramené entre 1 et MAX_ADMIN_LIMIT ; valeur non numérique : 400"""
+        for view in (admin_list_signalements, admin_list_utilisateurs):
+            for value, expected in (('0', 1), ('-5', 1), ('100000', MAX_ADMIN_LIMIT)):
+                # etat sans signalement : seule la pagination est vérifiée
+                request = RequestFactory().get('/', {'limit': value, 'etat': 'Rejeté'}, **self.auth)
+                self.assertEqual(json.loads(view(request).content)['pagination']['limit'], expected)
+            request = RequestFactory().get('/', {'limit': 'abc'}, **self.auth)
+            self.assertEqual(view(request).status_code, 400)
@@ -7,12 +7,24 @@ from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse
 from django.utils import timezone
 from django.conf import settings
+from django.db.models import Count, Q
 import jwt
 import json
 
 from .models import Signalement
 from authentication.models import UserAuth
 from installations.models import Installation
+from installations.pagination import InvalidCursor, keyset_page, wants_count
+
+# Ordres de pagination par curseur (dernière clé unique : id)
+SIGNALEMENTS_ORDERING = ('-date', '-id')
+# nb_signalements est un agrégat : chaque page compte les signalements de tous les utilisateurs
+# avant de trier (le curseur évite l'OFFSET, pas ce comptage). Acceptable tant que la liste
+# des comptes reste de taille administrable ; sinon, dénormaliser le compteur sur UserAuth.
+UTILISATEURS_ORDERING = ('-nb_signalements', '-id')
+
+# Taille de page maximale des listes d'administration (comme installations_list)
+MAX_ADMIN_LIMIT = 1000
 
 def get_user_from_jwt(request):
     auth = request.META.get('HTTP_AUTHORIZATION', '')
@@ -138,8 +150,10 @@ def admin_list_signalements(request, admin_user):
         type_signalement = request.GET.get('type')
         utilisateur_id = request.GET.get('utilisateur_id')
         installation_id = request.GET.get('installation_id')
-        limit = int(request.GET.get('limit', 50))
-        offset = int(request.GET.get('offset', 0))
+        limit = min(max(int(request.GET.get('limit', 50)), 1), MAX_ADMIN_LIMIT)
+        offset = max(int(request.GET.get('offset', 0)), 0)
+        cursor = request.GET.get('cursor')
+        with_count = wants_count(request)
         
         # Construction de la requête
         query = Signalement.objects.select_related('utilisateur', 'installation', 'traite_par')
@@ -154,9 +168,16 @@ def admin_list_signalements(request, admin_user):
         if installation_id:
             query = query.filter(installation_id=installation_id)
         
-        # Pagination
-        total_count = query.count()
-        signalements = query[offset:offset + limit]
+        # Pagination : curseur (date, id) ; offset conservé pour les anciens clients
+        total_count = query.count() if with_count else None
+        next_cursor = None
+        if offset and not cursor:
+            signalements = list(query.order_by(*SIGNALEMENTS_ORDERING)[offset:offset + limit + 1])
+            has_next = len(signalements) > limit
+            signalements = signalements[:limit]
+        else:
+            signalements, next_cursor = keyset_page(query, SIGNALEMENTS_ORDERING, cursor, limit)
+            has_next = next_cursor is not None
         
         # Formatage des données
         data = []
@@ -189,22 +210,28 @@ def admin_list_signalements(request, admin_user):
                 } if signalement.traite_par else None
             })
         
-        return JsonResponse({
+        response = {
             "signalements": data,
             "pagination": {
                 "total": total_count,
                 "limit": limit,
                 "offset": offset,
-                "has_next": offset + limit < total_count
-            },
-            "stats": {
-                "nouveau": Signalement.objects.filter(etat='Nouveau').count(),
-                "verification": Signalement.objects.filter(etat='Vérification').count(),
-                "en_maintenance": Signalement.objects.filter(etat='En maintenance').count(),
-                "termine": Signalement.objects.filter(etat__in=['Maintenance effectuée', 'Fermé']).count(),
+                "has_next": has_next,
+                "next_cursor": next_cursor
             }
-        })
+        }
+        if with_count:
+            # Les 4 compteurs en une seule requête
+            response["stats"] = Signalement.objects.aggregate(
+                nouveau=Count('id', filter=Q(etat='Nouveau')),
+                verification=Count('id', filter=Q(etat='Vérification')),
+                en_maintenance=Count('id', filter=Q(etat='En maintenance')),
+                termine=Count('id', filter=Q(etat__in=['Maintenance effectuée', 'Fermé'])),
+            )
+        return JsonResponse(response)
         
+    except (InvalidCursor, ValueError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
     except Exception as e:
         print(f"❌ Erreur admin_list_signalements: {str(e)}")
         return JsonResponse({"error": str(e)}, status=500)
@@ -361,22 +388,33 @@ def admin_stats_signalements(request, admin_user):
 @csrf_exempt
 @require_admin
 def admin_list_utilisateurs(request, admin_user):
-    """Liste des utilisateurs avec leurs signalements"""
+    """
+    Liste des utilisateurs avec leurs signalements, du plus au moins actif.
+    Coût lié au nombre total d'utilisateurs (tri sur un agrégat), pas seulement à `limit`.
+    """
     if request.method != "GET":
         return JsonResponse({"error": "Méthode non autorisée"}, status=405)
     
     try:
         from django.db.models import Count
         
-        limit = int(request.GET.get('limit', 50))
-        offset = int(request.GET.get('offset', 0))
+        limit = min(max(int(request.GET.get('limit', 50)), 1), MAX_ADMIN_LIMIT)
+        offset = max(int(request.GET.get('offset', 0)), 0)
+        cursor = request.GET.get('cursor')
         
         # Récupérer les utilisateurs avec le nombre de signalements
-        utilisateurs = UserAuth.objects.annotate(
-            nb_signalements=Count('signalements')
-        ).order_by('-nb_signalements')[offset:offset + limit]
-        
-        total_count = UserAuth.objects.count()
+        utilisateurs = UserAuth.objects.annotate(nb_signalements=Count('signalements'))
+        next_cursor = None
+        if offset and not cursor:
+            utilisateurs = list(utilisateurs.order_by(*UTILISATEURS_ORDERING)[offset:offset + limit + 1])
+            has_next = len(utilisateurs) > limit
+            utilisateurs = utilisateurs[:limit]
+        else:
+            # Curseur (nb_signalements, id) : pas d'OFFSET à parcourir
+            utilisateurs, next_cursor = keyset_page(utilisateurs, UTILISATEURS_ORDERING, cursor, limit)
+            has_next = next_cursor is not None
+        
+        total_count = UserAuth.objects.count() if wants_count(request) else None
         
         data = []
         for user in utilisateurs:
@@ -404,10 +442,13 @@ def admin_list_utilisateurs(request, admin_user):
                 "total": total_count,
                 "limit": limit,
                 "offset": offset,
-                "has_next": offset + limit < total_count
+                "has_next": has_next,
+                "next_cursor": next_cursor
             }
         })
         
+    except (InvalidCursor, ValueError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
     except Exception as e:
         print(f"❌ Erreur admin_list_utilisateurs: {str(e)}")
         return JsonResponse({"error": str(e)}, status=500)
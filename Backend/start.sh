@@ -1,16 +1,7 @@
 #!/bin/bash
 
-echo "🚀 Exécution des migrations..."
-python manage.py migrate --noinput
-
-echo "🔍 Vérification de l'alignement des IDs dans la base de données..."
-python manage.py reset_ids_if_needed
-
-echo "🧹 Synchronisation et nettoyage des installations (PostGIS)..."
-python manage.py sync_installations
-
-echo "📥 Chargement des données propres (si nécessaire)..."
-python manage.py load_csv data/cleaned-data-es.csv
+echo "🚀 Migrations, synchronisation du CSV (upsert) et paquets hors ligne, sautés si rien n'a changé..."
+python manage.py bootstrap_dataset --csv data/cleaned-data-es.csv
 
 echo "🌐 Lancement du serveur (Gunicorn ou runserver)..."
 if [ "$PYTHON_ENV" = "development" ] || [ "$HOSTNAME" = "api" ]; then